@@ -4,12 +4,15 @@
 支持交易成本、止损止盈、高级统计指标
 """
 import datetime
-import csv
+import hmac
 import time
 import os
 import sys
-from functools import lru_cache
-from typing import List, Dict, Any
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Tuple
 
 # 设置标准输出编码为UTF-8（Windows兼容）
 if sys.platform == 'win32':
@@ -19,9 +22,48 @@ if sys.platform == 'win32':
     if hasattr(sys.stderr, 'buffer'):
         sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='replace')
 
-import requests
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Body, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from strategy_engine import calculate_trade_cost, run_double_ma_strategy
+from sweep import (
+    SORTABLE_METRICS,
+    parse_param_range,
+    parse_sweep_grid,
+    run_double_ma_sweep,
+    check_sweep_data,
+    stream_sweep_events,
+    shutdown_sweep_pool,
+)
+from data_cache import CACHE_DIR, CACHE_MAX_AGE_HOURS, load_cached, save_series, merge_new_rows
+from price_series import PriceSeries, TIMEFRAMES, check_timeframe, columns_from_rows
+from daily_payload import DailyPayloadCache, choose_encoding, etag_matches
+from result_cache import ResultCache, make_cache_key
+from response_format import (
+    MEDIA_TYPES,
+    STREAM_MEDIA_TYPES,
+    check_format,
+    parse_fields,
+    result_layout,
+    encode,
+    encode_event,
+    rows_to_columns,
+)
+from backtest_executor import BacktestExecutor, ExecutorBusy
+from single_flight import SingleFlight
+from jobs import JobStore, JobRunner
+from walk_forward import run_walk_forward
+from live_strategy import DoubleMAState, LiveStateCache
+from strategy_compare import parse_strategy_sets, run_comparison
+from indicators import shared_memo as indicator_memo
+from resample import base_timeframe, resampled, resample_cache
+import data_sources
+import data_quality
+import data_import
+import intraday_store
+import shared_dataset
 
 # 导入本地数据生成器
 try:
@@ -31,15 +73,23 @@ except ImportError:
     def generate_local_btc_data():
         return []
 
-# 通用请求头，模拟浏览器访问
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-    "Accept-Language": "en-US,en;q=0.5",
-}
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP_ON_STARTUP:
+        # 后台预热，不阻塞启动（健康检查可以立即通过）；预热期间到达的请求会等待同一次加载
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    # 启动后台任务线程，并恢复上次未完成的任务
+    _job_runner.start()
+    yield
+    _job_runner.stop()
+    # 关闭数据源下载的连接池、回测执行器和参数扫描的进程池
+    data_sources.close()
+    _backtest_executor.shutdown()
+    shutdown_sweep_pool()
 
-app = FastAPI(title="BTC Backtest API", version="1.0.0")
+
+app = FastAPI(title="BTC Backtest API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -50,239 +100,415 @@ app.add_middleware(
 )
 
 
-def _download_from_yahoo() -> List[Dict[str, Any]]:
-    start_date = datetime.date(2016, 1, 1)
-    # 扩展到2026年1月1日，但如果今天还没到，就使用今天
-    target_end = datetime.date(2026, 1, 1)
-    end_date = min(target_end, datetime.date.today() + datetime.timedelta(days=1))
-    period1 = int(datetime.datetime.combine(start_date, datetime.time.min).timestamp())
-    period2 = int(datetime.datetime.combine(end_date, datetime.time.min).timestamp())
+# 在线数据源（缓存键, 优先级顺序）
+DATA_SOURCES = ("yahoo", "binance", "coingecko")
 
-    url = (
-        "https://query1.finance.yahoo.com/v7/finance/download/BTC-USD"
-        f"?period1={period1}&period2={period2}"
-        "&interval=1d&events=history&includeAdjustedClose=true"
-    )
+# 进程内共享的列式数据及其加载时间；超过缓存有效期后在下次访问时增量刷新
+_price_series: Optional[PriceSeries] = None
+_price_series_loaded_at = 0.0
 
-    resp = requests.get(url, headers=HEADERS, timeout=30)
-    if resp.status_code != 200:
-        raise RuntimeError(f"Yahoo Finance 下载失败: HTTP {resp.status_code}")
+# 并发的首次加载/刷新只执行一次，其余调用者等待同一个结果
+_load_flight = SingleFlight()
 
-    content = resp.content.decode("utf-8", errors="ignore").splitlines()
-    reader = csv.DictReader(content)
+def _parse_history_days(spec: str) -> Dict[str, int]:
+    """解析形如 "1h=1095,15m=365,1m=90" 的配置，未给出的周期使用默认值"""
+    days = {"1h": 1095, "15m": 365, "1m": 90}
+    for item in spec.split(","):
+        if "=" in item:
+            timeframe, value = item.split("=", 1)
+            days[timeframe.strip()] = int(value)
+    return days
 
-    rows: List[Dict[str, Any]] = []
-    for r in reader:
-        if r.get("Date") in (None, "", "null"):
-            continue
-        try:
-            date = datetime.datetime.strptime(r["Date"], "%Y-%m-%d").date()
-            close = float(r["Close"]) if r.get("Close") not in (None, "", "null") else None
-        except Exception:
-            continue
-        if close is None:
-            continue
-        try:
-            open_ = float(r["Open"]) if r.get("Open") not in (None, "", "null") else close
-            high = float(r["High"]) if r.get("High") not in (None, "", "null") else close
-            low = float(r["Low"]) if r.get("Low") not in (None, "", "null") else close
-            volume = float(r["Volume"]) if r.get("Volume") not in (None, "", "null") else 0.0
-        except Exception:
-            open_ = high = low = close
-            volume = 0.0
-
-        rows.append(
-            {
-                "date": date,
-                "open": open_,
-                "high": high,
-                "low": low,
-                "close": close,
-                "volume": volume,
-            }
-        )
 
-    if not rows:
-        raise RuntimeError("Yahoo Finance 数据为空")
+# 日内周期（1h/15m/1m）的在线数据源（仅 Binance 提供），以及首次下载的历史长度（天），
+# 可用 BTC_INTRADAY_HISTORY_DAYS="1h=1095,15m=365,1m=90" 覆盖
+INTRADAY_SOURCES = data_sources.INTRADAY_SOURCES
+INTRADAY_HISTORY_DAYS = _parse_history_days(os.environ.get("BTC_INTRADAY_HISTORY_DAYS", ""))
+
+# 进程内的日内序列：周期 -> (序列, 加载时间)，与日线一样过期后在下次访问时增量刷新
+_intraday_series: Dict[str, Tuple[PriceSeries, float]] = {}
+
+# 数据质量报告：数据版本 -> 报告。校验只在下载/刷新后做一次，报告随缓存和共享数据集保存，
+# 加载时登记到这里；最多保留 MAX_QUALITY_REPORTS 个版本
+MAX_QUALITY_REPORTS = 16
+_quality_reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+# 历史数据导入串行执行，避免两次导入同时改写同一份存储
+_import_lock = threading.Lock()
+
+# POST /api/data/import 会改写本地存储，只有设置了 BTC_IMPORT_TOKEN 才开放，
+# 请求须带 X-Import-Token 头；上传文件的大小上限为 BTC_IMPORT_MAX_MB（默认 4096MB）
+IMPORT_TOKEN = os.environ.get("BTC_IMPORT_TOKEN", "")
+IMPORT_MAX_BYTES = int(float(os.environ.get("BTC_IMPORT_MAX_MB", "4096")) * 1024 * 1024)
+# 接收上传时攒够这么多字节再交给线程池写入，避免在事件循环里阻塞写文件
+IMPORT_WRITE_BYTES = 4 * 1024 * 1024
+
+# 启动时在后台预热（加载数据、启动回测工作进程），BTC_WARMUP=0 关闭
+WARMUP_ON_STARTUP = os.environ.get("BTC_WARMUP", "1") != "0"
+
+
+def _record_quality(series: PriceSeries, report: Optional[Dict[str, Any]]) -> None:
+    if report is None:
+        return
+    _quality_reports[series.version] = report
+    _quality_reports.move_to_end(series.version)
+    while len(_quality_reports) > MAX_QUALITY_REPORTS:
+        _quality_reports.popitem(last=False)
+
+
+def _validate(columns: Dict[str, Any], source: str, timeframe: str = "1d") -> Tuple[PriceSeries, Dict[str, Any]]:
+    """校验并清洗刚下载（或合并）的数据，打印摘要并登记报告；没有有效数据时抛出 ValueError"""
+    series, report = data_quality.validate_columns(columns, source=source, timeframe=timeframe)
+    status = "OK" if report["ok"] else "WARN"
+    print(f"[{status}] 数据校验 {source} {timeframe}: {data_quality.summarize(report)}")
+    _record_quality(series, report)
+    return series, report
+
+
+def _with_quality(meta: Dict[str, Any], series: PriceSeries) -> PriceSeries:
+    """
+    从缓存或共享数据集读取的数据：登记随数据保存的质量报告；
+    旧版本写入、没有报告的缓存在这里校验一次
+    """
+    report = meta.get("quality")
+    if report is None:
+        return _validate(series.columns(), series.source, series.timeframe)[0]
+    _record_quality(series, report)
+    return series
+
 
-    rows.sort(key=lambda x: x["date"])
-    return rows
+def _save_to_disk_cache(source: str, series: PriceSeries, quality: Optional[Dict[str, Any]] = None) -> None:
+    """写入磁盘缓存，失败只打印警告，不影响本次加载"""
+    try:
+        path = save_series(source, series, quality=quality)
+        print(f"[OK] 已写入本地缓存: {path}")
+    except Exception as e:
+        print(f"[WARN] 写入本地缓存失败: {e}")
 
 
-def _download_from_binance() -> List[Dict[str, Any]]:
+def _refresh_from_cache_incremental() -> Optional[Dict[str, Any]]:
     """
-    备用数据源：Binance 现货 BTCUSDT 日线，起始 2017-08-17，扩展到2026-01-01。
+    增量更新：找到最新缓存的最后日期，只向同一数据源请求之后的K线，追加后整体校验并写回缓存。
+    没有任何缓存时返回 None；下载或校验失败时抛出异常。
     """
-    start_date = datetime.datetime(2017, 8, 17)
-    # 扩展到2026年1月1日，但如果今天还没到，就使用今天
-    target_end = datetime.datetime(2026, 1, 1)
-    end_date = min(target_end, datetime.datetime.utcnow())
-    start_ts = int(start_date.timestamp() * 1000)
-    end_ts = int(end_date.timestamp() * 1000)
+    cached = load_cached(DATA_SOURCES, max_age_hours=None)
+    if not cached:
+        return None
+    meta, series = cached
+    source = meta["source"]
+    new_rows = data_sources.download(source, start_date=series.last_date)
+    merged, added = merge_new_rows(series, new_rows)
+    merged, report = _validate(merged.columns(), source)
+    _save_to_disk_cache(source, merged, quality=report)
+    print(f"[OK] 增量更新 {source}: 新增 {added} 条，最新日期 {merged.last_date}")
+    return {"source": source, "series": merged, "added": added, "quality": report}
 
-    # Binance 单次最多 1000 根，循环拉取
-    rows: List[Dict[str, Any]] = []
-    next_start = start_ts
-    limit = 1000
-    while True:
-        url = (
-            "https://api.binance.com/api/v3/klines"
-            f"?symbol=BTCUSDT&interval=1d&startTime={next_start}&endTime={end_ts}&limit={limit}"
+
+def _publish_dataset(series: PriceSeries) -> PriceSeries:
+    """
+    把数据（及其质量报告）发布为共享数据集文件，返回内存映射的同一份数据：本进程也改用映射的页面，
+    与其它 worker 共用一份物理内存。发布失败只打印警告，返回原序列
+    """
+    try:
+        path = shared_dataset.publish(series, quality=_quality_reports.get(series.version))
+        print(f"[OK] 已发布共享数据集: {path}")
+        return shared_dataset.open_dataset(shared_dataset.read_pointer(series.timeframe))
+    except Exception as e:
+        print(f"[WARN] 发布共享数据集失败: {e}")
+        return series
+
+
+def _shared_dataset(timeframe: str, current: Optional[PriceSeries] = None) -> Optional[Tuple[PriceSeries, float]]:
+    """
+    其它 worker 发布的未过期共享数据集，返回 (序列, 发布时间)；没有或已过期时返回 None。
+    与 current 的版本相同时直接返回 current，不重新映射
+    """
+    try:
+        pointer = shared_dataset.read_pointer(timeframe)
+        if pointer is None or time.time() - pointer["published_at"] > CACHE_MAX_AGE_HOURS * 3600:
+            return None
+        if current is not None and current.version == pointer["version"]:
+            return current, pointer["published_at"]
+        series = shared_dataset.open_dataset(pointer)
+        print(f"[OK] 映射共享数据集 {len(series)} 条 {timeframe} 数据（来源: {series.source}，版本 {series.version}）")
+        return _with_quality(pointer, series), pointer["published_at"]
+    except Exception as e:
+        print(f"[WARN] 读取共享数据集失败: {e}")
+        return None
+
+
+def refresh_btc_daily() -> Dict[str, Any]:
+    """
+    立即增量刷新数据并替换进程内副本，无需重启进程。
+    没有本地缓存时退化为完整加载。并发的刷新请求共享同一次下载。
+    """
+    return _load_flight.do("refresh", _refresh_btc_daily)
+
+
+def _refresh_btc_daily() -> Dict[str, Any]:
+    global _price_series, _price_series_loaded_at
+    result = _refresh_from_cache_incremental()
+    if result is None:
+        series = _load_price_series_from_sources()
+        result = {"source": series.source, "series": series, "added": len(series)}
+    _price_series = result["series"]
+    _price_series_loaded_at = time.time()
+    # 旧版本数据的回测结果不会再被命中，直接释放内存
+    _backtest_results.clear()
+    _price_series = _publish_dataset(_price_series)
+    return {
+        "source": result["source"],
+        "added": result["added"],
+        "rows": len(_price_series),
+        "last_date": _price_series.last_date.isoformat(),
+        "version": _price_series.version,
+        "quality": _quality_reports.get(_price_series.version),
+    }
+
+
+def load_price_series(timeframe: str = "1d") -> PriceSeries:
+    """
+    返回进程内共享的 BTC 列式K线数据（只读，各接口和策略直接使用，不复制），timeframe 为K线周期。
+    首次调用时加载（并发调用只下载一次）；超过缓存有效期（BTC_CACHE_MAX_AGE_HOURS）后自动增量刷新，
+    刷新失败则继续使用旧数据。
+    基础周期（1d/1h/15m/1m）以外的周期（如 4h、3d、1w）由基础周期在内存中重采样得到，不额外下载
+    """
+    global _price_series, _price_series_loaded_at
+    check_timeframe(timeframe)
+    base = base_timeframe(timeframe)
+    if base != timeframe:
+        return resampled(load_price_series(base), timeframe)
+    if timeframe != "1d":
+        return _load_intraday_series(timeframe)
+    series = _price_series
+    if series is None:
+        series = _load_flight.do("load", _initial_load)
+    elif time.time() - _price_series_loaded_at > CACHE_MAX_AGE_HOURS * 3600:
+        # 无论成功与否都重置计时，避免数据源故障时每个请求都去重试
+        _price_series_loaded_at = time.time()
+        shared = _shared_dataset("1d", series)
+        if shared is not None:
+            # 其它 worker 已经刷新并发布了数据，直接映射，不再下载
+            _price_series, _price_series_loaded_at = shared
+            if _price_series is not series:
+                _backtest_results.clear()
+            return _price_series
+        try:
+            refresh_btc_daily()
+            series = _price_series
+        except Exception as e:
+            print(f"[WARN] 增量更新失败，继续使用已加载的数据: {e}")
+    return series
+
+
+def _initial_load() -> PriceSeries:
+    global _price_series, _price_series_loaded_at
+    # 上一次加载可能刚好在本次调用进入前完成
+    if _price_series is None:
+        shared = _shared_dataset("1d")
+        if shared is not None:
+            _price_series, _price_series_loaded_at = shared
+        else:
+            _price_series = _load_price_series_from_sources()
+            _price_series_loaded_at = time.time()
+            # 本地生成的示例数据不发布，其它 worker 仍会尝试在线数据源
+            if _price_series.source != "local":
+                _price_series = _publish_dataset(_price_series)
+    return _price_series
+
+
+def refresh_intraday(timeframe: str) -> Dict[str, Any]:
+    """增量刷新日内数据并替换进程内副本；没有本地数据时下载 INTRADAY_HISTORY_DAYS 天的历史"""
+    return _load_flight.do(("refresh", timeframe), lambda: _refresh_intraday(timeframe))
+
+
+def _refresh_intraday(timeframe: str) -> Dict[str, Any]:
+    entry = _intraday_series.get(timeframe)
+    if entry is not None:
+        series = entry[0]
+    else:
+        cached = intraday_store.load_cached(INTRADAY_SOURCES, timeframe)
+        series = cached[1] if cached else None
+
+    if series is not None:
+        # 从最后一根K线开始重新下载：它在上次下载时可能尚未收盘
+        source = series.source
+        since = int(series.date[-1])
+        new = PriceSeries.from_columns(
+            data_sources.download_intraday(source, timeframe, since), source=source, timeframe=timeframe
         )
-        resp = requests.get(url, headers=HEADERS, timeout=30)
-        if resp.status_code != 200:
-            raise RuntimeError(f"Binance 下载失败: HTTP {resp.status_code}")
-        # 避免请求过快
-        time.sleep(0.1)
-        data = resp.json()
-        if not isinstance(data, list) or not data:
-            break
-        for k in data:
-            # kline: [open time, open, high, low, close, volume, close time, ...]
-            try:
-                open_time = int(k[0]) // 1000
-                date = datetime.datetime.utcfromtimestamp(open_time).date()
-                open_ = float(k[1])
-                high = float(k[2])
-                low = float(k[3])
-                close = float(k[4])
-                volume = float(k[5])
-            except Exception:
-                continue
-            rows.append(
-                {
-                    "date": date,
-                    "open": open_,
-                    "high": high,
-                    "low": low,
-                    "close": close,
-                    "volume": volume,
-                }
-            )
-        # 准备下一段
-        last_open_time = int(data[-1][0])
-        next_start = last_open_time + 24 * 3600 * 1000
-        if next_start > end_ts or len(data) < limit:
-            break
+        merged, added = intraday_store.merge_columns(series, new)
+    else:
+        source = INTRADAY_SOURCES[0]
+        bar_seconds = TIMEFRAMES[timeframe]
+        since = int(time.time()) - INTRADAY_HISTORY_DAYS[timeframe] * 86400
+        since -= since % bar_seconds
+        columns = data_sources.download_intraday(source, timeframe, since)
+        if len(columns["date"]) == 0:
+            raise RuntimeError(f"{timeframe} 数据为空")
+        merged = PriceSeries.from_columns(columns, source=source, timeframe=timeframe)
+        added = len(merged)
+    merged, report = _validate(merged.columns(), source, timeframe)
+    try:
+        written = intraday_store.write_series(source, merged, since=since, quality=report)
+        print(f"[OK] 已写入 {timeframe} 分区 {written} 个")
+    except Exception as e:
+        print(f"[WARN] 写入 {timeframe} 分区失败: {e}")
+    print(f"[OK] 更新 {source} {timeframe}: 新增 {added} 条，共 {len(merged)} 条")
+    merged = _publish_dataset(merged)
+    _intraday_series[timeframe] = (merged, time.time())
+    return {
+        "source": source,
+        "timeframe": timeframe,
+        "added": added,
+        "rows": len(merged),
+        "last_date": merged.iso_dates[-1],
+        "version": merged.version,
+        "quality": report,
+    }
 
-    if not rows:
-        raise RuntimeError("Binance 数据为空")
-    rows.sort(key=lambda x: x["date"])
-    return rows
+
+def _load_intraday_series(timeframe: str) -> PriceSeries:
+    entry = _intraday_series.get(timeframe)
+    if entry is None:
+        return _load_flight.do(("load", timeframe), lambda: _initial_intraday_load(timeframe))
+    series, loaded_at = entry
+    if time.time() - loaded_at > CACHE_MAX_AGE_HOURS * 3600:
+        # 无论成功与否都重置计时，避免数据源故障时每个请求都去重试
+        _intraday_series[timeframe] = (series, time.time())
+        shared = _shared_dataset(timeframe, series)
+        if shared is not None:
+            _intraday_series[timeframe] = shared
+            return shared[0]
+        try:
+            refresh_intraday(timeframe)
+            series = _intraday_series[timeframe][0]
+        except Exception as e:
+            print(f"[WARN] {timeframe} 增量更新失败，继续使用已加载的数据: {e}")
+    return series
 
 
-def _download_from_coingecko() -> List[Dict[str, Any]]:
+def _initial_intraday_load(timeframe: str) -> PriceSeries:
     """
-    第三个数据源：CoinGecko API（免费，无需API key）
-    注意：CoinGecko免费版有速率限制，但通常比Yahoo/Binance更宽松
+    首次加载日内数据：优先映射其它 worker 发布的共享数据集；其次读取未过期的本地分区；
+    否则增量（或完整）下载，下载失败时退回过期的本地分区
     """
-    # CoinGecko 需要按日期范围分批获取，这里获取最近几年的数据
-    rows: List[Dict[str, Any]] = []
-    
-    # CoinGecko 的 market_chart API 可以获取最多90天的数据
-    # 我们需要循环获取历史数据
-    # 但免费API有限制，所以我们使用一个更简单的方法：获取最近的数据
-    # 为了获取更长的历史，我们使用ohlc API（需要pro版本）
-    # 作为备选，我们使用一个公开的CSV数据源或者简化版本
-    
-    # 尝试使用CoinGecko的简单价格历史API
-    # 注意：免费API限制较多，这里作为最后的备选
+    entry = _intraday_series.get(timeframe)
+    if entry is not None:
+        return entry[0]
+    shared = _shared_dataset(timeframe)
+    if shared is not None:
+        _intraday_series[timeframe] = shared
+        return shared[0]
+    cached = intraday_store.load_cached(INTRADAY_SOURCES, timeframe, max_age_hours=CACHE_MAX_AGE_HOURS)
+    if cached:
+        meta, series = cached
+        print(f"[OK] 从本地分区读取 {len(series)} 条 {timeframe} 数据（来源: {meta['source']}）")
+        series = _publish_dataset(_with_quality(meta, series))
+        _intraday_series[timeframe] = (series, time.time())
+        return series
     try:
-        # 使用CoinGecko的market_chart，获取最多90天的数据
-        # 为了获取更长的历史，我们需要多次请求
-        end_date = datetime.datetime.utcnow()
-        start_date = datetime.datetime(2020, 1, 1)  # 从2020年开始
-        
-        # CoinGecko的market_chart API返回的是从今天往前推的数据
-        # 我们只能获取最近的数据，所以这里简化处理
-        # 注意：CoinGecko的"max"参数会返回所有历史数据，但可能不包含未来日期
-        url = "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart"
-        params = {
-            "vs_currency": "usd",
-            "days": "max",  # 获取最大历史数据（到当前日期）
-            "interval": "daily"
-        }
-        
-        resp = requests.get(url, params=params, headers=HEADERS, timeout=30)
-        if resp.status_code != 200:
-            raise RuntimeError(f"CoinGecko 下载失败: HTTP {resp.status_code}")
-        
-        data = resp.json()
-        prices = data.get("prices", [])
-        
-        if not prices:
-            raise RuntimeError("CoinGecko 返回空数据")
-        
-        # prices格式: [[timestamp_ms, price], ...]
-        for item in prices:
-            try:
-                timestamp_ms = item[0]
-                price = float(item[1])
-                date = datetime.datetime.utcfromtimestamp(timestamp_ms / 1000).date()
-                # CoinGecko只提供价格，我们用价格作为open/high/low/close
-                rows.append({
-                    "date": date,
-                    "open": price,
-                    "high": price,
-                    "low": price,
-                    "close": price,
-                    "volume": 0.0,
-                })
-            except Exception:
-                continue
-        
-        if not rows:
-            raise RuntimeError("CoinGecko 数据为空")
-        
-        rows.sort(key=lambda x: x["date"])
-        return rows
+        _refresh_intraday(timeframe)
+    except Exception as e:
+        stale = intraday_store.load_cached(INTRADAY_SOURCES, timeframe)
+        if not stale:
+            raise RuntimeError(f"{timeframe} 数据下载失败且没有本地数据: {e}")
+        meta, series = stale
+        print(f"[WARN] {timeframe} 下载失败（{e}），使用过期的本地分区 {len(series)} 条数据")
+        _intraday_series[timeframe] = (_with_quality(meta, series), time.time())
+    return _intraday_series[timeframe][0]
+
+
+def import_history(
+    path: str, timeframe: str = "1d", source: Optional[str] = None, fmt: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    导入用户提供的历史K线文件（见 data_import.py）：合并进本地存储并校验后，
+    发布为共享数据集并立即替换进程内该周期的数据
+    """
+    global _price_series, _price_series_loaded_at
+    with _import_lock:
+        series, report, info = data_import.import_file(path, timeframe, source, fmt)
+    print(f"[OK] 导入 {info['rows_read']} 条 {timeframe} 数据到 {info['source']}，共 {info['rows']} 条，用时 {info['seconds']} 秒")
+    status = "OK" if report["ok"] else "WARN"
+    print(f"[{status}] 数据校验 {info['source']} {timeframe}: {data_quality.summarize(report)}")
+    _record_quality(series, report)
+    series = _publish_dataset(series)
+    if timeframe == "1d":
+        _price_series, _price_series_loaded_at = series, time.time()
+        _backtest_results.clear()
+    else:
+        _intraday_series[timeframe] = (series, time.time())
+    return {**info, "quality": report}
+
+
+def warm_up() -> None:
+    """预热：加载数据并启动回测工作进程，使第一个用户请求不必承担下载和进程启动的开销"""
+    started = time.time()
+    try:
+        series = load_price_series()
+        _backtest_executor.warm_up(series)
+        print(f"[OK] 预热完成：{len(series)} 条数据，耗时 {time.time() - started:.1f} 秒")
     except Exception as e:
-        raise RuntimeError(f"CoinGecko API错误: {str(e)}")
+        print(f"[WARN] 预热失败，将在首次请求时加载: {e}")
 
 
-@lru_cache(maxsize=1)
 def load_btc_daily() -> List[Dict[str, Any]]:
     """
-    下载真实 BTC 日线数据，按优先级尝试：Yahoo -> Binance -> CoinGecko
+    以行式K线（date 为 datetime.date）返回 BTC 日线数据，兼容旧代码。
+    新代码请使用 load_price_series()，避免每次都构建大量字典。
+    """
+    return load_price_series().to_rows()
+
+
+def _load_price_series_from_sources() -> PriceSeries:
+    """
+    加载 BTC 日线数据：
+    1. 优先读取未过期的本地磁盘缓存（见 data_cache.py），冷启动无需联网
+    2. 缓存已过期时只增量下载最后日期之后的K线
+    3. 没有缓存或增量更新失败时下载完整历史：按 Yahoo -> Binance -> CoinGecko 的优先级对冲请求（见 data_sources.py），
+       校验清洗（见 data_quality.py）后连同质量报告写回缓存
+    4. 在线数据源全部失败时，依次使用过期缓存、本地生成的示例数据
     """
-    errors = []
-    
-    # 尝试 Yahoo Finance
     try:
-        rows = _download_from_yahoo()
-        if not rows:
-            raise RuntimeError("Yahoo Finance 返回空数据")
-        print(f"[OK] 成功从 Yahoo Finance 下载 {len(rows)} 条BTC数据")
-        return rows
-    except Exception as e_yahoo:
-        error_msg = f"Yahoo: {str(e_yahoo)}"
-        errors.append(error_msg)
-        print(f"[FAIL] Yahoo Finance 下载失败: {e_yahoo}，尝试 Binance...")
-    
-    # 尝试 Binance
+        cached = load_cached(DATA_SOURCES)
+    except Exception as e:
+        cached = None
+        print(f"[WARN] 读取本地缓存失败: {e}")
+    if cached:
+        meta, series = cached
+        print(f"[OK] 从本地缓存读取 {len(series)} 条BTC数据（来源: {meta['source']}）")
+        return _with_quality(meta, series)
+
     try:
-        rows = _download_from_binance()
-        if not rows:
-            raise RuntimeError("Binance 返回空数据")
-        print(f"[OK] 成功从 Binance 下载 {len(rows)} 条BTC数据")
-        return rows
-    except Exception as e_binance:
-        error_msg = f"Binance: {str(e_binance)}"
-        errors.append(error_msg)
-        print(f"[FAIL] Binance 下载失败: {e_binance}，尝试 CoinGecko...")
-    
-    # 尝试 CoinGecko
+        result = _refresh_from_cache_incremental()
+        if result:
+            return result["series"]
+    except Exception as e:
+        print(f"[FAIL] 增量更新失败: {e}，尝试完整下载...")
+
+    errors = []
+
+    # 对冲下载：Yahoo 优先，迟迟没有结果或失败时并发启动 Binance、CoinGecko，谁先成功用谁
     try:
-        rows = _download_from_coingecko()
-        if not rows:
-            raise RuntimeError("CoinGecko 返回空数据")
-        print(f"[OK] 成功从 CoinGecko 下载 {len(rows)} 条BTC数据")
-        return rows
-    except Exception as e_coingecko:
-        error_msg = f"CoinGecko: {str(e_coingecko)}"
-        errors.append(error_msg)
-        print(f"[FAIL] CoinGecko 下载失败: {e_coingecko}，使用本地数据...")
-    
+        source, rows = data_sources.download_first_available(DATA_SOURCES)
+        series, report = _validate(columns_from_rows(rows), source)
+        _save_to_disk_cache(source, series, quality=report)
+        return series
+    except Exception as e_online:
+        errors.append(str(e_online))
+        print(f"[FAIL] {e_online}，尝试过期的本地缓存...")
+
+    # 在线数据源全部失败：过期缓存仍然是真实数据，优先于模拟数据
+    try:
+        stale = load_cached(DATA_SOURCES, max_age_hours=None)
+    except Exception:
+        stale = None
+    if stale:
+        meta, series = stale
+        print(f"[WARN] 使用过期的本地缓存 {len(series)} 条BTC数据（来源: {meta['source']}，截至 {meta['last_date']}）")
+        return _with_quality(meta, series)
+
     # 最后备选：使用本地生成的数据
     try:
         print("[WARN] 所有在线数据源均失败，使用本地生成的示例数据（仅用于测试）...")
@@ -290,7 +516,7 @@ def load_btc_daily() -> List[Dict[str, Any]]:
         if not rows:
             raise RuntimeError("本地数据生成失败")
         print(f"[OK] 使用本地数据 {len(rows)} 条BTC数据（注意：这是模拟数据，仅用于功能测试）")
-        return rows
+        return _validate(columns_from_rows(rows), "local")[0]
     except Exception as e_local:
         error_msg = f"本地数据: {str(e_local)}"
         errors.append(error_msg)
@@ -300,398 +526,193 @@ def load_btc_daily() -> List[Dict[str, Any]]:
         raise RuntimeError(final_error)
 
 
-def calculate_trade_cost(price: float, quantity: float, fee_rate: float, slippage_rate: float) -> float:
+# 回测结果缓存，键包含数据版本（见 result_cache.py）
+_backtest_results = ResultCache()
+
+
+# 回测执行器（进程池/线程池，有界排队，见 backtest_executor.py）
+_backtest_executor = BacktestExecutor()
+
+
+# 后台任务（大规模扫描等），结果持久化在 SQLite 中（见 jobs.py）
+_job_runner = JobRunner(JobStore(), load_series=load_price_series)
+
+
+# 实盘信号的增量策略状态（按参数缓存，见 live_strategy.py）
+_live_states = LiveStateCache()
+
+
+# /api/btc_daily 的预编码响应缓存（每个K线周期一份，数据版本变化时自动重建；最多保留 MAX_PAYLOAD_TIMEFRAMES 个周期）
+MAX_PAYLOAD_TIMEFRAMES = 16
+_daily_payloads: "OrderedDict[str, DailyPayloadCache]" = OrderedDict()
+_daily_payloads_lock = threading.Lock()
+
+
+def _daily_payload_cache(timeframe: str) -> DailyPayloadCache:
+    with _daily_payloads_lock:
+        cache = _daily_payloads.pop(timeframe, None) or DailyPayloadCache(symbol="BTC-USD", timeframe=timeframe)
+        _daily_payloads[timeframe] = cache
+        while len(_daily_payloads) > MAX_PAYLOAD_TIMEFRAMES:
+            _daily_payloads.popitem(last=False)
+        return cache
+
+
+@app.get("/api/btc_daily")
+def get_btc_daily(
+    request: Request,
+    start: Optional[datetime.date] = Query(None, description="起始日期（含），如 2020-01-01"),
+    end: Optional[datetime.date] = Query(None, description="结束日期（含）"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
     """
-    计算交易成本（手续费 + 滑点）
-    - fee_rate: 手续费率（如0.001表示0.1%）
-    - slippage_rate: 滑点率（如0.0005表示0.05%）
+    提供原始 BTC K线数据（默认日线，timeframe 可选日内周期），方便未来其他策略共用。
+    响应按数据版本预先序列化，支持 gzip/br 压缩、ETag 协商缓存和日期区间切片。
     """
-    trade_value = price * quantity
-    fee = trade_value * fee_rate
-    slippage = trade_value * slippage_rate
-    return fee + slippage
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="起始日期不能晚于结束日期")
+    try:
+        check_timeframe(timeframe)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    try:
+        series = load_price_series(timeframe)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+    lo = series.index_of(start) if start else 0
+    hi = series.index_of(end, side="right") if end else len(series)
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    body, encoding, etag = _daily_payload_cache(timeframe).get(series, lo, hi, encoding)
 
-def run_double_ma_strategy(
-    data: List[Dict[str, Any]], 
-    short: int, 
-    long: int, 
-    initial_capital: float = 10000.0,
-    # 交易成本参数
-    fee_rate: float = 0.001,  # 手续费率，默认0.1%
-    slippage_rate: float = 0.0005,  # 滑点率，默认0.05%
-    # 风险管理参数
-    stop_loss_pct: float = 0.0,  # 止损百分比，0表示不使用
-    take_profit_pct: float = 0.0,  # 止盈百分比，0表示不使用
-) -> Dict[str, Any]:
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.post("/api/data/refresh")
+def refresh_data(
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
     """
-    增强版双均线策略：收盘价短均线上穿长均线做多，下穿全部平仓。
-    不做做空，只做多，始终满仓或空仓。
-    
-    新增功能：
-    - 交易成本模拟（手续费+滑点）
-    - 止损止盈功能
-    - 高级统计指标（Sortino、Calmar等）
+    增量更新 BTC K线数据：只下载缓存最后日期之后的K线，并立即替换当前进程内的数据。
     """
-    if short >= long:
-        raise ValueError("短均线周期必须小于长均线周期")
-    
-    if not data or len(data) < long:
-        raise ValueError(f"数据不足，至少需要 {long} 条记录，当前只有 {len(data) if data else 0} 条")
+    try:
+        check_timeframe(timeframe)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    try:
+        # 重采样得到的周期刷新其基础周期
+        base = base_timeframe(timeframe)
+        return refresh_btc_daily() if base == "1d" else refresh_intraday(base)
+    except ValueError as ve:
+        raise HTTPException(status_code=502, detail=f"增量数据校验失败: {str(ve)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"数据刷新失败: {str(e)}")
 
-    rows = sorted(data, key=lambda x: x["date"])
 
-    closes = [r["close"] for r in rows]
-    dates = [r["date"] for r in rows]
-    
-    # 验证数据有效性
-    if not closes or all(c <= 0 for c in closes):
-        raise ValueError("数据无效：收盘价必须大于0")
-
-    n = len(rows)
-    ma_short = [None] * n
-    ma_long = [None] * n
-
-    # 简单移动平均
-    for i in range(n):
-        if i + 1 >= short:
-            window = closes[i + 1 - short : i + 1]
-            ma_short[i] = sum(window) / len(window)
-        if i + 1 >= long:
-            window = closes[i + 1 - long : i + 1]
-            ma_long[i] = sum(window) / len(window)
-
-    signal = [0] * n
-    for i in range(n):
-        if ma_short[i] is not None and ma_long[i] is not None and ma_short[i] > ma_long[i]:
-            signal[i] = 1
-
-    position = [0] * n
-    for i in range(1, n):
-        position[i] = signal[i - 1]
-
-    # 使用更真实的交易逻辑，考虑交易成本和止损止盈
-    equity = [initial_capital] * n
-    cash = initial_capital
-    holdings = 0.0  # 持仓数量
-    entry_price = 0.0
-    entry_index = 0
-    highest_price_after_entry = 0.0  # 用于跟踪最高价（移动止损）
-    
-    # 计算每日收益率（用于统计）
-    pct_change = [0.0] * n
-    for i in range(1, n):
-        if closes[i - 1] != 0:
-            pct_change[i] = closes[i] / closes[i - 1] - 1.0
-    
-    strategy_ret = [0.0] * n
-    
-    for i in range(1, n):
-        current_price = closes[i]
-        prev_pos = position[i - 1]
-        curr_pos = position[i]
-        
-        # 检查止损止盈（仅在持仓时）
-        if holdings > 0 and entry_price > 0:
-            # 更新最高价
-            if current_price > highest_price_after_entry:
-                highest_price_after_entry = current_price
-            
-            # 检查止损
-            if stop_loss_pct > 0:
-                stop_loss_price = entry_price * (1 - stop_loss_pct / 100)
-                if current_price <= stop_loss_price:
-                    # 触发止损，强制平仓
-                    trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
-                    cash = holdings * current_price - trade_cost
-                    holdings = 0.0
-                    entry_price = 0.0
-                    highest_price_after_entry = 0.0
-                    position[i] = 0  # 更新position数组
-                    equity[i] = cash
-                    strategy_ret[i] = (cash - equity[i - 1]) / equity[i - 1] if equity[i - 1] > 0 else 0.0
-                    continue
-            
-            # 检查止盈
-            if take_profit_pct > 0:
-                take_profit_price = entry_price * (1 + take_profit_pct / 100)
-                if current_price >= take_profit_price:
-                    # 触发止盈，强制平仓
-                    trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
-                    cash = holdings * current_price - trade_cost
-                    holdings = 0.0
-                    entry_price = 0.0
-                    highest_price_after_entry = 0.0
-                    position[i] = 0  # 更新position数组
-                    equity[i] = cash
-                    strategy_ret[i] = (cash - equity[i - 1]) / equity[i - 1] if equity[i - 1] > 0 else 0.0
-                    continue
-        
-        # 买入信号：从空仓到持仓
-        if prev_pos == 0 and curr_pos == 1:
-            if cash > 0:
-                # 计算可买入数量（考虑交易成本）
-                trade_cost_estimate = cash * (fee_rate + slippage_rate)
-                available_cash = cash - trade_cost_estimate
-                if available_cash > 0:
-                    holdings = available_cash / current_price
-                    trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
-                    cash = cash - holdings * current_price - trade_cost
-                    entry_price = current_price
-                    entry_index = i
-                    highest_price_after_entry = current_price
-        
-        # 卖出信号：从持仓到空仓
-        elif prev_pos == 1 and curr_pos == 0:
-            if holdings > 0:
-                trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
-                cash = holdings * current_price - trade_cost
-                holdings = 0.0
-                entry_price = 0.0
-                highest_price_after_entry = 0.0
-        
-        # 计算当前净值
-        equity[i] = cash + holdings * current_price
-        if equity[i - 1] > 0:
-            strategy_ret[i] = (equity[i] - equity[i - 1]) / equity[i - 1]
-        else:
-            strategy_ret[i] = 0.0
-
-    # 重新计算交易记录（基于实际交易）
-    trades: List[Dict[str, Any]] = []
-    current_pos = 0
-    entry_price_record = 0.0
-    entry_date_record: datetime.date | None = None
-    entry_index_record = 0
-    exit_reason = "signal"  # signal, stop_loss, take_profit
-
-    for i in range(1, n):
-        pos = int(position[i])
-        prev_pos = int(position[i - 1])
-        price = float(closes[i])
-        date = dates[i]
-        
-        # 买入
-        if prev_pos == 0 and pos == 1:
-            current_pos = 1
-            entry_price_record = price
-            entry_date_record = date
-            entry_index_record = i
-            exit_reason = "signal"
-        
-        # 卖出（检查是否因为止损止盈）
-        elif prev_pos == 1 and pos == 0:
-            exit_price = price
-            exit_date = date
-            
-            # 检查是否因为止损止盈
-            if entry_price_record > 0:
-                if stop_loss_pct > 0 and price <= entry_price_record * (1 - stop_loss_pct / 100):
-                    exit_reason = "stop_loss"
-                elif take_profit_pct > 0 and price >= entry_price_record * (1 + take_profit_pct / 100):
-                    exit_reason = "take_profit"
-                else:
-                    exit_reason = "signal"
-            
-            trades.append(
-                {
-                    "entry_date": entry_date_record.isoformat() if entry_date_record else None,
-                    "exit_date": exit_date.isoformat(),
-                    "entry_price": entry_price_record,
-                    "exit_price": exit_price,
-                    "pnl_pct": (exit_price - entry_price_record) / entry_price_record
-                    if entry_price_record > 0
-                    else 0.0,
-                    "exit_reason": exit_reason,
-                }
-            )
-            current_pos = 0
-            entry_price_record = 0.0
-            entry_date_record = None
-            exit_reason = "signal"
-
-    equity_curve: List[Dict[str, Any]] = []
-    for i in range(n):
-        if ma_short[i] is None or ma_long[i] is None:
-            continue
-        equity_curve.append(
-            {
-                "date": dates[i].isoformat(),
-                "close": float(closes[i]),
-                "ma_short": float(ma_short[i]),
-                "ma_long": float(ma_long[i]),
-                "equity": float(equity[i]),
-                "position": int(position[i]),
-            }
-        )
+@app.post("/api/data/import")
+async def import_data(
+    request: Request,
+    timeframe: str = Query("1d", description="文件中K线的周期：1d（默认）、1h、15m、1m"),
+    source: Optional[str] = Query(None, description="合并到哪个数据源的存储，默认为当前使用的数据源"),
+    file_format: str = Query("csv", description="文件格式：csv（默认）或 parquet（需要 pyarrow）"),
+):
+    """
+    导入历史K线文件：请求体为文件的原始内容（如 curl --data-binary @btc.csv），
+    边接收边写入临时文件，再分块解析、校验后合并进本地存储，并立即替换当前进程内的数据。
+    需要设置 BTC_IMPORT_TOKEN 并在 X-Import-Token 头中提供；文件超过 BTC_IMPORT_MAX_MB 时返回 413
+    """
+    if not IMPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="数据导入接口未启用（需设置 BTC_IMPORT_TOKEN）")
+    if not hmac.compare_digest(request.headers.get("x-import-token", "").encode(), IMPORT_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="X-Import-Token 无效")
+    too_large = HTTPException(status_code=413, detail=f"文件超过导入上限 {IMPORT_MAX_BYTES} 字节（BTC_IMPORT_MAX_MB）")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > IMPORT_MAX_BYTES:
+        raise too_large
+    if timeframe not in TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"只能导入基础周期的K线: {', '.join(TIMEFRAMES)}")
+    if file_format not in data_import.FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的文件格式: {file_format}，可选: {', '.join(data_import.FORMATS)}")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="import-", suffix=f".{file_format}.tmp", dir=CACHE_DIR)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            received = 0
+            pending = bytearray()
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > IMPORT_MAX_BYTES:
+                    raise too_large
+                pending += chunk
+                if len(pending) >= IMPORT_WRITE_BYTES:
+                    await run_in_threadpool(f.write, pending)
+                    pending.clear()
+            if pending:
+                await run_in_threadpool(f.write, pending)
+        return await run_in_threadpool(import_history, path, timeframe, source, file_format)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"数据导入失败: {str(e)}")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
-    if equity_curve:
-        total_ret = equity_curve[-1]["equity"] / initial_capital - 1.0
-    else:
-        total_ret = 0.0
-
-    max_drawdown = 0.0
-    if equity_curve:
-        peak = equity_curve[0]["equity"]
-        max_dd = 0.0
-        for pt in equity_curve:
-            eq = pt["equity"]
-            if eq > peak:
-                peak = eq
-            dd = eq / peak - 1.0
-            if dd < max_dd:
-                max_dd = dd
-        max_drawdown = float(max_dd)
-
-    # 年化收益（CAGR）与高级指标
-    cagr = 0.0
-    sharpe = 0.0
-    sortino = 0.0
-    calmar = 0.0
-    annualized_vol = 0.0
-    max_drawdown_duration = 0
-    
-    if equity_curve and len(dates) > 0:
-        days = (dates[-1] - dates[0]).days
-        if days > 0:
-            years = days / 365.25
-            if years > 0:
-                final_equity = equity_curve[-1]["equity"]
-                if final_equity > 0 and initial_capital > 0:
-                    cagr = (final_equity / initial_capital) ** (1 / years) - 1.0
-        
-        # 计算收益率序列（用于统计）
-        returns = []
-        for i in range(1, len(equity_curve)):
-            if equity_curve[i - 1]["equity"] > 0:
-                ret = (equity_curve[i]["equity"] - equity_curve[i - 1]["equity"]) / equity_curve[i - 1]["equity"]
-                returns.append(ret)
-        
-        if len(returns) > 1:
-            mean_ret = sum(returns) / len(returns)
-            var = sum((r - mean_ret) ** 2 for r in returns) / len(returns)
-            std = var ** 0.5 if var > 0 else 0.0
-            
-            # 年化波动率
-            annualized_vol = std * (252 ** 0.5) if std > 0 else 0.0
-            
-            # 夏普比率（无风险利率视为0）
-            if annualized_vol > 0:
-                sharpe = (cagr) / annualized_vol
-            
-            # Sortino比率（只考虑下行波动）
-            downside_returns = [r for r in returns if r < 0]
-            if len(downside_returns) > 0:
-                downside_var = sum(r ** 2 for r in downside_returns) / len(downside_returns)
-                downside_std = downside_var ** 0.5 if downside_var > 0 else 0.0
-                annualized_downside_vol = downside_std * (252 ** 0.5) if downside_std > 0 else 0.0
-                if annualized_downside_vol > 0:
-                    sortino = (cagr) / annualized_downside_vol
-                elif cagr > 0:
-                    sortino = float('inf')
-            
-            # Calmar比率（年化收益/最大回撤）
-            if max_drawdown < 0:
-                calmar = cagr / abs(max_drawdown) if max_drawdown != 0 else 0.0
-        
-        # 计算最大回撤持续时间
-        peak = equity_curve[0]["equity"]
-        current_dd_duration = 0
-        for pt in equity_curve:
-            eq = pt["equity"]
-            if eq > peak:
-                peak = eq
-                current_dd_duration = 0
-            else:
-                current_dd_duration += 1
-                max_drawdown_duration = max(max_drawdown_duration, current_dd_duration)
-
-    # 交易统计
-    win_count = 0
-    loss_count = 0
-    win_sum = 0.0
-    loss_sum = 0.0
-    hold_days = []
-    for t in trades:
-        pnl = t["pnl_pct"]
-        if pnl > 0:
-            win_count += 1
-            win_sum += pnl
-        elif pnl < 0:
-            loss_count += 1
-            loss_sum += pnl
-        if t["entry_date"] and t["exit_date"]:
-            try:
-                d1 = datetime.datetime.strptime(t["entry_date"], "%Y-%m-%d").date()
-                d2 = datetime.datetime.strptime(t["exit_date"], "%Y-%m-%d").date()
-                hold_days.append((d2 - d1).days or 1)
-            except Exception:
-                pass
-    total_trades = len(trades)
-    win_rate = win_count / total_trades if total_trades > 0 else 0.0
-    avg_win = win_sum / win_count if win_count > 0 else 0.0
-    avg_loss = loss_sum / loss_count if loss_count > 0 else 0.0
-    profit_factor = (win_sum) / abs(loss_sum) if loss_sum != 0 else None
-    avg_hold = sum(hold_days) / len(hold_days) if hold_days else None
 
+@app.get("/api/data/quality")
+def data_quality_report(
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    当前数据的质量报告（重复/缺失日期、补全的字段、OHLC 不一致、缺口、异常跳变等）。
+    重采样得到的周期返回其基础周期的报告
+    """
+    try:
+        check_timeframe(timeframe)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    base = base_timeframe(timeframe)
+    try:
+        series = load_price_series(base)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"数据加载失败: {str(e)}")
+    report = _quality_reports.get(series.version)
+    if report is None:
+        # 报告已被淘汰（或数据来自没有报告的旧缓存）：对当前数据重新统计一次
+        report = data_quality.validate_series(series)[1]
+        _record_quality(series, report)
     return {
-        "params": {
-            "short": short,
-            "long": long,
-            "initial_capital": initial_capital,
-            "fee_rate": fee_rate,
-            "slippage_rate": slippage_rate,
-            "stop_loss_pct": stop_loss_pct,
-            "take_profit_pct": take_profit_pct,
-        },
-        "equity_curve": equity_curve,
-        "trades": trades,
-        "summary": {
-            "total_return_pct": float(total_ret * 100),
-            "cagr_pct": float(cagr * 100),
-            "sharpe_ratio": float(sharpe) if not (isinstance(sharpe, float) and sharpe == float('inf')) else None,
-            "sortino_ratio": float(sortino) if not (isinstance(sortino, float) and sortino == float('inf')) else None,
-            "calmar_ratio": float(calmar) if not (isinstance(calmar, float) and calmar == float('inf')) else None,
-            "annualized_volatility_pct": float(annualized_vol * 100),
-            "max_drawdown_pct": float(max_drawdown * 100),
-            "max_drawdown_duration": max_drawdown_duration,
-            "num_trades": total_trades,
-            "win_rate_pct": float(win_rate * 100),
-            "profit_factor": float(profit_factor) if profit_factor is not None else None,
-            "avg_win_pct": float(avg_win * 100) if win_count > 0 else None,
-            "avg_loss_pct": float(avg_loss * 100) if loss_count > 0 else None,
-            "avg_hold_days": float(avg_hold) if avg_hold is not None else None,
-        },
+        "timeframe": base,
+        "source": series.source,
+        "version": series.version,
+        "rows": len(series),
+        "quality": report,
     }
 
 
-@app.get("/api/btc_daily")
-def get_btc_daily():
+@app.get("/api/cache/stats")
+def cache_stats():
     """
-    提供原始 BTC 日线数据，方便未来其他策略共用。
+    回测结果缓存、指标缓存、重采样缓存的命中率、占用内存等统计，以及回测执行器的排队情况
     """
-    try:
-        rows = load_btc_daily()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-    records = []
-    for row in rows:
-        records.append(
-            {
-                "date": row["date"].isoformat(),
-                "open": float(row["open"]),
-                "high": float(row["high"]),
-                "low": float(row["low"]),
-                "close": float(row["close"]),
-                "volume": float(row["volume"]),
-            }
-        )
-    return {"symbol": "BTC-USD", "timeframe": "1d", "data": records}
+    return {
+        "backtest_results": _backtest_results.stats(),
+        "indicators": indicator_memo.stats(),
+        "resampled": resample_cache.stats(),
+        "backtest_executor": _backtest_executor.stats(),
+    }
 
 
 @app.get("/api/backtest/double_ma")
-def backtest_double_ma(
+async def backtest_double_ma(
     short: int = Query(10, ge=2, le=200),
     long: int = Query(50, ge=5, le=400),
     initial_capital: float = Query(10000.0, gt=0),
@@ -701,6 +722,10 @@ def backtest_double_ma(
     # 风险管理参数
     stop_loss_pct: float = Query(0.0, ge=0, le=50, description="止损百分比，0表示不使用"),
     take_profit_pct: float = Query(0.0, ge=0, le=100, description="止盈百分比，0表示不使用"),
+    fmt: str = Query("json", alias="format", description="输出格式：json（行式，默认）、columns（列式JSON）、msgpack"),
+    fields: str = Query("summary,trades,curve", description="返回的部分，可选 summary/trades/curve，逗号或|分隔"),
+    max_points: Optional[int] = Query(None, ge=3, le=100000, description="资金曲线最多返回的点数（LTTB降采样）"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
 ):
     """
     增强版双均线策略回测接口。
@@ -708,24 +733,41 @@ def backtest_double_ma(
     - 交易成本模拟（手续费+滑点）
     - 止损止盈功能
     - 高级统计指标（Sortino、Calmar等）
+    相同参数在同一数据版本下的结果直接从缓存返回（响应头 X-Cache: HIT/MISS）。
+    未命中时在回测执行器中计算（见 backtest_executor.py），排队已满返回 429，超时返回 504。
     """
     try:
-        data = load_btc_daily()
-        if not data:
+        check_format(fmt)
+        selected = parse_fields(fields)
+        # 加载数据可能需要联网，放到线程池中，不阻塞事件循环
+        data = await run_in_threadpool(load_price_series, timeframe)
+        if len(data) == 0:
             raise HTTPException(status_code=500, detail="无法获取BTC数据，请检查网络连接")
-        result = run_double_ma_strategy(
-            data=data, 
-            short=short, 
-            long=long, 
+        params = dict(
+            short=short,
+            long=long,
             initial_capital=initial_capital,
             fee_rate=fee_rate,
             slippage_rate=slippage_rate,
             stop_loss_pct=stop_loss_pct,
             take_profit_pct=take_profit_pct,
         )
-        return result
+        cache_key = make_cache_key(
+            data.version, format=fmt, fields=",".join(sorted(selected)), max_points=max_points, **params
+        )
+        body = _backtest_results.get(cache_key)
+        cache_status = "HIT"
+        if body is None:
+            cache_status = "MISS"
+            body = await _backtest_executor.run(data, params, fmt=fmt, fields=selected, max_points=max_points)
+            _backtest_results.put(cache_key, body)
+        return Response(content=body, media_type=MEDIA_TYPES[fmt], headers={"X-Cache": cache_status})
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
+    except ExecutorBusy as busy:
+        raise HTTPException(status_code=429, detail=str(busy), headers={"Retry-After": str(busy.retry_after)})
+    except TimeoutError as te:
+        raise HTTPException(status_code=504, detail=str(te))
     except HTTPException:
         raise
     except Exception as e:
@@ -735,6 +777,423 @@ def backtest_double_ma(
         raise HTTPException(status_code=500, detail=f"回测失败: {str(e)}")
 
 
+@app.get("/api/backtest/double_ma/sweep")
+def backtest_double_ma_sweep(
+    short: str = Query("5:30:5", description="短均线周期范围，如 5:30:5 或 5,10,20"),
+    long: str = Query("50:200:50", description="长均线周期范围"),
+    stop_loss_pct: str = Query("0", description="止损百分比范围，0表示不使用"),
+    take_profit_pct: str = Query("0", description="止盈百分比范围，0表示不使用"),
+    fee_rate: str = Query("0.001", description="手续费率范围"),
+    slippage_rate: str = Query("0.0005", description="滑点率范围"),
+    initial_capital: float = Query(10000.0, gt=0),
+    sort_by: str = Query("sharpe_ratio", description="排序指标，取自回测摘要字段"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    top: int = Query(100, ge=1, le=20000, description="返回排名前N的组合"),
+    workers: int = Query(1, ge=1, le=64, description="并行进程数，大于1时分片到进程池执行"),
+    fmt: str = Query("json", alias="format", description="输出格式：json（行式，默认）、columns（结果表为并列数组）、msgpack"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    双均线策略参数网格扫描接口。
+    每个均线窗口只计算一次并在所有组合间复用，返回按指标排序的摘要表。
+    """
+    try:
+        check_format(fmt)
+        grid = parse_sweep_grid(
+            dict(
+                short=short,
+                long=long,
+                stop_loss_pct=stop_loss_pct,
+                take_profit_pct=take_profit_pct,
+                fee_rate=fee_rate,
+                slippage_rate=slippage_rate,
+            )
+        )
+        data = load_price_series(timeframe)
+        if len(data) == 0:
+            raise HTTPException(status_code=500, detail="无法获取BTC数据，请检查网络连接")
+        result = run_double_ma_sweep(
+            data,
+            grid,
+            initial_capital=initial_capital,
+            sort_by=sort_by,
+            descending=(order == "desc"),
+            top=top,
+            workers=workers,
+        )
+        if result_layout(fmt) == "columns":
+            result["results"] = rows_to_columns(result["results"])
+        return Response(content=encode(result, fmt), media_type=MEDIA_TYPES[fmt])
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_detail = f"{str(e)}\n{traceback.format_exc()}"
+        print(f"参数扫描错误: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"参数扫描失败: {str(e)}")
+
+
+@app.get("/api/backtest/double_ma/sweep/stream")
+async def backtest_double_ma_sweep_stream(
+    request: Request,
+    short: str = Query("5:30:5", description="短均线周期范围，如 5:30:5 或 5,10,20"),
+    long: str = Query("50:200:50", description="长均线周期范围"),
+    stop_loss_pct: str = Query("0", description="止损百分比范围，0表示不使用"),
+    take_profit_pct: str = Query("0", description="止盈百分比范围，0表示不使用"),
+    fee_rate: str = Query("0.001", description="手续费率范围"),
+    slippage_rate: str = Query("0.0005", description="滑点率范围"),
+    initial_capital: float = Query(10000.0, gt=0),
+    workers: int = Query(1, ge=1, le=64, description="并行进程数，大于1时分片到进程池执行"),
+    mode: str = Query("ndjson", pattern="^(ndjson|sse)$", description="流式格式：ndjson 或 sse（Server-Sent Events）"),
+    progress_interval: float = Query(1.0, ge=0.1, le=60, description="进度事件的间隔秒数"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    流式参数扫描：每个组合完成即推送一条 result 事件，并定期推送 progress（含预计剩余时间），
+    最后推送 done。结果不在服务端累积；客户端断开连接即取消扫描。
+    """
+    try:
+        grid = parse_sweep_grid(
+            dict(
+                short=short,
+                long=long,
+                stop_loss_pct=stop_loss_pct,
+                take_profit_pct=take_profit_pct,
+                fee_rate=fee_rate,
+                slippage_rate=slippage_rate,
+            )
+        )
+        data = await run_in_threadpool(load_price_series, timeframe)
+        series = check_sweep_data(data, grid)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    events = stream_sweep_events(series, grid, initial_capital, workers, progress_interval)
+
+    async def body():
+        try:
+            while True:
+                item = await run_in_threadpool(next, events, None)
+                if item is None:
+                    break
+                yield encode_event(*item, mode=mode)
+                if await request.is_disconnected():
+                    print("[WARN] 客户端已断开，取消参数扫描")
+                    break
+        except Exception as e:
+            print(f"参数扫描错误: {e}")
+            yield encode_event("error", {"detail": f"参数扫描失败: {str(e)}"}, mode=mode)
+        finally:
+            # 关闭生成器：取消尚未开始的分片并释放进程池、共享内存
+            await run_in_threadpool(events.close)
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[mode],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/api/backtest/double_ma/compare")
+def backtest_double_ma_compare(
+    sets: str = Query("10:50,20:100", description="逗号分隔的参数组，每组为 short:long[:stop_loss_pct[:take_profit_pct]]"),
+    benchmark: bool = Query(False, description="是否加入买入持有作为基准"),
+    initial_capital: float = Query(10000.0, gt=0),
+    fee_rate: float = Query(0.001, ge=0, le=0.01, description="手续费率，默认0.1%"),
+    slippage_rate: float = Query(0.0005, ge=0, le=0.01, description="滑点率，默认0.05%"),
+    max_points: Optional[int] = Query(None, ge=3, le=100000, description="对齐后的资金曲线最多保留的点数（所有曲线一起做 LTTB 降采样）"),
+    fmt: str = Query("json", alias="format", description="输出格式：json（行式，默认）、columns（列式JSON）、msgpack"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    多组参数并排对比：一次请求在同一份数据上回测多组双均线参数，
+    均线按窗口只计算一次，返回对齐的资金曲线和统计摘要表
+    """
+    try:
+        check_format(fmt)
+        strategies = parse_strategy_sets(sets)
+        data = load_price_series(timeframe)
+        if len(data) == 0:
+            raise HTTPException(status_code=500, detail="无法获取BTC数据，请检查网络连接")
+        result = run_comparison(
+            data,
+            strategies,
+            initial_capital=initial_capital,
+            fee_rate=fee_rate,
+            slippage_rate=slippage_rate,
+            benchmark=benchmark,
+            layout=result_layout(fmt),
+            max_points=max_points,
+        )
+        return Response(content=encode(result, fmt), media_type=MEDIA_TYPES[fmt])
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_detail = f"{str(e)}\n{traceback.format_exc()}"
+        print(f"策略对比错误: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"策略对比失败: {str(e)}")
+
+
+@app.get("/api/backtest/double_ma/walk_forward")
+def backtest_double_ma_walk_forward(
+    short: str = Query("5:30:5", description="短均线周期候选范围，如 5:30:5 或 5,10,20"),
+    long: str = Query("50:200:50", description="长均线周期候选范围"),
+    in_sample_bars: int = Query(730, ge=20, le=100000, description="样本内窗口K线数"),
+    out_of_sample_bars: int = Query(180, ge=5, le=100000, description="样本外窗口K线数（也是窗口滚动步长）"),
+    anchored: bool = Query(False, description="true 时样本内窗口始终从头开始（扩展窗口）"),
+    sort_by: str = Query("sharpe_ratio", description="样本内选优指标，取自回测摘要字段"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    initial_capital: float = Query(10000.0, gt=0),
+    fee_rate: float = Query(0.001, ge=0, le=0.01, description="手续费率，默认0.1%"),
+    slippage_rate: float = Query(0.0005, ge=0, le=0.01, description="滑点率，默认0.05%"),
+    stop_loss_pct: float = Query(0.0, ge=0, le=50, description="止损百分比，0表示不使用"),
+    take_profit_pct: float = Query(0.0, ge=0, le=100, description="止盈百分比，0表示不使用"),
+    max_points: Optional[int] = Query(None, ge=3, le=100000, description="样本外资金曲线最多返回的点数（LTTB降采样）"),
+    fmt: str = Query("json", alias="format", description="输出格式：json（行式，默认）、columns（列式JSON）、msgpack"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    滚动前推分析：在每个样本内窗口选出最优 short/long，在随后的样本外窗口检验，
+    返回各窗口结果、拼接后的样本外资金曲线和整体统计。
+    """
+    try:
+        check_format(fmt)
+        data = load_price_series(timeframe)
+        if len(data) == 0:
+            raise HTTPException(status_code=500, detail="无法获取BTC数据，请检查网络连接")
+        result = run_walk_forward(
+            data,
+            shorts=parse_param_range("short", short, int),
+            longs=parse_param_range("long", long, int),
+            in_sample_bars=in_sample_bars,
+            out_of_sample_bars=out_of_sample_bars,
+            anchored=anchored,
+            sort_by=sort_by,
+            descending=(order == "desc"),
+            initial_capital=initial_capital,
+            fee_rate=fee_rate,
+            slippage_rate=slippage_rate,
+            stop_loss_pct=stop_loss_pct,
+            take_profit_pct=take_profit_pct,
+            layout=result_layout(fmt),
+            max_points=max_points,
+        )
+        return Response(content=encode(result, fmt), media_type=MEDIA_TYPES[fmt])
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_detail = f"{str(e)}\n{traceback.format_exc()}"
+        print(f"滚动前推分析错误: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"滚动前推分析失败: {str(e)}")
+
+
+@app.get("/api/live/double_ma/signal")
+def live_double_ma_signal(
+    short: int = Query(10, ge=2, le=200),
+    long: int = Query(50, ge=5, le=400),
+    initial_capital: float = Query(10000.0, gt=0),
+    fee_rate: float = Query(0.001, ge=0, le=0.01, description="手续费率，默认0.1%"),
+    slippage_rate: float = Query(0.0005, ge=0, le=0.01, description="滑点率，默认0.05%"),
+    stop_loss_pct: float = Query(0.0, ge=0, le=50, description="止损百分比，0表示不使用"),
+    take_profit_pct: float = Query(0.0, ge=0, le=100, description="止盈百分比，0表示不使用"),
+    snapshot: bool = Query(False, description="是否同时返回状态快照（可用于 POST /api/live/double_ma/update）"),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    最新K线收盘后的策略状态与下一根K线的操作建议。
+    状态按 (周期, 参数) 常驻内存，数据更新后只推进新增的K线，不重跑全部历史。
+    """
+    try:
+        data = load_price_series(timeframe)
+        if len(data) == 0:
+            raise HTTPException(status_code=500, detail="无法获取BTC数据，请检查网络连接")
+        state = _live_states.get(
+            data,
+            with_snapshot=snapshot,
+            short=short,
+            long=long,
+            initial_capital=initial_capital,
+            fee_rate=fee_rate,
+            slippage_rate=slippage_rate,
+            stop_loss_pct=stop_loss_pct,
+            take_profit_pct=take_profit_pct,
+        )
+        return state if snapshot else state["current"]
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        error_detail = f"{str(e)}\n{traceback.format_exc()}"
+        print(f"实盘信号错误: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"实盘信号计算失败: {str(e)}")
+
+
+@app.post("/api/live/double_ma/update")
+def live_double_ma_update(payload: Dict[str, Any] = Body(..., description='{"snapshot": {...}, "bars": [{"date": "2026-01-02", "close": 95000.0}]}')):
+    """
+    在客户端保存的状态快照上推进新K线（每根 O(1)），返回新的状态和快照；服务端不保存任何状态
+    """
+    try:
+        state = DoubleMAState.restore(payload["snapshot"])
+        for bar in payload.get("bars", []):
+            state.update(str(bar["date"]), float(bar["close"]))
+        return {"current": state.current(), "snapshot": state.snapshot()}
+    except (KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"请求格式错误: {e!r}")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        import traceback
+        error_detail = f"{str(e)}\n{traceback.format_exc()}"
+        print(f"实盘状态推进错误: {error_detail}")
+        raise HTTPException(status_code=500, detail=f"实盘状态推进失败: {str(e)}")
+
+
+@app.post("/api/jobs/sweep", status_code=202)
+def submit_sweep_job(
+    short: str = Query("5:30:5", description="短均线周期范围，如 5:30:5 或 5,10,20"),
+    long: str = Query("50:200:50", description="长均线周期范围"),
+    stop_loss_pct: str = Query("0", description="止损百分比范围，0表示不使用"),
+    take_profit_pct: str = Query("0", description="止盈百分比范围，0表示不使用"),
+    fee_rate: str = Query("0.001", description="手续费率范围"),
+    slippage_rate: str = Query("0.0005", description="滑点率范围"),
+    initial_capital: float = Query(10000.0, gt=0),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    提交后台参数扫描任务（组合数上限远大于同步接口），立即返回任务信息；
+    用 GET /api/jobs/{id} 查询进度，完成后用 GET /api/jobs/{id}/results 获取排序结果。
+    """
+    ranges = dict(
+        short=short,
+        long=long,
+        stop_loss_pct=stop_loss_pct,
+        take_profit_pct=take_profit_pct,
+        fee_rate=fee_rate,
+        slippage_rate=slippage_rate,
+    )
+    try:
+        check_timeframe(timeframe)
+        return _job_runner.submit("sweep", {"ranges": ranges, "initial_capital": initial_capital, "timeframe": timeframe})
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.post("/api/jobs/walk_forward", status_code=202)
+def submit_walk_forward_job(
+    short: str = Query("5:30:5", description="短均线周期候选范围，如 5:30:5 或 5,10,20"),
+    long: str = Query("50:200:50", description="长均线周期候选范围"),
+    in_sample_bars: int = Query(730, ge=20, le=100000, description="样本内窗口K线数"),
+    out_of_sample_bars: int = Query(180, ge=5, le=100000, description="样本外窗口K线数（也是窗口滚动步长）"),
+    anchored: bool = Query(False, description="true 时样本内窗口始终从头开始（扩展窗口）"),
+    sort_by: str = Query("sharpe_ratio", description="样本内选优指标，取自回测摘要字段"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    initial_capital: float = Query(10000.0, gt=0),
+    fee_rate: float = Query(0.001, ge=0, le=0.01),
+    slippage_rate: float = Query(0.0005, ge=0, le=0.01),
+    stop_loss_pct: float = Query(0.0, ge=0, le=50),
+    take_profit_pct: float = Query(0.0, ge=0, le=100),
+    timeframe: str = Query("1d", description="K线周期：1d（默认）、1h、15m、1m，或由它们重采样的 4h、3d、1w 等"),
+):
+    """
+    提交后台滚动前推分析任务（不受同步接口的回测次数上限限制），完成后用 GET /api/jobs/{id}/results 获取结果
+    """
+    if sort_by not in SORTABLE_METRICS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序指标: {sort_by}，可选: {', '.join(SORTABLE_METRICS)}")
+    params = dict(
+        short=short,
+        long=long,
+        in_sample_bars=in_sample_bars,
+        out_of_sample_bars=out_of_sample_bars,
+        anchored=anchored,
+        sort_by=sort_by,
+        descending=(order == "desc"),
+        initial_capital=initial_capital,
+        fee_rate=fee_rate,
+        slippage_rate=slippage_rate,
+        stop_loss_pct=stop_loss_pct,
+        take_profit_pct=take_profit_pct,
+        timeframe=timeframe,
+    )
+    try:
+        check_timeframe(timeframe)
+        return _job_runner.submit("walk_forward", params)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.get("/api/jobs")
+def list_jobs(limit: int = Query(50, ge=1, le=500)):
+    """最近提交的任务"""
+    return {"jobs": [_job_runner.status(job["id"]) for job in _job_runner.store.list(limit)]}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """任务状态、进度和预计剩余时间"""
+    status = _job_runner.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return status
+
+
+@app.get("/api/jobs/{job_id}/results")
+def get_job_results(
+    job_id: str,
+    sort_by: str = Query("sharpe_ratio", description="排序指标，取自回测摘要字段"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=20000),
+    fmt: str = Query("json", alias="format", description="输出格式：json（行式，默认）、columns（结果表为并列数组）、msgpack"),
+):
+    """
+    任务结果：扫描任务按指标排序、分页（运行中的任务返回已完成部分）；
+    滚动前推任务直接返回完整的分析结果
+    """
+    status = _job_runner.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    try:
+        check_format(fmt)
+        if sort_by not in SORTABLE_METRICS:
+            raise ValueError(f"不支持的排序指标: {sort_by}，可选: {', '.join(SORTABLE_METRICS)}")
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    if status["kind"] != "sweep":
+        results = _job_runner.store.results(job_id)
+        content = {"job": status, "result": results[0] if results else None}
+        return Response(content=encode(content, fmt), media_type=MEDIA_TYPES[fmt])
+    total, results = _job_runner.store.ranked_results(job_id, sort_by, order == "desc", offset, limit)
+    content = {
+        "job": status,
+        "sort_by": sort_by,
+        "order": order,
+        "offset": offset,
+        "num_results": total,
+        "results": rows_to_columns(results) if result_layout(fmt) == "columns" else results,
+    }
+    return Response(content=encode(content, fmt), media_type=MEDIA_TYPES[fmt])
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """取消排队中或运行中的任务，已保存的部分结果保留"""
+    status = _job_runner.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在: {job_id}")
+    return status
+
+
 if __name__ == "__main__":
     import uvicorn
     import os
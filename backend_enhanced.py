@@ -8,10 +8,13 @@ import time
 from functools import lru_cache
 from typing import List, Dict, Any, Optional, Tuple
 
+import numpy as np
 import requests
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
+from indicators import sma
+
 # 导入原始数据获取函数（假设已存在）
 # from backend import load_btc_daily
 
@@ -27,14 +30,9 @@ app.add_middleware(
 
 
 def calculate_ma(data: List[float], period: int) -> List[Optional[float]]:
-    """计算移动平均线"""
-    ma = []
-    for i in range(len(data)):
-        if i < period - 1:
-            ma.append(None)
-        else:
-            ma.append(sum(data[i - period + 1 : i + 1]) / period)
-    return ma
+    """计算移动平均线（indicators.sma，O(n)），窗口未满的位置为 None"""
+    ma = sma(np.asarray(data, dtype=np.float64), period)
+    return [None if np.isnan(v) else v for v in ma.tolist()]
 
 
 def apply_stop_loss_take_profit(
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+回测执行层
+回测是 CPU 密集的纯计算，不在事件循环和 FastAPI 线程池中运行：
+- 执行后端可选 process（进程池，默认，绕开 GIL）或 thread（线程池）
+- 运行中 + 排队的任务数有上限，满载时 submit 抛出 ExecutorBusy，接口返回 429 + Retry-After
+- 每个请求有截止时间：尚未开始的任务直接取消，运行中的模拟逐笔检查截止时间并自行中止
+- 进程池模式下工作进程遇到新的数据版本时挂载一次，之后的任务不再传数据：
+  已发布为共享数据集的版本直接内存映射其目录（与各 uvicorn worker 共用页缓存中的同一份数据），
+  其余版本（如重采样出的周期）由执行器写入共享内存；
+  共享内存按引用它的未完成任务计数，版本被同一 (周期, 数据源) 的新版本替换、且没有任务引用时才释放
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+from price_series import PriceSeries, buffer_size, buffer_columns
+from response_format import encode, result_layout
+import shared_dataset
+from strategy_engine import run_double_ma_strategy
+
+BACKENDS = ("process", "thread")
+
+EXECUTOR_BACKEND = os.environ.get("BACKTEST_EXECUTOR", "process")
+EXECUTOR_WORKERS = int(os.environ.get("BACKTEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 除正在运行的任务外，最多还能排队的任务数
+MAX_QUEUE = int(os.environ.get("BACKTEST_MAX_QUEUE", "32"))
+# 单个回测请求的截止时间（秒，含排队时间）
+DEADLINE_SECONDS = float(os.environ.get("BACKTEST_DEADLINE_SECONDS", "30"))
+# 没有任务引用时最多保留的共享内存段数（重采样出的各周期各占一段，超出时释放最久未用的）
+MAX_SEGMENTS = int(os.environ.get("BACKTEST_MAX_SEGMENTS", "4"))
+# 工作进程内最多同时挂载的数据版本数
+MAX_WORKER_DATASETS = 4
+
+
+class ExecutorBusy(Exception):
+    """排队已满，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"回测任务排队已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+def _run_backtest(
+    series: PriceSeries,
+    params: Dict[str, Any],
+    fmt: str,
+    fields: Tuple[str, ...],
+    max_points: Optional[int],
+    deadline: float,
+) -> bytes:
+    """执行一次回测并序列化（序列化也在执行器中完成，不占用事件循环）"""
+    if time.time() > deadline:
+        raise TimeoutError("回测在排队中超过截止时间")
+    result = run_double_ma_strategy(
+        data=series, layout=result_layout(fmt), fields=fields, max_points=max_points, deadline=deadline, **params
+    )
+    return encode(result, fmt)
+
+
+# 工作进程内已挂载的数据版本：版本 -> (共享内存或 None, 序列)，最近使用的在后；
+# 不同周期的任务交替到达时不必反复挂载
+_worker_datasets: "OrderedDict[str, Tuple[Optional[shared_memory.SharedMemory], PriceSeries]]" = OrderedDict()
+
+
+def _attach_dataset(dataset: Dict[str, Any]) -> PriceSeries:
+    """
+    工作进程挂载价格序列，同一版本只挂载一次。dataset 为 shared_dataset.dataset_pointer() 的指针
+    （内存映射数据集目录，并登记其中的预计算指标），或 {"shm", "rows", "version", "source", "timeframe"}
+    """
+    version = dataset["version"]
+    cached = _worker_datasets.get(version)
+    if cached is not None:
+        _worker_datasets.move_to_end(version)
+        return cached[1]
+    if "dir" in dataset:
+        shm = None
+        series = shared_dataset.open_dataset(dataset)
+    else:
+        shm = shared_memory.SharedMemory(name=dataset["shm"])
+        series = PriceSeries(
+            **buffer_columns(shm.buf, dataset["rows"]),
+            source=dataset["source"],
+            timeframe=dataset["timeframe"],
+            version=version,
+        )
+    _worker_datasets[version] = (shm, series)
+    while len(_worker_datasets) > MAX_WORKER_DATASETS:
+        _, (old, _) = _worker_datasets.popitem(last=False)
+        if old is None:
+            continue
+        try:
+            old.close()
+        except BufferError:
+            # 仍有数组引用旧缓冲区时交给进程退出时释放
+            pass
+    return series
+
+
+def _run_backtest_in_worker(dataset: Dict[str, Any], *args: Any) -> bytes:
+    return _run_backtest(_attach_dataset(dataset), *args)
+
+
+class BacktestExecutor:
+    """
+    有界的回测执行器；submit 返回 concurrent.futures.Future，run 为协程版本（带截止时间）
+    """
+
+    def __init__(self, backend: str = EXECUTOR_BACKEND, workers: int = EXECUTOR_WORKERS, max_queue: int = MAX_QUEUE):
+        if backend not in BACKENDS:
+            raise ValueError(f"不支持的回测执行后端: {backend}，可选: {', '.join(BACKENDS)}")
+        self.backend = backend
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._inflight = 0
+        # 任务耗时的指数移动平均，用于估算 Retry-After
+        self._avg_seconds = 0.05
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        # 进程池模式下的共享内存：版本 -> [共享内存, 引用它的未完成任务数]，最近使用的在后
+        self._segments: "OrderedDict[str, List[Any]]" = OrderedDict()
+        # 每个 (周期, 数据源) 的当前版本；被替换的版本不会再有新任务
+        self._current: Dict[Tuple[str, Optional[str]], str] = {}
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.backend == "process":
+                # 服务进程是多线程的，使用 spawn 避免 fork 带来的锁状态问题
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backtest")
+        return self._pool
+
+    def _acquire(self, series: PriceSeries) -> str:
+        """
+        把该版本的价格序列写入共享内存（每个版本只写一次）并增加一次引用，返回共享内存名；
+        调用方持有 self._lock，任务结束后调用 _release
+        """
+        version = series.version
+        segment = self._segments.get(version)
+        if segment is None:
+            n = len(series)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, buffer_size(n)))
+            for name, arr in buffer_columns(shm.buf, n).items():
+                arr[:] = getattr(series, name)
+            segment = self._segments[version] = [shm, 0]
+        self._segments.move_to_end(version)
+        segment[1] += 1
+        key = (series.timeframe, series.source)
+        previous = self._current.get(key)
+        self._current[key] = version
+        if previous is not None and previous != version:
+            self._unlink_if_unused(previous)
+        self._trim()
+        return segment[0].name
+
+    def _release(self, version: str) -> None:
+        """任务结束，减少一次引用（调用方持有 self._lock）"""
+        segment = self._segments.get(version)
+        if segment is not None:
+            segment[1] -= 1
+            self._unlink_if_unused(version)
+            self._trim()
+
+    def _unlink_if_unused(self, version: str) -> None:
+        """没有任务引用、且已被新版本替换的共享内存立即释放"""
+        segment = self._segments.get(version)
+        if segment is not None and segment[1] == 0 and version not in self._current.values():
+            self._drop(version)
+
+    def _trim(self) -> None:
+        """段数超过 MAX_SEGMENTS 时释放最久未用、没有任务引用的段（之后再用到时重新写入）"""
+        idle = [version for version, (_, refs) in self._segments.items() if refs == 0]
+        for version in idle[: max(0, len(self._segments) - MAX_SEGMENTS)]:
+            self._drop(version)
+
+    def _drop(self, version: str) -> None:
+        shm, _ = self._segments.pop(version)
+        shm.close()
+        shm.unlink()
+
+    def retry_after(self) -> int:
+        """按平均耗时估算排队清空所需的秒数"""
+        waiting = max(1, self._inflight - self.workers + 1)
+        return max(1, math.ceil(self._avg_seconds * waiting / self.workers))
+
+    def submit(
+        self,
+        series: PriceSeries,
+        params: Dict[str, Any],
+        fmt: str,
+        fields: Tuple[str, ...],
+        max_points: Optional[int],
+        deadline: float,
+    ) -> Future:
+        with self._lock:
+            if self._inflight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(self.retry_after())
+            pool = self._get_pool()
+            args = (params, fmt, fields, max_points, deadline)
+            version = None
+            if self.backend == "process":
+                dataset = shared_dataset.dataset_pointer(series)
+                if dataset is None:
+                    # 未发布为数据集文件的版本写入共享内存，任务结束时释放引用
+                    version = series.version
+                    dataset = {
+                        "shm": self._acquire(series),
+                        "rows": len(series),
+                        "version": version,
+                        "source": series.source,
+                        "timeframe": series.timeframe,
+                    }
+                try:
+                    future = pool.submit(_run_backtest_in_worker, dataset, *args)
+                except BaseException:
+                    if version is not None:
+                        self._release(version)
+                    raise
+            else:
+                future = pool.submit(_run_backtest, series, *args)
+            self._inflight += 1
+        started = time.time()
+
+        def done(f: Future) -> None:
+            with self._lock:
+                self._inflight -= 1
+                if version is not None:
+                    self._release(version)
+                if f.cancelled():
+                    return
+                exc = f.exception()
+                if isinstance(exc, BrokenProcessPool) and self._pool is pool:
+                    # 工作进程异常退出，下次提交时重建进程池
+                    self._pool = None
+                elif exc is None:
+                    self.completed += 1
+                    self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.time() - started)
+
+        future.add_done_callback(done)
+        return future
+
+    async def run(
+        self,
+        series: PriceSeries,
+        params: Dict[str, Any],
+        fmt: str = "json",
+        fields: Tuple[str, ...] = ("summary", "trades", "curve"),
+        max_points: Optional[int] = None,
+        timeout: float = DEADLINE_SECONDS,
+    ) -> bytes:
+        """
+        在执行器中运行回测并等待结果；超过 timeout 秒抛出 TimeoutError
+        （未开始的任务被取消，运行中的任务在下一次截止时间检查时中止）
+        """
+        future = self.submit(series, params, fmt, fields, max_points, time.time() + timeout)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except (asyncio.TimeoutError, TimeoutError):
+            future.cancel()
+            with self._lock:
+                self.timeouts += 1
+            raise TimeoutError(f"回测超过 {timeout:g} 秒未完成，已取消")
+
+    def warm_up(self, series: PriceSeries, timeout: float = DEADLINE_SECONDS) -> None:
+        """
+        预先启动工作进程并挂载当前数据版本（每个 worker 提交一个只算摘要的小回测），
+        避免第一个用户请求承担进程启动和挂载共享内存的开销
+        """
+        if len(series) < 5:
+            return
+        deadline = time.time() + timeout
+        futures = [
+            self.submit(series, dict(short=2, long=5), "json", ("summary",), None, deadline)
+            for _ in range(self.workers)
+        ]
+        for future in futures:
+            future.result(timeout=max(0.0, deadline - time.time()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "inflight": self._inflight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "avg_seconds": self._avg_seconds,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            for version in list(self._segments):
+                self._drop(version)
+            self._current.clear()
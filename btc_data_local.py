@@ -4,18 +4,19 @@
 """
 import datetime
 import random
+from typing import Optional
 
 # 设置随机种子以确保数据一致性
 random.seed(42)
 
-def generate_local_btc_data() -> list:
+def generate_local_btc_data(end_date: Optional[datetime.date] = None) -> list:
     """
-    生成本地BTC历史数据（2016-01-01 到 2026-01-01）
+    生成本地BTC历史数据（2016-01-01 到 end_date，默认 2026-01-01）
     使用真实的价格趋势模拟，但数据是生成的，仅用于测试
     """
     rows = []
     start_date = datetime.date(2016, 1, 1)
-    end_date = datetime.date(2026, 1, 1)
+    end_date = end_date or datetime.date(2026, 1, 1)
     
     # 使用真实BTC价格趋势的近似值
     # 2016年初: ~$400, 2017年底: ~$20k, 2018年底: ~$3k, 2020年底: ~$30k, 2021年底: ~$50k, 2024: ~$40k-60k, 2025-2026: 预测趋势
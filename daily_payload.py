@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+/api/btc_daily 的预编码响应
+- 每个数据版本只序列化一次：逐条K线编码成 JSON 片段并记录字节偏移，
+  日期区间切片只需拼接字节，不再逐条构建字典、调用 isoformat()/float()
+- 压缩结果（br 或 gzip）按 (版本, 区间, 编码) 缓存
+- ETag 由数据版本和区间生成，支持 If-None-Match 返回 304
+"""
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+from price_series import PriceSeries
+
+# brotli 已列入 requirements.txt；个别环境装不上时退回只提供 gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 小于该字节数的响应不压缩
+MIN_COMPRESS_SIZE = 1024
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> str:
+    """
+    根据 Accept-Encoding 选择压缩方式：br > gzip > identity
+    """
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(token)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def _etag_base(tag: str) -> str:
+    """去掉弱校验前缀、引号和压缩编码后缀"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for suffix in ("-gzip", "-br"):
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)]
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断 If-None-Match 是否命中；同一数据不同压缩编码的 ETag 视为相同
+    """
+    if not if_none_match:
+        return False
+    base = _etag_base(etag)
+    for tag in if_none_match.split(","):
+        if tag.strip() == "*" or _etag_base(tag) == base:
+            return True
+    return False
+
+
+class DailyPayloadCache:
+    """
+    按数据版本缓存 /api/btc_daily 的 JSON 字节
+    """
+
+    def __init__(self, symbol: str = "BTC-USD", timeframe: str = "1d", max_variants: int = 64):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.max_variants = max_variants
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._blob = b""
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._prefix = b""
+        self._variants: "OrderedDict[Tuple[int, int, str], bytes]" = OrderedDict()
+
+    def _build(self, series: PriceSeries) -> None:
+        fragments = [
+            json.dumps(
+                {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": v},
+                separators=(",", ":"),
+            ).encode("utf-8") + b","
+            for d, o, h, l, c, v in zip(
+                series.iso_dates,
+                series.open.tolist(),
+                series.high.tolist(),
+                series.low.tolist(),
+                series.close.tolist(),
+                series.volume.tolist(),
+            )
+        ]
+        offsets = np.zeros(len(fragments) + 1, dtype=np.int64)
+        np.cumsum([len(f) for f in fragments], out=offsets[1:])
+        self._blob = b"".join(fragments)
+        self._offsets = offsets
+        self._prefix = json.dumps(
+            {"symbol": self.symbol, "timeframe": self.timeframe}, separators=(",", ":")
+        ).encode("utf-8")[:-1] + b',"data":['
+        self._variants.clear()
+        self._version = series.version
+
+    def _body(self, start: int, end: int) -> bytes:
+        if end <= start:
+            return self._prefix + b"]}"
+        # 每个片段以逗号结尾，去掉最后一个
+        return self._prefix + self._blob[self._offsets[start] : self._offsets[end] - 1] + b"]}"
+
+    def get(self, series: PriceSeries, start: int, end: int, encoding: str = "identity") -> Tuple[bytes, str, str]:
+        """
+        返回 (响应字节, 实际使用的编码, ETag)，start/end 为序列中的位置区间 [start, end)
+        """
+        with self._lock:
+            if self._version != series.version:
+                self._build(series)
+            etag = f'"{self._version}-{start}-{end}"'
+            key = (start, end, encoding)
+            body = self._variants.get(key)
+            if body is not None:
+                self._variants.move_to_end(key)
+            else:
+                body = self._body(start, end)
+                if encoding != "identity" and len(body) < MIN_COMPRESS_SIZE:
+                    encoding = "identity"
+                    key = (start, end, encoding)
+                if encoding == "gzip":
+                    body = gzip.compress(body, compresslevel=6, mtime=0)
+                elif encoding == "br":
+                    body = brotli.compress(body, quality=5)
+                self._variants[key] = body
+                while len(self._variants) > self.max_variants:
+                    self._variants.popitem(last=False)
+        if encoding != "identity":
+            etag = f'{etag[:-1]}-{encoding}"'
+        return body, encoding, etag
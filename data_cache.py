@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+BTC K线本地磁盘缓存
+- 以列式二进制格式（NumPy .npz）保存标准化后的 OHLCV 数据
+- 文件按 数据源 + 日期范围 命名，例如 binance_2017-08-17_2025-12-31.npz
+- 新鲜度策略：下载时间在 max_age 之内视为新鲜，直接使用；
+  过期数据在所有在线数据源都失败时仍可作为兜底
+"""
+import datetime
+import json
+import os
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+from price_series import PriceSeries, COLUMNS
+
+# 缓存目录，可通过环境变量覆盖（部署平台上可指向持久化磁盘）
+CACHE_DIR = os.environ.get(
+    "BTC_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache"),
+)
+
+# 缓存有效期（小时），日线数据每天只更新一次
+CACHE_MAX_AGE_HOURS = float(os.environ.get("BTC_CACHE_MAX_AGE_HOURS", "12"))
+
+def _cache_path(source: str, first: datetime.date, last: datetime.date) -> str:
+    return os.path.join(CACHE_DIR, f"{source}_{first.isoformat()}_{last.isoformat()}.npz")
+
+
+def _list_cache_files(source: Optional[str] = None) -> List[str]:
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    files = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".npz"):
+            continue
+        if source is not None and not name.startswith(f"{source}_"):
+            continue
+        files.append(os.path.join(CACHE_DIR, name))
+    return files
+
+
+def save_series(source: str, series: PriceSeries, quality: Optional[Dict[str, Any]] = None) -> str:
+    """
+    保存某个数据源的完整K线到磁盘，并删除该数据源旧的缓存文件。
+    quality 为 data_quality 生成的质量报告，保存在 meta 中随数据一起读取。
+    先写临时文件再原子替换，避免并发读取到半个文件。
+    """
+    if len(series) == 0:
+        raise ValueError("没有可缓存的数据")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta = {
+        "source": source,
+        "fetched_at": time.time(),
+        "first_date": series.first_date.isoformat(),
+        "last_date": series.last_date.isoformat(),
+        "rows": len(series),
+        "quality": quality,
+    }
+    path = _cache_path(source, series.first_date, series.last_date)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **series.columns())
+    os.replace(tmp_path, path)
+
+    for old in _list_cache_files(source):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+def _read_cache_file(path: str) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz["meta"]))
+        columns = {name: npz[name] for name in ("date",) + COLUMNS}
+    return meta, columns
+
+
+def load_cached(
+    sources: Tuple[str, ...],
+    max_age_hours: Optional[float] = CACHE_MAX_AGE_HOURS,
+) -> Optional[Tuple[Dict[str, Any], PriceSeries]]:
+    """
+    按数据源优先级查找缓存，返回 (元信息, 列式K线序列)；没有可用缓存时返回 None。
+    max_age_hours 为 None 时忽略新鲜度（用于在线数据源全部失败时兜底）。
+    """
+    now = time.time()
+    for source in sources:
+        candidates = []
+        for path in _list_cache_files(source):
+            try:
+                meta, columns = _read_cache_file(path)
+            except Exception as e:
+                print(f"[WARN] 缓存文件损坏，已忽略: {path} ({e})")
+                continue
+            candidates.append((meta, columns))
+        if not candidates:
+            continue
+        meta, columns = max(candidates, key=lambda c: c[0]["fetched_at"])
+        if max_age_hours is not None and now - meta["fetched_at"] > max_age_hours * 3600:
+            continue
+        return meta, PriceSeries.from_columns(columns, source=source)
+    return None
+
+
+def merge_new_rows(series: PriceSeries, new_rows: List[Dict[str, Any]]) -> Tuple[PriceSeries, int]:
+    """
+    把增量下载的K线合并到已缓存的序列末尾，返回 (合并后的序列, 新增K线数)。
+    增量数据从缓存最后一天（含）开始下载，重叠部分以新数据为准
+    （最后一根K线在上次下载时可能尚未收盘）。
+    价格不在这里检查，合并后的序列由 data_quality 统一校验和清洗。
+    """
+    new_rows = sorted(new_rows, key=lambda x: x["date"])
+    if not new_rows:
+        return series, 0
+
+    last_date = series.last_date if len(series) else None
+    prev_date = None
+    for r in new_rows:
+        if prev_date is not None and r["date"] <= prev_date:
+            raise ValueError(f"增量数据日期重复: {r['date']}")
+        if last_date is not None and r["date"] < last_date:
+            raise ValueError(f"增量数据早于缓存最后日期 {last_date}: {r['date']}")
+        prev_date = r["date"]
+
+    new_series = PriceSeries.from_rows(new_rows, source=series.source)
+    kept = series[: series.index_of(new_rows[0]["date"])]
+    merged = PriceSeries.from_columns(
+        {
+            name: np.concatenate((old, new))
+            for (name, old), new in zip(kept.columns().items(), new_series.columns().values())
+        },
+        source=series.source,
+    )
+    return merged, len(merged) - len(series)
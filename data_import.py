@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+用户提供的历史K线文件（CSV / Parquet）批量导入
+- 流式读取：CSV 按 BTC_IMPORT_CHUNK_MB（默认 64MB）分块读取，Parquet 按行组分批读取，
+  任何时候只有一块原始文本在内存中，数 GB 的文件也只占用解析后的列式数组（每根K线 48 字节）
+- 向量化解析：每块用 np.loadtxt（C 实现）直接解析成列，日期整列转换为 datetime64，
+  不构建逐行字典、不逐行 strptime；含缺失值（空、null 等）的块退回按列转换
+- 列名不区分大小写：date/datetime/time/timestamp/open_time、open、high、low、close/price、volume/vol，
+  只有 date 和 close 是必需的；没有表头时按 Binance K线导出格式（开盘时间, open, high, low, close, volume, ...）读取。
+  日期可以是 ISO 格式（可带时区）或 Unix 时间戳（秒/毫秒/微秒/纳秒，按数量级识别）
+- 导入的数据与该数据源已存储的数据合并（日期重叠时以导入的为准），经 data_quality 校验清洗后
+  写入列式存储（日线为 data_cache 的 .npz，日内为 intraday_store 的按月分区），质量报告一并保存
+
+命令行用法：python data_import.py 文件 [--timeframe 1d] [--source yahoo] [--format csv|parquet]
+"""
+import argparse
+import io
+import os
+import time
+import warnings
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from price_series import PriceSeries, COLUMNS, DAY_SECONDS, TIMEFRAMES
+from data_cache import load_cached, save_series
+import data_quality
+import data_sources
+import intraday_store
+import shared_dataset
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 为可选格式
+    pq = None
+
+# CSV 每次读取的字节数
+IMPORT_CHUNK_BYTES = int(float(os.environ.get("BTC_IMPORT_CHUNK_MB", "64")) * 1024 * 1024)
+
+# Parquet 每批读取的行数
+PARQUET_BATCH_ROWS = 1_000_000
+
+FORMATS = ("csv", "parquet")
+
+# 表头中可识别的列名（小写）
+_COLUMN_ALIASES = {
+    "date": ("date", "datetime", "time", "timestamp", "open_time", "open time", "opentime"),
+    "open": ("open",),
+    "high": ("high",),
+    "low": ("low",),
+    "close": ("close", "price"),
+    "volume": ("volume", "vol"),
+}
+
+# 没有表头时的列位置（Binance K线导出格式）
+_HEADERLESS_LAYOUT = {"date": 0, "open": 1, "high": 2, "low": 3, "close": 4, "volume": 5}
+
+# 视为缺失值的字段
+_NULL_TOKENS = [b"", b"null", b"NULL", b"None", b"nan", b"NaN", b"NA", b"N/A", b"-"]
+
+
+def detect_format(path: str, fmt: Optional[str] = None) -> str:
+    """未指定格式时按扩展名判断（.parquet/.pq 为 Parquet，其余按 CSV 读取）"""
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的文件格式: {fmt}，可选: {', '.join(FORMATS)}")
+        return fmt
+    return "parquet" if path.lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def _map_columns(names: Sequence[str]) -> Dict[str, int]:
+    """表头 -> {列名: 位置}；缺少日期或收盘价列时抛出 ValueError"""
+    lowered = [name.strip().strip('"').strip().lower() for name in names]
+    mapping = {}
+    for field, aliases in _COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                mapping[field] = lowered.index(alias)
+                break
+    missing = [field for field in ("date", "close") if field not in mapping]
+    if missing:
+        raise ValueError(f"找不到 {'/'.join(missing)} 列，文件表头为: {', '.join(names)}")
+    return mapping
+
+
+def _to_float(raw: np.ndarray) -> np.ndarray:
+    """字符串列 -> float64，空值、null 等记为 NaN"""
+    if raw.dtype.kind in "fiub":
+        return raw.astype(np.float64)
+    if raw.dtype.kind != "S":
+        raw = raw.astype(str).astype(bytes)
+    try:
+        return raw.astype(np.float64)
+    except ValueError:
+        raw = np.char.strip(raw)
+        return np.where(np.isin(raw, _NULL_TOKENS), b"nan", raw).astype(np.float64)
+
+
+def _is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+def _epoch_seconds(values: np.ndarray) -> np.ndarray:
+    """按数量级识别 Unix 时间戳的单位（秒/毫秒/微秒/纳秒），统一为秒"""
+    top = int(np.abs(values).max()) if values.shape[0] else 0
+    for threshold, scale in ((10 ** 17, 10 ** 9), (10 ** 14, 10 ** 6), (10 ** 11, 10 ** 3)):
+        if top >= threshold:
+            return values // scale
+    return values
+
+
+def _parse_dates(raw: np.ndarray, timeframe: str) -> np.ndarray:
+    """日期列 -> PriceSeries 的 date（日线为 1970-01-01 起的天数，日内为 Unix 秒）"""
+    if raw.dtype.kind == "M":
+        seconds = raw.astype("datetime64[s]").astype(np.int64)
+    elif raw.dtype.kind in "iuf":
+        seconds = _epoch_seconds(raw.astype(np.int64))
+    else:
+        if raw.dtype.kind != "S":
+            raw = raw.astype(str).astype(bytes)
+        if raw.shape[0] and raw[0] != raw[0].strip():
+            raw = np.char.strip(raw)
+        if raw.shape[0] and _is_number(raw[0].decode("utf-8", errors="replace")):
+            seconds = _epoch_seconds(_to_float(raw).astype(np.int64))
+        else:
+            try:
+                with warnings.catch_warnings():
+                    # 带时区的日期会换算成 UTC，NumPy 对此给出弃用警告
+                    warnings.simplefilter("ignore")
+                    # 经 str 转换：NumPy 直接解析带时区的 bytes 日期会崩溃
+                    seconds = raw.astype(str).astype("datetime64[s]").astype(np.int64)
+            except ValueError as e:
+                raise ValueError(f"无法解析日期（应为 ISO 格式或 Unix 时间戳）: {e}")
+    return seconds if TIMEFRAMES[timeframe] < DAY_SECONDS else seconds // DAY_SECONDS
+
+
+def _parse_csv_block(block: bytes, mapping: Dict[str, int], timeframe: str) -> Dict[str, np.ndarray]:
+    """解析一块完整的 CSV 行；价格列都是数字时走 loadtxt 快速路径，否则整块按字符串读入后逐列转换"""
+    used = sorted(mapping.items(), key=lambda item: item[1])
+    usecols = [index for _, index in used]
+    fast = [(name, "S40" if name == "date" else np.float64) for name, _ in used]
+    options = dict(delimiter=",", usecols=usecols, quotechar='"', ndmin=1)
+    try:
+        table = np.loadtxt(io.BytesIO(block), dtype=fast, **options)
+    except ValueError:
+        table = np.loadtxt(io.BytesIO(block), dtype=[(name, "S40") for name, _ in used], **options)
+    n = table.shape[0]
+    columns = {"date": _parse_dates(table["date"], timeframe)}
+    for name in COLUMNS:
+        columns[name] = _to_float(table[name]) if name in mapping else np.full(n, np.nan)
+    return columns
+
+
+def iter_csv(path: str, timeframe: str, chunk_bytes: int = IMPORT_CHUNK_BYTES) -> Iterator[Dict[str, np.ndarray]]:
+    """按块读取 CSV，逐块产出列式数据；每块在行边界处切开"""
+    with open(path, "rb") as f:
+        head = f.readline().lstrip(b"\xef\xbb\xbf")
+        if not head.strip():
+            raise ValueError("文件为空")
+        first = head.decode("utf-8", errors="replace").rstrip("\r\n").split(",")
+        if _is_number(first[0].strip().strip('"')):
+            if len(first) < len(_HEADERLESS_LAYOUT):
+                raise ValueError(f"没有表头的文件应为 Binance K线格式（至少 6 列），实际为 {len(first)} 列")
+            mapping = dict(_HEADERLESS_LAYOUT)
+            carry, line = head, 0
+        else:
+            mapping = _map_columns(first)
+            carry, line = b"", 1
+        while True:
+            data = f.read(chunk_bytes)
+            if data:
+                data = carry + data
+                cut = data.rfind(b"\n") + 1
+                if cut == 0:
+                    carry = data
+                    continue
+                block, carry = data[:cut], data[cut:]
+            else:
+                block, carry = carry, b""
+            if block.strip():
+                try:
+                    columns = _parse_csv_block(block, mapping, timeframe)
+                except ValueError as e:
+                    raise ValueError(f"第 {line + 1} 行起的数据块解析失败: {e}")
+                line += block.count(b"\n")
+                yield columns
+            if not data:
+                return
+
+
+def iter_parquet(path: str, timeframe: str, batch_rows: int = PARQUET_BATCH_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+    """按批读取 Parquet（需要 pyarrow），只读取用到的列"""
+    if pq is None:
+        raise ValueError("读取 Parquet 文件需要安装 pyarrow（pip install pyarrow）")
+    parquet = pq.ParquetFile(path)
+    names = parquet.schema_arrow.names
+    mapping = _map_columns(names)
+    selected = {field: names[index] for field, index in mapping.items()}
+    for batch in parquet.iter_batches(batch_size=batch_rows, columns=list(selected.values())):
+        n = batch.num_rows
+        raw = {field: batch.column(name).to_numpy(zero_copy_only=False) for field, name in selected.items()}
+        columns = {"date": _parse_dates(raw["date"], timeframe)}
+        for name in COLUMNS:
+            columns[name] = _to_float(raw[name]) if name in raw else np.full(n, np.nan)
+        yield columns
+
+
+def read_columns(
+    path: str, timeframe: str, fmt: Optional[str] = None, chunk_bytes: int = IMPORT_CHUNK_BYTES
+) -> Dict[str, np.ndarray]:
+    """流式读取整个文件，返回拼接后的列（未排序、未校验）"""
+    if detect_format(path, fmt) == "parquet":
+        chunks = iter_parquet(path, timeframe)
+    else:
+        chunks = iter_csv(path, timeframe, chunk_bytes)
+    parts: Dict[str, List[np.ndarray]] = {name: [] for name in ("date",) + COLUMNS}
+    for chunk in chunks:
+        for name, arr in chunk.items():
+            parts[name].append(arr)
+    if not parts["date"]:
+        raise ValueError("文件中没有数据")
+    return {name: np.concatenate(arrs) for name, arrs in parts.items()}
+
+
+def _sources(timeframe: str) -> Tuple[str, ...]:
+    return tuple(data_sources.FETCHERS) if timeframe == "1d" else data_sources.INTRADAY_SOURCES
+
+
+def _load_stored(source: str, timeframe: str) -> Optional[PriceSeries]:
+    if timeframe == "1d":
+        cached = load_cached((source,), max_age_hours=None)
+        return cached[1] if cached else None
+    return intraday_store.load_series(source, timeframe)
+
+
+def target_source(timeframe: str, source: Optional[str] = None) -> str:
+    """
+    导入的数据合并到哪个数据源的存储。加载时按数据源优先级选用已有数据，
+    默认合并到会被选用的那个（没有任何数据时为优先级最高的）；指定的数据源优先级更低时抛出 ValueError
+    """
+    sources = _sources(timeframe)
+    if source is not None and source not in sources:
+        raise ValueError(f"{timeframe} 数据源只能是: {', '.join(sources)}")
+    current = next((s for s in sources if _load_stored(s, timeframe) is not None), None)
+    if source is None:
+        return current or sources[0]
+    if current is not None and sources.index(source) > sources.index(current):
+        raise ValueError(f"已有优先级更高的 {current} 数据，导入到 {source} 的数据不会被加载")
+    return source
+
+
+def import_file(
+    path: str,
+    timeframe: str = "1d",
+    source: Optional[str] = None,
+    fmt: Optional[str] = None,
+    chunk_bytes: int = IMPORT_CHUNK_BYTES,
+) -> Tuple[PriceSeries, Dict[str, Any], Dict[str, Any]]:
+    """
+    导入文件并与已存储的数据合并、校验后写回存储，返回 (合并后的序列, 质量报告, 导入摘要)。
+    timeframe 为文件中K线的周期（只能是基础周期 1d/1h/15m/1m）
+    """
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"只能导入基础周期的K线: {', '.join(TIMEFRAMES)}")
+    started = time.time()
+    source = target_source(timeframe, source)
+    imported = read_columns(path, timeframe, fmt, chunk_bytes)
+    rows_read = int(imported["date"].shape[0])
+
+    stored = _load_stored(source, timeframe)
+    existing = 0
+    columns = imported
+    if stored is not None:
+        # 与导入数据日期重叠的已有K线以导入的为准
+        kept = ~np.isin(stored.date, imported["date"])
+        existing = len(stored)
+        columns = {
+            name: np.concatenate((old[kept], imported[name]))
+            for name, old in stored.columns().items()
+        }
+    series, report = data_quality.validate_columns(columns, source=source, timeframe=timeframe)
+    if series.intraday:
+        intraday_store.write_series(source, series, quality=report)
+    else:
+        save_series(source, series, quality=report)
+    info = {
+        "source": source,
+        "timeframe": timeframe,
+        "rows_read": rows_read,
+        "added": len(series) - existing,
+        "rows": len(series),
+        "first_date": series.iso_dates[0],
+        "last_date": series.iso_dates[-1],
+        "version": series.version,
+        "seconds": round(time.time() - started, 3),
+    }
+    return series, report, info
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="把 CSV / Parquet 历史K线导入本地数据存储")
+    parser.add_argument("path", help="CSV 或 Parquet 文件")
+    parser.add_argument("--timeframe", default="1d", help="文件中K线的周期：1d（默认）、1h、15m、1m")
+    parser.add_argument("--source", default=None, help="合并到哪个数据源的存储，默认为当前使用的数据源")
+    parser.add_argument("--format", dest="fmt", choices=FORMATS, default=None, help="文件格式，默认按扩展名判断")
+    args = parser.parse_args(argv)
+    try:
+        series, report, info = import_file(args.path, args.timeframe, args.source, args.fmt)
+    except (OSError, ValueError) as e:
+        print(f"[FAIL] 导入失败: {e}")
+        raise SystemExit(1)
+    print(f"[OK] 导入 {info['rows_read']} 条 {info['timeframe']} 数据到 {info['source']}，用时 {info['seconds']} 秒")
+    print(f"[{'OK' if report['ok'] else 'WARN'}] 数据校验: {data_quality.summarize(report)}")
+    # 发布为共享数据集，运行中的服务在下次检查数据时直接映射新数据
+    path = shared_dataset.publish(series, quality=report)
+    print(f"[OK] 共 {info['rows']} 条（{info['first_date']} ~ {info['last_date']}），已发布共享数据集: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+K线数据的校验与清洗
+下载之后、写入缓存之前对整段列式数据做一次向量化检查，生成质量报告随缓存一起保存，
+之后的请求直接使用清洗后的数据和已保存的报告，不再重复校验：
+- 收盘价缺失或非正：整行删除（先于去重，同一日期最后一条无效时仍保留之前的有效记录）
+- 重复日期：在收盘价有效的记录中保留最后一条（与增量更新以新数据为准一致）
+- 开/高/低价缺失或非正：开盘价取上一根收盘价，最高/最低价取开盘、收盘价的较大/较小值；成交量缺失或为负记为 0
+  （CoinGecko 只提供收盘价，其开/高/低价即按此推算，并计入报告）
+- OHLC 不一致（最高价低于开/收/最低价等）：把最高/最低价扩展为四个价格的最大/最小值
+- 缺失的K线（相邻日期间隔超过一个周期）：统计缺口，可选用上一根收盘价前向填充（成交量为 0）
+- 异常跳变：相邻收盘价的对数收益绝对值超过阈值的K线只标记、不修改
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from price_series import PriceSeries, COLUMNS, DAY_SECONDS, timeframe_seconds
+
+# 标记为异常跳变的对数收益阈值（0.5 约等于单根K线上涨 65% 或下跌 39%）
+OUTLIER_LOG_RETURN = float(os.environ.get("BTC_OUTLIER_LOG_RETURN", "0.5"))
+
+# 是否用上一根收盘价前向填充缺失的K线，BTC_FILL_GAPS=1 开启
+FILL_GAPS = os.environ.get("BTC_FILL_GAPS", "0") == "1"
+
+# 报告中每类问题最多列出的日期数
+MAX_REPORTED = 20
+
+
+def _iso(date: np.ndarray, intraday: bool) -> List[str]:
+    if intraday:
+        return np.datetime_as_string(date.astype("datetime64[s]"), unit="m").tolist()
+    return np.datetime_as_string(date.astype("datetime64[D]")).tolist()
+
+
+def _issue(mask: np.ndarray, date: np.ndarray, intraday: bool) -> Dict[str, Any]:
+    """某类问题的数量及前 MAX_REPORTED 个日期"""
+    idx = np.flatnonzero(mask)
+    return {"count": int(idx.shape[0]), "dates": _iso(date[idx[:MAX_REPORTED]], intraday)}
+
+
+def validate_columns(
+    columns: Dict[str, np.ndarray],
+    source: Optional[str] = None,
+    timeframe: str = "1d",
+    fill_gaps: bool = FILL_GAPS,
+    outlier_log_return: float = OUTLIER_LOG_RETURN,
+) -> Tuple[PriceSeries, Dict[str, Any]]:
+    """
+    校验并清洗列式K线（date 的单位与 PriceSeries 相同，其余列可含 NaN），
+    返回 (清洗后的序列, 质量报告)；没有任何有效K线时抛出 ValueError
+    """
+    bar_seconds = timeframe_seconds(timeframe)
+    intraday = bar_seconds < DAY_SECONDS
+    step = bar_seconds if intraday else bar_seconds // DAY_SECONDS
+    date = np.asarray(columns["date"], dtype=np.int64)
+    values = {name: np.asarray(columns[name], dtype=np.float64) for name in COLUMNS}
+    rows_in = date.shape[0]
+
+    order = np.argsort(date, kind="stable")
+    date = date[order]
+    # 收盘价缺失或非正的行无法使用，先剔除再去重
+    close = values["close"][order]
+    valid_close = np.isfinite(close) & (close > 0)
+    invalid_close = _issue(~valid_close, date, intraday)
+    # 有效行中重复的日期保留最后一条
+    keep = valid_close.copy()
+    valid = np.flatnonzero(valid_close)
+    keep[valid[:-1][date[valid[1:]] == date[valid[:-1]]]] = False
+    duplicates = _issue(valid_close & ~keep, date, intraday)
+    rows = order[keep]
+    date = date[keep]
+    open_, high, low, close, volume = (values[name][rows] for name in COLUMNS)
+    n = date.shape[0]
+    if n == 0:
+        raise ValueError("没有有效的K线数据（收盘价全部缺失或非正）")
+
+    # 缺失的开/高/低价与成交量
+    prev_close = np.empty(n)
+    prev_close[0] = close[0]
+    prev_close[1:] = close[:-1]
+    bad_open = ~(np.isfinite(open_) & (open_ > 0))
+    open_ = np.where(bad_open, prev_close, open_)
+    body_high = np.maximum(open_, close)
+    body_low = np.minimum(open_, close)
+    bad_high = ~(np.isfinite(high) & (high > 0))
+    bad_low = ~(np.isfinite(low) & (low > 0))
+    high = np.where(bad_high, body_high, high)
+    low = np.where(bad_low, body_low, low)
+    bad_volume = ~(np.isfinite(volume) & (volume >= 0))
+    volume = np.where(bad_volume, 0.0, volume)
+
+    # OHLC 一致性：low <= min(open, close) <= max(open, close) <= high
+    inconsistent = (high < body_high) | (low > body_low) | (low > high)
+    new_high = np.maximum(np.maximum(high, low), body_high)
+    low = np.minimum(np.minimum(high, low), body_low)
+    high = new_high
+
+    # 缺口与未对齐到周期边界的时间
+    gaps = np.diff(date) // step - 1
+    gap_idx = np.flatnonzero(gaps > 0)
+    largest = gap_idx[np.argsort(gaps[gap_idx], kind="stable")[::-1][:MAX_REPORTED]]
+    after = _iso(date[largest], intraday)
+    misaligned = date % step != 0
+
+    # 异常跳变
+    log_return = np.zeros(n)
+    log_return[1:] = np.log(close[1:] / close[:-1])
+    jumps = np.flatnonzero(np.abs(log_return) > outlier_log_return)
+    jump_dates = _iso(date[jumps[:MAX_REPORTED]], intraday)
+
+    report: Dict[str, Any] = {
+        "timeframe": timeframe,
+        "checked_at": time.time(),
+        "rows_in": int(rows_in),
+        "duplicates": duplicates,
+        "invalid_close": invalid_close,
+        "filled": {
+            "open": int(bad_open.sum()),
+            "high": int(bad_high.sum()),
+            "low": int(bad_low.sum()),
+            "volume": int(bad_volume.sum()),
+        },
+        "ohlc_inconsistent": _issue(inconsistent, date, intraday),
+        "gaps": {
+            "count": int(gap_idx.shape[0]),
+            "missing_bars": int(gaps[gap_idx].sum()),
+            "largest": [{"after": d, "missing": int(k)} for d, k in zip(after, gaps[largest].tolist())],
+        },
+        "misaligned": _issue(misaligned, date, intraday),
+        "outliers": {
+            "threshold": outlier_log_return,
+            "count": int(jumps.shape[0]),
+            "bars": [{"date": d, "log_return": r} for d, r in zip(jump_dates, log_return[jumps[:MAX_REPORTED]].tolist())],
+        },
+        "forward_filled": 0,
+    }
+
+    if fill_gaps and gap_idx.shape[0] > 0 and not misaligned.any():
+        # 完整的时间轴上，每个位置取不晚于它的最后一根真实K线
+        grid = np.arange(date[0], date[-1] + step, step, dtype=np.int64)
+        pos = np.searchsorted(date, grid, side="right") - 1
+        real = date[pos] == grid
+        last_close = close[pos]
+        open_, high, low, close = (np.where(real, col[pos], last_close) for col in (open_, high, low, close))
+        volume = np.where(real, volume[pos], 0.0)
+        date = grid
+        report["forward_filled"] = int((~real).sum())
+
+    report["rows_out"] = int(date.shape[0])
+    report["first_date"], report["last_date"] = _iso(date[[0, -1]], intraday)
+    # 删除、修复过数据或存在异常跳变时为 False（缺口只统计，不影响）
+    report["ok"] = not (
+        duplicates["count"]
+        or invalid_close["count"]
+        or any(report["filled"].values())
+        or report["ohlc_inconsistent"]["count"]
+        or report["outliers"]["count"]
+    )
+    series = PriceSeries(date, open_, high, low, close, volume, source=source, timeframe=timeframe)
+    return series, report
+
+
+def validate_series(series: PriceSeries, **kwargs: Any) -> Tuple[PriceSeries, Dict[str, Any]]:
+    """对已构建的序列做同样的校验（如合并增量数据之后）"""
+    return validate_columns(series.columns(), source=series.source, timeframe=series.timeframe, **kwargs)
+
+
+def summarize(report: Dict[str, Any]) -> str:
+    """用于日志的一行摘要"""
+    return (
+        f"{report['rows_in']} -> {report['rows_out']} 条，重复 {report['duplicates']['count']}，"
+        f"无效收盘价 {report['invalid_close']['count']}，补全字段 {sum(report['filled'].values())}，"
+        f"OHLC 不一致 {report['ohlc_inconsistent']['count']}，缺口 {report['gaps']['count']}"
+        f"（缺 {report['gaps']['missing_bars']} 根），异常跳变 {report['outliers']['count']}"
+    )
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+"""
+在线数据源（Yahoo / Binance / CoinGecko）的异步并发下载
+- 所有请求复用同一个 httpx.AsyncClient 连接池（keep-alive），运行在独立的后台事件循环线程中，
+  同步代码通过 download() / download_first_available() 调用
+- 每个数据源有独立的截止时间（SOURCE_DEADLINES），超时即放弃，不会拖住其它数据源
+- 对冲（hedge）：先请求优先级最高的数据源，HEDGE_DELAY 秒内没有结果（或已失败）就启动下一个，
+  谁先成功用谁，其余请求立即取消
+- Binance 按 1000 根一页预先切分时间区间，限速并发拉取
+- 日内周期（1h/15m/1m）目前只有 Binance 提供完整历史，直接解析成 NumPy 列（不构建逐行字典），
+  见 download_intraday()
+- 解析函数只做格式转换：缺失或无法解析的价格记为 NaN，由 data_quality 统一校验、补全并计入质量报告
+- 各数据源地址可通过环境变量覆盖（BTC_YAHOO_URL / BTC_BINANCE_URL / BTC_COINGECKO_URL），
+  测试时指向本地模拟服务器（见 mock_sources.py）
+"""
+import asyncio
+import csv
+import datetime
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+# 通用请求头，模拟浏览器访问
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.5",
+}
+
+SOURCE_URLS = {
+    "yahoo": os.environ.get("BTC_YAHOO_URL", "https://query1.finance.yahoo.com/v7/finance/download/BTC-USD"),
+    "binance": os.environ.get("BTC_BINANCE_URL", "https://api.binance.com/api/v3/klines"),
+    "coingecko": os.environ.get("BTC_COINGECKO_URL", "https://api.coingecko.com/api/v3/coins/bitcoin/market_chart"),
+}
+
+# 各数据源的总截止时间（秒），包括 Binance 的全部分页
+SOURCE_DEADLINES = {
+    "yahoo": float(os.environ.get("BTC_YAHOO_DEADLINE", "12")),
+    "binance": float(os.environ.get("BTC_BINANCE_DEADLINE", "20")),
+    "coingecko": float(os.environ.get("BTC_COINGECKO_DEADLINE", "15")),
+}
+
+# 上一个数据源多久没有结果就启动下一个（秒）
+HEDGE_DELAY = float(os.environ.get("BTC_HEDGE_DELAY", "3"))
+
+# Binance 分页：每页最多 1000 根；同时进行的请求数和两次请求的最小间隔
+BINANCE_PAGE_LIMIT = 1000
+BINANCE_MAX_CONCURRENCY = 4
+BINANCE_MIN_INTERVAL = 0.05
+
+# 日内数据一次下载可能有上千页，单独设置截止时间（秒）
+INTRADAY_DEADLINE = float(os.environ.get("BTC_INTRADAY_DEADLINE", "300"))
+
+# 提供日内K线的数据源（优先级顺序）
+INTRADAY_SOURCES = ("binance",)
+
+_DAY_MS = 24 * 3600 * 1000
+
+
+def _kline(date: datetime.date, open_: float, high: float, low: float, close: float, volume: float) -> Dict[str, Any]:
+    return {"date": date, "open": open_, "high": high, "low": low, "close": close, "volume": volume}
+
+
+def _float_or_nan(value: Any) -> float:
+    """缺失或无法解析的数值记为 NaN，由 data_quality 统一处理并计入质量报告"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def parse_yahoo_csv(text: str) -> List[Dict[str, Any]]:
+    """
+    解析 Yahoo Finance 下载的 CSV；缺失的价格/成交量（"null"）记为 NaN，
+    日期无法解析的行跳过并打印数量
+    """
+    rows: List[Dict[str, Any]] = []
+    skipped = 0
+    for r in csv.DictReader(text.splitlines()):
+        try:
+            date = datetime.datetime.strptime(r["Date"], "%Y-%m-%d").date()
+        except (KeyError, TypeError, ValueError):
+            skipped += 1
+            continue
+        rows.append(
+            _kline(
+                date,
+                _float_or_nan(r.get("Open")),
+                _float_or_nan(r.get("High")),
+                _float_or_nan(r.get("Low")),
+                _float_or_nan(r.get("Close")),
+                _float_or_nan(r.get("Volume")),
+            )
+        )
+    if skipped:
+        print(f"[WARN] Yahoo Finance CSV 中 {skipped} 行日期无法解析，已跳过")
+    rows.sort(key=lambda x: x["date"])
+    return rows
+
+
+def parse_binance_klines(data: Any) -> List[Dict[str, Any]]:
+    """解析 Binance klines：[open time, open, high, low, close, volume, close time, ...]"""
+    rows: List[Dict[str, Any]] = []
+    if not isinstance(data, list):
+        return rows
+    skipped = 0
+    for k in data:
+        try:
+            date = datetime.datetime.utcfromtimestamp(int(k[0]) // 1000).date()
+        except (IndexError, TypeError, ValueError, OverflowError):
+            skipped += 1
+            continue
+        rows.append(_kline(date, *(_float_or_nan(v) for v in k[1:6])))
+    if skipped:
+        print(f"[WARN] Binance 返回的 {skipped} 根K线时间无法解析，已跳过")
+    return rows
+
+
+def parse_coingecko_prices(data: Any, start_date: Optional[datetime.date] = None) -> List[Dict[str, Any]]:
+    """
+    解析 CoinGecko market_chart：只有收盘价和成交量，开/高/低价记为 NaN
+    （由 data_quality 按上一根收盘价推算，并在质量报告中注明）
+    """
+    rows: List[Dict[str, Any]] = []
+    if not isinstance(data, dict):
+        return rows
+    volumes: Dict[datetime.date, float] = {}
+    for item in data.get("total_volumes", []):
+        try:
+            volumes[datetime.datetime.utcfromtimestamp(item[0] / 1000).date()] = float(item[1])
+        except (IndexError, TypeError, ValueError, OverflowError):
+            continue
+    nan = float("nan")
+    skipped = 0
+    for item in data.get("prices", []):
+        try:
+            date = datetime.datetime.utcfromtimestamp(item[0] / 1000).date()
+        except (IndexError, TypeError, ValueError, OverflowError):
+            skipped += 1
+            continue
+        rows.append(_kline(date, nan, nan, nan, _float_or_nan(item[1]), volumes.get(date, nan)))
+    if skipped:
+        print(f"[WARN] CoinGecko 返回的 {skipped} 个价格时间无法解析，已跳过")
+    if start_date is not None:
+        rows = [r for r in rows if r["date"] >= start_date]
+    rows.sort(key=lambda x: x["date"])
+    return rows
+
+
+def _end_date() -> datetime.date:
+    # 截止到明天，确保包含今天（未收盘）的K线
+    return datetime.date.today() + datetime.timedelta(days=1)
+
+
+async def _fetch_yahoo(client: httpx.AsyncClient, start_date: Optional[datetime.date]) -> List[Dict[str, Any]]:
+    """Yahoo Finance BTC-USD 日线，默认起始 2016-01-01"""
+    start_date = start_date or datetime.date(2016, 1, 1)
+    params = {
+        "period1": int(datetime.datetime.combine(start_date, datetime.time.min).timestamp()),
+        "period2": int(datetime.datetime.combine(_end_date(), datetime.time.min).timestamp()),
+        "interval": "1d",
+        "events": "history",
+        "includeAdjustedClose": "true",
+    }
+    resp = await client.get(SOURCE_URLS["yahoo"], params=params)
+    if resp.status_code != 200:
+        raise RuntimeError(f"Yahoo Finance 下载失败: HTTP {resp.status_code}")
+    return parse_yahoo_csv(resp.content.decode("utf-8", errors="ignore"))
+
+
+class _RateLimiter:
+    """限制并发数，并保证相邻两次请求的发起间隔不小于 min_interval"""
+
+    def __init__(self, max_concurrency: int, min_interval: float):
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._lock = asyncio.Lock()
+        self._min_interval = min_interval
+        self._last = 0.0
+
+    async def __aenter__(self):
+        await self._sem.acquire()
+        async with self._lock:
+            wait = self._last + self._min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last = time.monotonic()
+
+    async def __aexit__(self, *exc):
+        self._sem.release()
+
+
+async def _gather_pages(coros: Sequence[Awaitable[Any]]) -> List[Any]:
+    """
+    并发执行各分页请求，按顺序返回结果；任何一页失败（或外层超时取消）时，
+    先取消并等待其余仍在进行的请求再抛出，不让它们在后台继续占用连接和限速额度
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _fetch_binance(client: httpx.AsyncClient, start_date: Optional[datetime.date]) -> List[Dict[str, Any]]:
+    """Binance 现货 BTCUSDT 日线，起始 2017-08-17；按页切分后并发拉取"""
+    start = datetime.datetime.combine(start_date or datetime.date(2017, 8, 17), datetime.time.min)
+    start_ts = int(start.timestamp() * 1000)
+    end_ts = int(time.time() * 1000)
+    page_ms = BINANCE_PAGE_LIMIT * _DAY_MS
+    limiter = _RateLimiter(BINANCE_MAX_CONCURRENCY, BINANCE_MIN_INTERVAL)
+
+    async def fetch_page(page_start: int) -> List[Dict[str, Any]]:
+        params = {
+            "symbol": "BTCUSDT",
+            "interval": "1d",
+            "startTime": page_start,
+            "endTime": min(page_start + page_ms - 1, end_ts),
+            "limit": BINANCE_PAGE_LIMIT,
+        }
+        async with limiter:
+            resp = await client.get(SOURCE_URLS["binance"], params=params)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Binance 下载失败: HTTP {resp.status_code}")
+        return parse_binance_klines(resp.json())
+
+    pages = await _gather_pages([fetch_page(ts) for ts in range(start_ts, end_ts + 1, page_ms)])
+    # 各页区间不重叠，按日期去重只是防御
+    by_date = {r["date"]: r for page in pages for r in page}
+    return [by_date[d] for d in sorted(by_date)]
+
+
+async def _fetch_coingecko(client: httpx.AsyncClient, start_date: Optional[datetime.date]) -> List[Dict[str, Any]]:
+    """CoinGecko market_chart（免费，无需 API key）；增量时只请求 start_date 之后的天数"""
+    params = {
+        "vs_currency": "usd",
+        "days": str((datetime.date.today() - start_date).days + 1) if start_date else "max",
+        "interval": "daily",
+    }
+    resp = await client.get(SOURCE_URLS["coingecko"], params=params)
+    if resp.status_code != 200:
+        raise RuntimeError(f"CoinGecko 下载失败: HTTP {resp.status_code}")
+    return parse_coingecko_prices(resp.json(), start_date)
+
+
+def parse_binance_columns(pages: List[Any]) -> Dict[str, np.ndarray]:
+    """
+    把多页 Binance klines 解析成列（date 为开盘时间的 Unix 秒），按时间排序并去重
+    """
+    rows = [k[:6] for page in pages if isinstance(page, list) for k in page]
+    if not rows:
+        return {name: np.empty(0) for name in ("date", "open", "high", "low", "close", "volume")}
+    # Binance 的价格和成交量是字符串，整体转换比逐个 float() 快
+    table = np.array(rows, dtype=object)
+    date = table[:, 0].astype(np.int64) // 1000
+    values = table[:, 1:6].astype(np.float64)
+    date, first = np.unique(date, return_index=True)
+    values = values[first]
+    return {
+        "date": date,
+        "open": values[:, 0],
+        "high": values[:, 1],
+        "low": values[:, 2],
+        "close": values[:, 3],
+        "volume": values[:, 4],
+    }
+
+
+async def _fetch_binance_intraday(
+    client: httpx.AsyncClient, timeframe: str, start_time: int, end_time: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """Binance 现货 BTCUSDT 日内K线，[start_time, end_time) 为 Unix 秒；按页切分后并发拉取"""
+    bar_ms = {"1h": 3600, "15m": 900, "1m": 60}[timeframe] * 1000
+    start_ts = start_time * 1000
+    end_ts = (end_time if end_time is not None else int(time.time())) * 1000
+    page_ms = BINANCE_PAGE_LIMIT * bar_ms
+    limiter = _RateLimiter(BINANCE_MAX_CONCURRENCY, BINANCE_MIN_INTERVAL)
+
+    async def fetch_page(page_start: int) -> Any:
+        params = {
+            "symbol": "BTCUSDT",
+            "interval": timeframe,
+            "startTime": page_start,
+            "endTime": min(page_start + page_ms, end_ts) - 1,
+            "limit": BINANCE_PAGE_LIMIT,
+        }
+        async with limiter:
+            resp = await client.get(SOURCE_URLS["binance"], params=params)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Binance 下载失败: HTTP {resp.status_code}")
+        return resp.json()
+
+    pages = await _gather_pages([fetch_page(ts) for ts in range(start_ts, end_ts, page_ms)])
+    return parse_binance_columns(pages)
+
+
+INTRADAY_FETCHERS = {"binance": _fetch_binance_intraday}
+
+
+async def fetch_intraday(
+    client: httpx.AsyncClient, source: str, timeframe: str, start_time: int, end_time: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """在截止时间内下载单个数据源的日内K线列，超时或请求失败时抛出 RuntimeError"""
+    name = SOURCE_NAMES[source]
+    fetcher = INTRADAY_FETCHERS.get(source)
+    if fetcher is None:
+        raise RuntimeError(f"{name} 不提供 {timeframe} 周期的K线")
+    try:
+        columns = await asyncio.wait_for(fetcher(client, timeframe, start_time, end_time), timeout=INTRADAY_DEADLINE)
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"{name} {timeframe} 数据超过 {INTRADAY_DEADLINE:g} 秒未完成")
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"{name} 请求失败: {e!r}")
+    return columns
+
+
+FETCHERS: Dict[str, Callable[[httpx.AsyncClient, Optional[datetime.date]], Awaitable[List[Dict[str, Any]]]]] = {
+    "yahoo": _fetch_yahoo,
+    "binance": _fetch_binance,
+    "coingecko": _fetch_coingecko,
+}
+
+SOURCE_NAMES = {"yahoo": "Yahoo Finance", "binance": "Binance", "coingecko": "CoinGecko"}
+
+
+async def fetch_source(
+    client: httpx.AsyncClient, source: str, start_date: Optional[datetime.date] = None
+) -> List[Dict[str, Any]]:
+    """在截止时间内下载单个数据源，超时或数据为空时抛出 RuntimeError"""
+    name = SOURCE_NAMES[source]
+    deadline = SOURCE_DEADLINES[source]
+    try:
+        rows = await asyncio.wait_for(FETCHERS[source](client, start_date), timeout=deadline)
+    except asyncio.TimeoutError:
+        raise RuntimeError(f"{name} 超过 {deadline:g} 秒未完成")
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"{name} 请求失败: {e!r}")
+    if not rows:
+        raise RuntimeError(f"{name} 数据为空")
+    return rows
+
+
+async def fetch_hedged(
+    client: httpx.AsyncClient,
+    sources: Sequence[str],
+    start_date: Optional[datetime.date] = None,
+    hedge_delay: float = HEDGE_DELAY,
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    按优先级对冲请求多个数据源，返回最先成功的 (数据源, K线)：
+    当前进行中的请求失败或 hedge_delay 秒内没有结果时，启动下一个数据源；
+    拿到结果后取消其余请求。全部失败时抛出 RuntimeError，附带各数据源的错误。
+    """
+    pending_sources = list(sources)
+    running: Dict[asyncio.Task, str] = {}
+    errors: List[str] = []
+
+    def launch() -> None:
+        source = pending_sources.pop(0)
+        running[asyncio.create_task(fetch_source(client, source, start_date))] = source
+
+    try:
+        launch()
+        while running:
+            timeout = hedge_delay if pending_sources else None
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                source = running.pop(task)
+                try:
+                    rows = task.result()
+                except Exception as e:
+                    errors.append(f"{SOURCE_NAMES[source]}: {e}")
+                    print(f"[FAIL] {SOURCE_NAMES[source]} 下载失败: {e}")
+                    continue
+                print(f"[OK] 成功从 {SOURCE_NAMES[source]} 下载 {len(rows)} 条BTC数据")
+                return source, rows
+            # 超时（对冲）或有数据源失败时，启动下一个
+            if pending_sources:
+                launch()
+        raise RuntimeError("所有在线数据源均失败: " + "; ".join(errors))
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+class SourceClient:
+    """
+    后台事件循环线程 + 共享连接池；同步代码通过 run() 提交协程并等待结果
+    """
+
+    def __init__(self, max_connections: int = 16, keepalive_expiry: float = 60.0):
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="data-sources", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # 只在后台事件循环中创建和使用，无需加锁
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=HEADERS,
+                timeout=httpx.Timeout(10.0, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                follow_redirects=True,
+            )
+        return self._client
+
+    def run(self, func: Callable[[httpx.AsyncClient], Awaitable[Any]]) -> Any:
+        """在后台事件循环中执行 func(client)，阻塞等待其结果"""
+
+        async def call():
+            return await func(await self._get_client())
+
+        return asyncio.run_coroutine_threadsafe(call(), self._start()).result()
+
+    def close(self) -> None:
+        """关闭连接池（进程退出前调用）"""
+        if self._loop is None:
+            return
+
+        async def aclose():
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+        asyncio.run_coroutine_threadsafe(aclose(), self._loop).result()
+
+
+_default_client = SourceClient()
+
+
+def download(source: str, start_date: Optional[datetime.date] = None) -> List[Dict[str, Any]]:
+    """同步下载单个数据源（增量更新时使用）"""
+    return _default_client.run(lambda client: fetch_source(client, source, start_date))
+
+
+def download_first_available(
+    sources: Sequence[str], start_date: Optional[datetime.date] = None
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """同步对冲下载，返回 (数据源, K线)"""
+    return _default_client.run(lambda client: fetch_hedged(client, sources, start_date))
+
+
+def download_intraday(
+    source: str, timeframe: str, start_time: int, end_time: Optional[int] = None
+) -> Dict[str, np.ndarray]:
+    """同步下载日内K线列（date 为 Unix 秒）"""
+    return _default_client.run(lambda client: fetch_intraday(client, source, timeframe, start_time, end_time))
+
+
+def close() -> None:
+    _default_client.close()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+曲线降采样（Largest-Triangle-Three-Buckets）
+在保留曲线形状（峰谷、拐点）的前提下把长序列压缩到指定点数，用于前端绘图；
+多条共用同一日期轴的曲线可一起选点（每个桶选一个对所有曲线都重要的点），结果仍然对齐
+"""
+import numpy as np
+
+
+def lttb_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    返回 LTTB 算法选出的下标（升序，包含首尾两点）。
+    点数不超过 max_points 时原样返回全部下标。
+    x 轴取下标本身（等间距K线）。
+    y 为二维数组 (曲线数, 点数) 时所有曲线共用一组下标：各曲线按自身值域归一化后，
+    每个桶选三角形面积之和最大的点，返回的点数同样不超过 max_points
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = y.shape[-1]
+    if max_points >= n or n <= 2:
+        return np.arange(n)
+    if max_points < 3:
+        raise ValueError("max_points 至少为 3")
+
+    if y.ndim == 2:
+        span = np.ptp(y, axis=1)
+        y = y / np.where(span > 0, span, 1.0)[:, None]
+    else:
+        y = y[None, :]
+    # 中间 n-2 个点平均分成 max_points-2 个桶
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # 下一个桶的平均点（最后一个桶用终点）
+        if b + 2 < max_points - 1:
+            nlo, nhi = edges[b + 1], edges[b + 2]
+            avg_x = (nlo + nhi - 1) / 2.0
+            avg_y = y[:, nlo:nhi].mean(axis=1)
+        else:
+            avg_x = float(n - 1)
+            avg_y = y[:, n - 1]
+        xs = np.arange(lo, hi)
+        # 三角形面积（省略常数 1/2），多条曲线相加
+        ya = y[:, a:a + 1]
+        area = np.abs((a - avg_x) * (y[:, lo:hi] - ya) - (a - xs) * (avg_y[:, None] - ya)).sum(axis=0)
+        a = lo + int(np.argmax(area))
+        selected[b + 1] = a
+    return selected
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+技术指标库
+- 全部为 O(n) 的向量化实现，与窗口长度无关：
+  滑动窗口类（SMA/WMA/滚动标准差）用累积和，递推类（EMA/ATR/RSI 的 Wilder 平滑）用分块的闭式解
+- 输出与输入等长，窗口未满的位置为 NaN
+- IndicatorCache 按 (数据版本, 指标, 参数) 记忆计算结果：同一价格序列上的多个策略、参数扫描
+  共用一次计算；可挂接进程内共享的 LRU（shared_memo），跨请求复用
+- 共享数据集文件中预计算的指标列（见 shared_dataset.py）登记后直接使用，不再计算
+"""
+import math
+import os
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+from price_series import PriceSeries
+from result_cache import ResultCache
+
+# 进程内共享指标缓存的上限
+INDICATOR_CACHE_MAX_ENTRIES = int(os.environ.get("INDICATOR_CACHE_MAX_ENTRIES", "512"))
+INDICATOR_CACHE_MAX_BYTES = int(float(os.environ.get("INDICATOR_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+# 不超过该窗口的滚动标准差直接按窗口计算（累积和相减在极小窗口上相对误差偏大，而窗口小时逐窗口计算同样很快）
+_DIRECT_STD_WINDOW = 8
+
+# 最多登记的预计算指标数据版本数（每次数据刷新产生一个新版本）
+MAX_PRECOMPUTED_VERSIONS = 8
+
+# 递推平滑按块求闭式解时，块内衰减因子的最大量级（10 的幂），保证缩放后不溢出且精度不受影响
+_EWM_BLOCK_DECADES = 50.0
+
+
+def _check_window(window: int) -> None:
+    if window < 1:
+        raise ValueError("指标窗口必须为正整数")
+
+
+def sma(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    简单移动平均（累积和实现），前 window-1 个位置为 NaN
+    """
+    _check_window(window)
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if window <= n:
+        csum = np.empty(n + 1)
+        csum[0] = 0.0
+        np.cumsum(values, out=csum[1:])
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def wma(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    线性加权移动平均（最近一根权重为 window，最早一根为 1）。
+    分子 Σ(i-(t-w))·x_i 由 Σi·x_i 与 Σx_i 两个累积和相减得到；
+    先减去均值再累积，减小大数相减的误差
+    """
+    _check_window(window)
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if window <= n:
+        mean = float(values.mean())
+        x = values - mean
+        idx = np.arange(n, dtype=np.float64)
+        c1 = np.zeros(n + 1)
+        c2 = np.zeros(n + 1)
+        np.cumsum(x, out=c1[1:])
+        np.cumsum(x * idx, out=c2[1:])
+        t = idx[window - 1:]
+        s1 = c1[window:] - c1[:-window]
+        s2 = c2[window:] - c2[:-window]
+        out[window - 1:] = (s2 - (t - window) * s1) / (window * (window + 1) / 2) + mean
+    return out
+
+
+def rolling_std(values: np.ndarray, window: int, ddof: int = 0) -> np.ndarray:
+    """
+    滚动标准差（默认总体标准差 ddof=0，与布林带的常用定义一致）。
+    用平移后数据的一阶、二阶累积和计算，负的舍入误差截断为 0；极小窗口直接按窗口计算
+    """
+    _check_window(window)
+    if window - ddof < 1:
+        raise ValueError("滚动标准差的窗口必须大于 ddof")
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if window <= min(n, _DIRECT_STD_WINDOW):
+        out[window - 1:] = np.lib.stride_tricks.sliding_window_view(values, window).std(axis=1, ddof=ddof)
+    elif window <= n:
+        x = values - float(values.mean())
+        c1 = np.zeros(n + 1)
+        c2 = np.zeros(n + 1)
+        np.cumsum(x, out=c1[1:])
+        np.cumsum(x * x, out=c2[1:])
+        s1 = c1[window:] - c1[:-window]
+        s2 = c2[window:] - c2[:-window]
+        var = (s2 - s1 * s1 / window) / (window - ddof)
+        out[window - 1:] = np.sqrt(np.maximum(var, 0.0))
+    return out
+
+
+def _ewm_continue(values: np.ndarray, alpha: float, seed: float) -> np.ndarray:
+    """
+    从初值 seed 开始递推 y_t = y_{t-1} + alpha·(x_t - y_{t-1})，返回与 values 等长的 y。
+    按块计算闭式解 y_{s+k} = d^k·y_s + alpha·Σ_{j≤k} d^{k-j}·x_{s+j}（d = 1-alpha）：
+    块内是一次累积和，块与块之间只传递块末的值
+    """
+    m = values.shape[0]
+    if m == 0:
+        return np.empty(0)
+    d = 1.0 - alpha
+    if d <= 0.0:
+        return values.astype(np.float64, copy=True)
+    block = max(1, min(m, int(_EWM_BLOCK_DECADES / -math.log10(d))))
+    rows = -(-m // block)
+    padded = np.zeros(rows * block)
+    padded[:m] = values
+    x = padded.reshape(rows, block)
+    k = np.arange(1, block + 1, dtype=np.float64)
+    decay = d ** k
+    # 各块以 0 为初值的响应
+    zero_seeded = alpha * np.cumsum(x / decay, axis=1) * decay
+    # 各块的初值依次由上一块的末值决定（只有 rows 次标量运算）
+    seeds = np.empty(rows)
+    prev = float(seed)
+    d_block = decay[-1]
+    last = zero_seeded[:, -1].tolist()
+    for r in range(rows):
+        seeds[r] = prev
+        prev = last[r] + d_block * prev
+    return (zero_seeded + seeds[:, None] * decay).ravel()[:m]
+
+
+def _seeded_ewm(values: np.ndarray, window: int, alpha: float) -> np.ndarray:
+    """以前 window 个值的简单平均为初值（位于 window-1）的指数平滑，之前为 NaN"""
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if window <= n:
+        seed = float(values[:window].mean())
+        out[window - 1] = seed
+        out[window:] = _ewm_continue(values[window:], alpha, seed)
+    return out
+
+
+def ema(values: np.ndarray, span: int) -> np.ndarray:
+    """
+    指数移动平均，alpha = 2/(span+1)；第 span-1 个位置取前 span 个值的简单平均作为初值
+    """
+    _check_window(span)
+    return _seeded_ewm(values, span, 2.0 / (span + 1))
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """真实波幅 max(高-低, |高-前收|, |低-前收|)，第一根K线取 高-低"""
+    tr = high - low
+    if tr.shape[0] > 1:
+        prev_close = close[:-1]
+        tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)))
+    return tr
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, window: int = 14) -> np.ndarray:
+    """
+    平均真实波幅（Wilder 平滑，alpha = 1/window），第 window-1 个位置取前 window 个真实波幅的平均
+    """
+    _check_window(window)
+    return _seeded_ewm(true_range(high, low, close), window, 1.0 / window)
+
+
+def rsi(values: np.ndarray, window: int = 14) -> np.ndarray:
+    """
+    相对强弱指数（Wilder 平滑），前 window 个位置为 NaN；
+    平均跌幅为 0 时取 100，涨跌幅都为 0 时取 50
+    """
+    _check_window(window)
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if window < n:
+        diff = np.diff(values)
+        gain = _seeded_ewm(np.maximum(diff, 0.0), window, 1.0 / window)[window - 1:]
+        loss = _seeded_ewm(np.maximum(-diff, 0.0), window, 1.0 / window)[window - 1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            value = 100.0 - 100.0 / (1.0 + gain / loss)
+        value[loss == 0] = 100.0
+        value[(loss == 0) & (gain == 0)] = 50.0
+        out[window:] = value
+    return out
+
+
+def bollinger(values: np.ndarray, window: int = 20, num_std: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """布林带，返回 (中轨 SMA, 上轨, 下轨)"""
+    mid = sma(values, window)
+    width = num_std * rolling_std(values, window)
+    return mid, mid + width, mid - width
+
+
+def _freeze(arr: np.ndarray) -> np.ndarray:
+    arr.setflags(write=False)
+    return arr
+
+
+# 进程内共享的指标缓存（按字节数计入上限）
+shared_memo = ResultCache(
+    max_entries=INDICATOR_CACHE_MAX_ENTRIES,
+    max_bytes=INDICATOR_CACHE_MAX_BYTES,
+    sizeof=lambda value: sum(a.nbytes for a in value) if isinstance(value, tuple) else value.nbytes,
+)
+
+
+# 预计算的指标列：数据版本 -> {(指标, 参数): 只读数组}，按登记顺序淘汰最早的版本
+_precomputed: Dict[str, Dict[Tuple[Hashable, ...], np.ndarray]] = {}
+
+
+def register_precomputed(version: str, columns: Dict[Tuple[Hashable, ...], np.ndarray]) -> None:
+    """
+    登记某个数据版本的预计算指标，键与 IndicatorCache 内部一致，如 ("sma", 50)、("rsi", 14)
+    """
+    _precomputed.pop(version, None)
+    _precomputed[version] = {key: _freeze(arr) for key, arr in columns.items()}
+    while len(_precomputed) > MAX_PRECOMPUTED_VERSIONS:
+        del _precomputed[next(iter(_precomputed))]
+
+
+class IndicatorCache:
+    """
+    绑定到一个价格序列的指标缓存：同一 (指标, 参数) 只计算一次，返回只读数组。
+    memo 为跨实例共享的缓存（如 shared_memo），键中带数据版本，数据更新后旧结果自然失效；
+    不传时只在本实例内缓存
+    """
+
+    def __init__(self, series: PriceSeries, memo: Optional[ResultCache] = None):
+        self.series = series
+        self.memo = memo
+        self._local: Dict[Hashable, Any] = {}
+
+    def _get(self, key: Tuple[Hashable, ...], compute) -> Any:
+        value = self._local.get(key)
+        if value is not None:
+            return value
+        version = self.series.version
+        value = _precomputed.get(version, {}).get(key)
+        if value is not None:
+            self._local[key] = value
+            return value
+        memo_key = (version,) + key if self.memo is not None else None
+        if memo_key is not None:
+            value = self.memo.get(memo_key)
+        if value is None:
+            value = compute()
+            value = tuple(_freeze(a) for a in value) if isinstance(value, tuple) else _freeze(value)
+            if memo_key is not None:
+                self.memo.put(memo_key, value)
+        self._local[key] = value
+        return value
+
+    def sma(self, window: int) -> np.ndarray:
+        return self._get(("sma", window), lambda: sma(self.series.close, window))
+
+    def ema(self, span: int) -> np.ndarray:
+        return self._get(("ema", span), lambda: ema(self.series.close, span))
+
+    def wma(self, window: int) -> np.ndarray:
+        return self._get(("wma", window), lambda: wma(self.series.close, window))
+
+    def rolling_std(self, window: int) -> np.ndarray:
+        return self._get(("rolling_std", window), lambda: rolling_std(self.series.close, window))
+
+    def atr(self, window: int = 14) -> np.ndarray:
+        s = self.series
+        return self._get(("atr", window), lambda: atr(s.high, s.low, s.close, window))
+
+    def rsi(self, window: int = 14) -> np.ndarray:
+        return self._get(("rsi", window), lambda: rsi(self.series.close, window))
+
+    def bollinger(self, window: int = 20, num_std: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        def compute():
+            mid = self.sma(window)
+            width = num_std * self.rolling_std(window)
+            return mid, mid + width, mid - width
+
+        return self._get(("bollinger", window, float(num_std)), compute)
+
+    def __len__(self) -> int:
+        return len(self._local)
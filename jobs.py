@@ -0,0 +1,434 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务队列
+大规模参数扫描等耗时计算不在 HTTP 请求内执行（部署平台会因请求超时中断），而是提交为后台任务：
+- 提交 / 查询状态 / 获取结果 / 取消
+- 本地工作线程池执行任务，单个任务内部可使用多进程（见 sweep.iter_sweep_results）
+- 扫描任务逐个组合调用 sweep.run_combination（与同步扫描接口相同），它是
+  run_double_ma_strategy(..., fields=("summary",)) 的精简版，两者的摘要一致；每个组合只保存参数和摘要，
+  有意不保存交易明细和资金曲线（数十万个组合的明细会撑大数据库），需要时用回测接口单独重跑该组合
+- 任务和逐个组合的结果写入 SQLite，服务重启后未完成的任务从已保存的进度继续执行；
+  可排序的摘要指标另存为数值列，结果分页直接由 SQLite 排序（ORDER BY ... LIMIT/OFFSET），不解码全部结果
+- 多个服务进程共用同一个数据库时，通过原子状态更新认领任务，同一任务不会被重复执行
+"""
+import datetime
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from data_cache import CACHE_DIR
+from price_series import PriceSeries
+from sweep import SORTABLE_METRICS, check_sweep_data, iter_sweep_results, parse_param_range, parse_sweep_grid
+from walk_forward import run_walk_forward
+
+JOBS_DB = os.environ.get("BTC_JOBS_DB", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# 同时执行的任务数
+JOB_WORKERS = int(os.environ.get("BTC_JOB_WORKERS", "1"))
+# 单个扫描任务内部的并行进程数
+JOB_PROCESSES = int(os.environ.get("BTC_JOB_PROCESSES", "1"))
+# 后台任务允许的最大组合数（远大于同步接口的上限）
+JOB_MAX_COMBINATIONS = int(os.environ.get("BTC_JOB_MAX_COMBINATIONS", "200000"))
+# 结果批量写入数据库的间隔（秒），也是检查取消请求的间隔
+COMMIT_INTERVAL = 1.0
+
+# 任务状态：queued -> running -> done / failed / cancelled
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    data_version TEXT,
+    owner TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+# job_results 中保存的排序指标列（取自结果的 summary，缺失时为 NULL）
+_METRIC_COLUMNS = ", ".join(f"{name} REAL" for name in SORTABLE_METRICS)
+
+
+def _iso(ts: Optional[float]) -> Optional[str]:
+    return datetime.datetime.fromtimestamp(ts).isoformat(timespec="seconds") if ts else None
+
+
+class JobStore:
+    """
+    任务持久化（SQLite，WAL 模式）；每次操作使用独立连接，可在多个线程中调用
+    """
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._add_metric_columns(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _add_metric_columns(conn: sqlite3.Connection) -> None:
+        """补上旧数据库缺少的指标列，并从已保存的结果中回填"""
+        existing = {r["name"] for r in conn.execute("PRAGMA table_info(job_results)")}
+        missing = [name for name in SORTABLE_METRICS if name not in existing]
+        if not missing:
+            return
+        with conn:
+            for name in missing:
+                conn.execute(f"ALTER TABLE job_results ADD COLUMN {name} REAL")
+            rows = conn.execute("SELECT job_id, idx, result FROM job_results").fetchall()
+            conn.executemany(
+                f"UPDATE job_results SET {', '.join(f'{name} = ?' for name in missing)} WHERE job_id = ? AND idx = ?",
+                [
+                    tuple((json.loads(r["result"]).get("summary") or {}).get(name) for name in missing)
+                    + (r["job_id"], r["idx"])
+                    for r in rows
+                ],
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _query(self, sql: str, args: tuple = ()) -> List[sqlite3.Row]:
+        conn = self._connect()
+        try:
+            return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def _execute(self, sql: str, args: tuple = ()) -> int:
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, args).rowcount
+        finally:
+            conn.close()
+
+    def create(self, kind: str, params: Dict[str, Any], total: int) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        self._execute(
+            "INSERT INTO jobs (id, kind, params, status, total, created_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (job_id, kind, json.dumps(params), total, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(rows[0])
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [self.get(r["id"]) for r in rows]
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at")
+        return [self.get(r["id"]) for r in rows]
+
+    def claim(self, job_id: str, owner: str) -> bool:
+        """原子地把 queued 任务标记为 running，返回是否认领成功"""
+        return self._execute(
+            "UPDATE jobs SET status = 'running', owner = ?, started_at = COALESCE(started_at, ?) "
+            "WHERE id = ? AND status = 'queued'",
+            (owner, time.time(), job_id),
+        ) == 1
+
+    def requeue(self, job_id: str) -> None:
+        self._execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE id = ? AND status = 'running'", (job_id,))
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> bool:
+        """结束任务；已经结束（例如已取消）的任务不再改变状态"""
+        return self._execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (status, error, time.time(), job_id),
+        ) == 1
+
+    def set_data_version(self, job_id: str, version: str) -> None:
+        self._execute("UPDATE jobs SET data_version = ? WHERE id = ?", (version, job_id))
+
+    def add_results(self, job_id: str, items: List[tuple]) -> None:
+        """写入一批 (序号, 结果字典)，并更新已完成数"""
+        columns = ", ".join(SORTABLE_METRICS)
+        placeholders = ", ".join("?" * (3 + len(SORTABLE_METRICS)))
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO job_results (job_id, idx, result, {columns}) VALUES ({placeholders})",
+                    [
+                        (job_id, idx, json.dumps(result))
+                        + tuple((result.get("summary") or {}).get(name) for name in SORTABLE_METRICS)
+                        for idx, result in items
+                    ],
+                )
+                conn.execute(
+                    "UPDATE jobs SET completed = (SELECT COUNT(*) FROM job_results WHERE job_id = ?) WHERE id = ?",
+                    (job_id, job_id),
+                )
+        finally:
+            conn.close()
+
+    def clear_results(self, job_id: str) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+                conn.execute("UPDATE jobs SET completed = 0 WHERE id = ?", (job_id,))
+        finally:
+            conn.close()
+
+    def done_indices(self, job_id: str) -> Set[int]:
+        return {r["idx"] for r in self._query("SELECT idx FROM job_results WHERE job_id = ?", (job_id,))}
+
+    def results(self, job_id: str) -> List[Dict[str, Any]]:
+        rows = self._query("SELECT result FROM job_results WHERE job_id = ? ORDER BY idx", (job_id,))
+        return [json.loads(r["result"]) for r in rows]
+
+    def ranked_results(
+        self, job_id: str, sort_by: str, descending: bool = True, offset: int = 0, limit: int = 100
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        按指标排序的一页结果，返回 (结果总数, 本页结果)；排序规则与 sweep.rank_results 相同
+        （指标为 None 的排在最后，相同时按组合序号），名次写入 "rank"
+        """
+        if sort_by not in SORTABLE_METRICS:
+            raise ValueError(f"不支持的排序指标: {sort_by}，可选: {', '.join(SORTABLE_METRICS)}")
+        total = self._query("SELECT COUNT(*) AS n FROM job_results WHERE job_id = ?", (job_id,))[0]["n"]
+        rows = self._query(
+            f"SELECT result FROM job_results WHERE job_id = ? "
+            f"ORDER BY {sort_by} IS NULL, {sort_by} {'DESC' if descending else 'ASC'}, idx LIMIT ? OFFSET ?",
+            (job_id, limit, offset),
+        )
+        results = []
+        for rank, row in enumerate(rows, start=offset + 1):
+            item = json.loads(row["result"])
+            item["rank"] = rank
+            results.append(item)
+        return total, results
+
+
+def _prepare_sweep(params: Dict[str, Any]) -> int:
+    """校验扫描任务参数，返回组合数"""
+    return len(parse_sweep_grid(params["ranges"], JOB_MAX_COMBINATIONS))
+
+
+def _run_sweep(runner: "JobRunner", job: Dict[str, Any], series: PriceSeries) -> None:
+    params = job["params"]
+    grid = parse_sweep_grid(params["ranges"], JOB_MAX_COMBINATIONS)
+    series = check_sweep_data(series, grid)
+    done = runner.store.done_indices(job["id"])
+    todo = [i for i in range(len(grid)) if i not in done]
+    results = iter_sweep_results(series, [grid[i] for i in todo], params["initial_capital"], runner.processes)
+    batch: List[tuple] = []
+    last_commit = time.time()
+    try:
+        for item in results:
+            batch.append((todo[item["index"]], {"params": item["params"], "summary": item["summary"]}))
+            if time.time() - last_commit >= COMMIT_INTERVAL:
+                runner.store.add_results(job["id"], batch)
+                batch, last_commit = [], time.time()
+                if runner.is_cancelled(job["id"]):
+                    return
+    finally:
+        results.close()
+        if batch:
+            runner.store.add_results(job["id"], batch)
+
+
+def _prepare_walk_forward(params: Dict[str, Any]) -> int:
+    """校验滚动前推参数；整个分析作为一个结果保存，工作量记为 1"""
+    parse_param_range("short", params["short"], int)
+    parse_param_range("long", params["long"], int)
+    return 1
+
+
+def _run_walk_forward(runner: "JobRunner", job: Dict[str, Any], series: PriceSeries) -> None:
+    params = dict(job["params"])
+    params.pop("timeframe", None)
+    result = run_walk_forward(
+        series,
+        shorts=parse_param_range("short", params.pop("short"), int),
+        longs=parse_param_range("long", params.pop("long"), int),
+        max_evaluations=JOB_MAX_COMBINATIONS * 10,
+        **params,
+    )
+    runner.store.add_results(job["id"], [(0, result)])
+
+
+# 任务类型：(校验参数并返回工作量, 执行函数)
+JOB_KINDS: Dict[str, tuple] = {
+    "sweep": (_prepare_sweep, _run_sweep),
+    "walk_forward": (_prepare_walk_forward, _run_walk_forward),
+}
+
+
+class JobRunner:
+    """
+    本地任务执行器：若干工作线程从队列中取任务执行，进度和结果实时写入 JobStore
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        load_series: Callable[[str], PriceSeries],
+        workers: int = JOB_WORKERS,
+        processes: int = JOB_PROCESSES,
+    ):
+        self.store = store
+        self.load_series = load_series
+        self.workers = max(1, workers)
+        self.processes = max(1, processes)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._cancelled: Set[str] = set()
+        # 本进程内任务的 (开始时间, 开始时已完成数)，用于估算剩余时间
+        self._progress: Dict[str, tuple] = {}
+
+    def start(self) -> None:
+        """启动工作线程，并恢复上次未完成的任务"""
+        if self._threads:
+            return
+        for job in self.store.unfinished():
+            if job["status"] == "running":
+                if self._owner_alive(job["owner"]):
+                    # 其它服务进程正在执行
+                    continue
+                self.store.requeue(job["id"])
+                print(f"[OK] 恢复未完成的任务 {job['id']}（已完成 {job['completed']}/{job['total']}）")
+            self._queue.put(job["id"])
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _owner_alive(self, owner: Optional[str]) -> bool:
+        """任务的执行进程是否仍在运行（只能判断本机进程，其它主机视为存活）"""
+        if not owner:
+            return False
+        if owner == self.owner:
+            return False
+        host, _, pid = owner.rpartition(":")
+        if host != socket.gethostname():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def stop(self) -> None:
+        for _ in self._threads:
+            self._queue.put(None)
+        self._threads = []
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """校验参数并加入队列；参数错误抛出 ValueError"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"不支持的任务类型: {kind}，可选: {', '.join(JOB_KINDS)}")
+        total = JOB_KINDS[kind][0](params)
+        job_id = self.store.create(kind, params, total)
+        self._queue.put(job_id)
+        return self.status(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """取消排队中或运行中的任务（运行中的任务在下一次写入结果时停止），任务不存在时返回 None"""
+        if self.store.get(job_id) is None:
+            return None
+        if self.store.finish(job_id, "cancelled"):
+            self._cancelled.add(job_id)
+        return self.status(job_id)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        if job_id in self._cancelled:
+            return True
+        # 取消请求可能由其它服务进程写入数据库
+        job = self.store.get(job_id)
+        return job is None or job["status"] == "cancelled"
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        eta = None
+        if job["status"] == "running" and job["id"] in self._progress:
+            started, completed_at_start = self._progress[job["id"]]
+            done_here = job["completed"] - completed_at_start
+            elapsed = time.time() - started
+            if done_here > 0 and elapsed > 0:
+                eta = round((job["total"] - job["completed"]) * elapsed / done_here, 1)
+        return {
+            "id": job["id"],
+            "kind": job["kind"],
+            "params": job["params"],
+            "status": job["status"],
+            "total": job["total"],
+            "completed": job["completed"],
+            "progress_pct": round(job["completed"] / job["total"] * 100, 2) if job["total"] else 100.0,
+            "eta_seconds": eta,
+            "data_version": job["data_version"],
+            "error": job["error"],
+            "created_at": _iso(job["created_at"]),
+            "started_at": _iso(job["started_at"]),
+            "finished_at": _iso(job["finished_at"]),
+        }
+
+    def _loop(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            try:
+                self._run(job_id)
+            except Exception as e:
+                print(f"[FAIL] 任务 {job_id} 执行失败: {e}")
+                self.store.finish(job_id, "failed", str(e))
+            finally:
+                self._progress.pop(job_id, None)
+
+    def _run(self, job_id: str) -> None:
+        if not self.store.claim(job_id, self.owner):
+            # 已取消、已完成或已被其它进程认领
+            return
+        job = self.store.get(job_id)
+        # 任务参数中的 K 线周期（旧任务没有该字段，按日线处理）
+        series = self.load_series(job["params"].get("timeframe", "1d"))
+        if job["data_version"] and job["data_version"] != series.version:
+            # 数据已更新：丢弃旧版本数据上的部分结果，避免混用
+            print(f"[WARN] 任务 {job_id} 的数据版本已变化，从头重新计算")
+            self.store.clear_results(job_id)
+            job = self.store.get(job_id)
+        self.store.set_data_version(job_id, series.version)
+        self._progress[job_id] = (time.time(), job["completed"])
+        print(f"[OK] 开始执行任务 {job_id}（{job['kind']}，{job['completed']}/{job['total']}）")
+        JOB_KINDS[job["kind"]][1](self, job, series)
+        if self.is_cancelled(job_id):
+            print(f"[WARN] 任务 {job_id} 已取消")
+        elif self.store.finish(job_id, "done"):
+            print(f"[OK] 任务 {job_id} 完成")
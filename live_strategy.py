@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+双均线策略的增量（逐根K线）状态
+新K线到来时不必在全部历史上重跑回测：状态对象保存均线窗口的滚动和、持仓、现金/持币、
+入场价（止损止盈），每根K线 O(1) 推进；可导出快照（snapshot）并恢复（restore），
+实盘信号接口直接在快照上推进新K线。统计摘要由 metrics.MetricsAccumulator 随K线逐根累计。
+支持各K线周期：日内周期的日期为 ISO 时间（YYYY-MM-DDTHH:MM），持仓天数和年化按周期折算。
+
+交易规则与 strategy_engine.simulate_double_ma 完全一致：
+- 当根持仓由上一根K线的均线信号决定，空仓且信号为多时按收盘价满仓买入
+- 持仓时信号转空、或收盘价触及止损/止盈价，按收盘价全部卖出
+- 平仓原因按 止损 > 止盈 > 信号 的优先级记录，与 strategy_engine.extract_trades 相同
+"""
+import datetime
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from metrics import MetricsAccumulator
+from price_series import PriceSeries, DAY_SECONDS, check_timeframe, timeframe_seconds
+from strategy_engine import calculate_trade_cost
+from sweep import PARAM_BOUNDS, PARAM_TYPES
+
+
+def _day_number(date: str) -> float:
+    """ISO 日期/时间 -> 天数（日线为 date.toordinal()，日内K线带小数部分），用于持仓天数和年化"""
+    moment = datetime.datetime.fromisoformat(date)
+    seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+    return moment.toordinal() + seconds / DAY_SECONDS if seconds else moment.toordinal()
+
+
+def _position_of(series: PriceSeries, date: str) -> int:
+    """series 中不早于 ISO 日期/时间 date 的第一根K线的位置"""
+    moment = datetime.datetime.fromisoformat(date)
+    if series.intraday:
+        key = int((moment - datetime.datetime(1970, 1, 1)).total_seconds())
+    else:
+        key = moment.toordinal() - datetime.date(1970, 1, 1).toordinal()
+    return int(np.searchsorted(series.date, key))
+
+
+def check_params(params: Any) -> Dict[str, Any]:
+    """
+    校验客户端快照中的策略参数：不允许未知参数，取值范围与 GET /api/live/double_ma/signal 一致
+    （在分配均线窗口缓冲区之前检查），不合法时抛出 ValueError
+    """
+    if not isinstance(params, dict):
+        raise ValueError("快照参数 params 必须是对象")
+    allowed = set(PARAM_TYPES) | {"initial_capital", "timeframe"}
+    unknown = sorted(set(params) - allowed)
+    if unknown:
+        raise ValueError(f"快照参数中有未知字段: {', '.join(map(str, unknown))}")
+    for name in ("short", "long"):
+        if name not in params:
+            raise ValueError(f"快照参数缺少 {name}")
+    checked: Dict[str, Any] = {}
+    for name, value in params.items():
+        if name == "timeframe":
+            if not isinstance(value, str):
+                raise ValueError("快照参数 timeframe 必须是字符串")
+            check_timeframe(value)
+            checked[name] = value
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError(f"快照参数 {name} 必须是有限的数值")
+        if name == "initial_capital":
+            if value <= 0:
+                raise ValueError("快照参数 initial_capital 必须大于0")
+            checked[name] = float(value)
+            continue
+        if PARAM_TYPES[name] is int and value != int(value):
+            raise ValueError(f"快照参数 {name} 必须是整数")
+        low, high = PARAM_BOUNDS[name]
+        if not low <= value <= high:
+            raise ValueError(f"快照参数 {name} 取值 {value} 超出范围 [{low}, {high}]")
+        checked[name] = PARAM_TYPES[name](value)
+    return checked
+
+
+class DoubleMAState:
+    """
+    可恢复的双均线策略状态；update() 每次推进一根K线
+    """
+
+    def __init__(
+        self,
+        short: int,
+        long: int,
+        initial_capital: float = 10000.0,
+        fee_rate: float = 0.001,
+        slippage_rate: float = 0.0005,
+        stop_loss_pct: float = 0.0,
+        take_profit_pct: float = 0.0,
+        timeframe: str = "1d",
+    ):
+        check_timeframe(timeframe)
+        if short >= long:
+            raise ValueError("短均线周期必须小于长均线周期")
+        if short < 1:
+            raise ValueError("均线周期必须为正整数")
+        self.short = short
+        self.long = long
+        self.initial_capital = initial_capital
+        self.fee_rate = fee_rate
+        self.slippage_rate = slippage_rate
+        self.stop_loss_pct = stop_loss_pct
+        self.take_profit_pct = take_profit_pct
+        self.timeframe = timeframe
+
+        # 最近 long 根收盘价的环形缓冲区，head 为下一次写入的位置
+        self._buf: List[float] = [0.0] * long
+        self._head = 0
+        self._sum_short = 0.0
+        self._sum_long = 0.0
+
+        self.bars = 0
+        self.last_date: Optional[str] = None
+        self.last_close: Optional[float] = None
+        self.ma_short: Optional[float] = None
+        self.ma_long: Optional[float] = None
+        # 当前K线收盘后的均线信号，决定下一根K线的持仓
+        self.signal = False
+        self.position = 0
+        self.cash = float(initial_capital)
+        self.holdings = 0.0
+        self.entry_price: Optional[float] = None
+        self.entry_date: Optional[str] = None
+        self.equity = float(initial_capital)
+        self.num_trades = 0
+        self.last_trade: Optional[Dict[str, Any]] = None
+        # 与回测相同口径的统计：资金曲线从长均线有值的K线开始计入
+        self.metrics = MetricsAccumulator(initial_capital, bar_days=timeframe_seconds(timeframe) / DAY_SECONDS)
+
+    def params(self) -> Dict[str, Any]:
+        return {
+            "short": self.short,
+            "long": self.long,
+            "initial_capital": self.initial_capital,
+            "fee_rate": self.fee_rate,
+            "slippage_rate": self.slippage_rate,
+            "stop_loss_pct": self.stop_loss_pct,
+            "take_profit_pct": self.take_profit_pct,
+            "timeframe": self.timeframe,
+        }
+
+    def _push_close(self, close: float) -> None:
+        """更新环形缓冲区和两条均线的滚动和"""
+        buf, head, long = self._buf, self._head, self.long
+        n = self.bars  # 本根K线之前已有的K线数
+        if n >= long:
+            self._sum_long -= buf[head]
+        if n >= self.short:
+            self._sum_short -= buf[(head - self.short) % long]
+        buf[head] = close
+        self._sum_long += close
+        self._sum_short += close
+        self._head = (head + 1) % long
+        if self._head == 0 and n + 1 >= long:
+            # 每绕缓冲区一圈重新精确求和一次，消除加减累积的浮点误差（均摊 O(1)）
+            self._sum_long = math.fsum(buf)
+            self._sum_short = math.fsum(buf[long - self.short:])
+
+    def update(self, date: str, close: float) -> Dict[str, Any]:
+        """
+        推进一根K线（date 为 ISO 日期，日内周期为 ISO 时间，须晚于上一根），返回当前信号
+        """
+        if self.last_date is not None and date <= self.last_date:
+            raise ValueError(f"K线日期 {date} 必须晚于上一根 {self.last_date}")
+        if not close > 0:
+            raise ValueError("收盘价必须大于0")
+        price = float(close)
+        day = _day_number(date)
+        if self.bars == 0:
+            self.metrics.start_day = day
+
+        if self.position == 1:
+            # 平仓原因的优先级与 strategy_engine.extract_trades 一致：止损 > 止盈 > 信号
+            exit_reason = None
+            if self.stop_loss_pct > 0 and price <= self.entry_price * (1 - self.stop_loss_pct / 100):
+                exit_reason = "stop_loss"
+            elif self.take_profit_pct > 0 and price >= self.entry_price * (1 + self.take_profit_pct / 100):
+                exit_reason = "take_profit"
+            elif not self.signal:
+                exit_reason = "signal"
+            if exit_reason is not None:
+                self.cash = self.holdings * price - calculate_trade_cost(
+                    price, self.holdings, self.fee_rate, self.slippage_rate
+                )
+                self.num_trades += 1
+                pnl_pct = (price - self.entry_price) / self.entry_price
+                self.metrics.add_trade(pnl_pct, _day_number(self.entry_date), day)
+                self.last_trade = {
+                    "entry_date": self.entry_date,
+                    "exit_date": date,
+                    "entry_price": self.entry_price,
+                    "exit_price": price,
+                    "pnl_pct": pnl_pct,
+                    "exit_reason": exit_reason,
+                }
+                self.holdings = 0.0
+                self.position = 0
+                self.entry_price = None
+                self.entry_date = None
+        elif self.signal:
+            available_cash = self.cash - self.cash * (self.fee_rate + self.slippage_rate)
+            if self.cash > 0 and available_cash > 0:
+                holdings = available_cash / price
+                self.cash = self.cash - holdings * price - calculate_trade_cost(
+                    price, holdings, self.fee_rate, self.slippage_rate
+                )
+                self.holdings = holdings
+                self.position = 1
+                self.entry_price = price
+                self.entry_date = date
+
+        self.equity = self.cash + self.holdings * price
+        if self.bars >= self.long - 1:
+            self.metrics.update(self.equity, day)
+        self._push_close(price)
+        self.bars += 1
+        self.last_date = date
+        self.last_close = price
+        self.ma_short = self._sum_short / self.short if self.bars >= self.short else None
+        self.ma_long = self._sum_long / self.long if self.bars >= self.long else None
+        self.signal = self.ma_long is not None and self.ma_short > self.ma_long
+        return self.current()
+
+    def current(self) -> Dict[str, Any]:
+        """当前（最后一根K线收盘后）的状态与下一根K线的操作建议"""
+        if self.position == 1 and not self.signal:
+            action = "sell"
+        elif self.position == 0 and self.signal:
+            action = "buy"
+        else:
+            action = "hold"
+        stop_price = take_profit_price = None
+        if self.position == 1:
+            if self.stop_loss_pct > 0:
+                stop_price = self.entry_price * (1 - self.stop_loss_pct / 100)
+            if self.take_profit_pct > 0:
+                take_profit_price = self.entry_price * (1 + self.take_profit_pct / 100)
+        return {
+            "date": self.last_date,
+            "close": self.last_close,
+            "ma_short": self.ma_short,
+            "ma_long": self.ma_long,
+            "signal": "long" if self.signal else "flat",
+            "position": self.position,
+            "next_action": action,
+            "equity": self.equity,
+            "cash": self.cash,
+            "holdings": self.holdings,
+            "entry_price": self.entry_price,
+            "stop_price": stop_price,
+            "take_profit_price": take_profit_price,
+            "bars": self.bars,
+            "num_trades": self.num_trades,
+            "last_trade": self.last_trade,
+            "summary": self.metrics.summary(),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出可 JSON 序列化的完整状态"""
+        k = min(self.bars, self.long)
+        # 按时间顺序导出缓冲区中的有效收盘价
+        window = [self._buf[(self._head - k + i) % self.long] for i in range(k)]
+        return {
+            "params": self.params(),
+            "window": window,
+            "bars": self.bars,
+            "last_date": self.last_date,
+            "signal": self.signal,
+            "position": self.position,
+            "cash": self.cash,
+            "holdings": self.holdings,
+            "entry_price": self.entry_price,
+            "entry_date": self.entry_date,
+            "equity": self.equity,
+            "num_trades": self.num_trades,
+            "last_trade": self.last_trade,
+            "metrics": self.metrics.to_dict(),
+        }
+
+    @classmethod
+    def restore(cls, snapshot: Dict[str, Any]) -> "DoubleMAState":
+        """由 snapshot() 的结果恢复状态；快照不完整或不合法时抛出 ValueError"""
+        try:
+            state = cls(**check_params(snapshot["params"]))
+            window = [float(c) for c in snapshot["window"]]
+            bars = int(snapshot["bars"])
+            if len(window) != min(bars, state.long):
+                raise ValueError("窗口长度与K线数不一致")
+            for i, c in enumerate(window):
+                state._buf[i] = c
+            state._head = len(window) % state.long
+            state._sum_long = math.fsum(window)
+            state._sum_short = math.fsum(window[-state.short:])
+            state.bars = bars
+            state.last_date = snapshot["last_date"]
+            state.last_close = window[-1] if window else None
+            state.ma_short = state._sum_short / state.short if bars >= state.short else None
+            state.ma_long = state._sum_long / state.long if bars >= state.long else None
+            state.signal = bool(snapshot["signal"])
+            position = snapshot["position"]
+            if position not in (0, 1) or isinstance(position, bool):
+                raise ValueError("快照中的 position 只能是 0 或 1")
+            state.position = int(position)
+            state.cash = float(snapshot["cash"])
+            state.holdings = float(snapshot["holdings"])
+            state.entry_price = snapshot["entry_price"]
+            state.entry_date = snapshot["entry_date"]
+            if state.position == 1:
+                entry_price = state.entry_price
+                if isinstance(entry_price, bool) or not isinstance(entry_price, (int, float)) or not 0 < entry_price < math.inf:
+                    raise ValueError("持仓快照的 entry_price 必须是大于0的数值")
+                if not isinstance(state.entry_date, str):
+                    raise ValueError("持仓快照的 entry_date 必须是 ISO 日期")
+                state.entry_price = float(entry_price)
+            state.equity = float(snapshot["equity"])
+            state.num_trades = int(snapshot["num_trades"])
+            state.last_trade = snapshot["last_trade"]
+            state.metrics = MetricsAccumulator.from_dict(snapshot["metrics"])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"快照格式错误: {e!r}")
+        return state
+
+    def advance(self, series: PriceSeries, start: int = 0) -> None:
+        """依次推进 series[start:] 中的K线"""
+        dates = series.iso_dates
+        for i, close in enumerate(series.close[start:].tolist(), start=start):
+            self.update(dates[i], close)
+
+    @classmethod
+    def from_history(cls, series: PriceSeries, **params: Any) -> "DoubleMAState":
+        """在历史数据上构建状态（O(n)，只需做一次，之后逐根推进），K线周期取自 series"""
+        state = cls(timeframe=series.timeframe, **params)
+        state.advance(series)
+        return state
+
+    def catch_up(self, series: PriceSeries) -> bool:
+        """
+        追上 series 中比当前状态更新的K线，返回是否成功；
+        series 中找不到当前最后一根K线或收盘价不一致（历史数据被修订）时返回 False，需要重建
+        """
+        if series.timeframe != self.timeframe:
+            return False
+        if self.last_date is None:
+            self.advance(series)
+            return True
+        i = _position_of(series, self.last_date)
+        if i >= len(series) or series.iso_dates[i] != self.last_date or float(series.close[i]) != self.last_close:
+            return False
+        self.advance(series, i + 1)
+        return True
+
+
+class _StateSlot:
+    """缓存中的一项：状态及保护它的锁（推进/重建状态时只锁这一项）"""
+
+    __slots__ = ("lock", "state")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state: Optional[DoubleMAState] = None
+
+
+class LiveStateCache:
+    """
+    服务端按参数缓存策略状态（LRU）；数据追加新K线时只推进新增部分，历史被修订时重建。
+    全局锁只保护 LRU 字典本身；在历史数据上重建状态（O(n)）在各参数自己的锁内进行，
+    不会阻塞其它参数的请求，同一参数的并发请求只重建一次
+    """
+
+    def __init__(self, max_states: int = 128):
+        self.max_states = max_states
+        self._lock = threading.Lock()
+        self._states: "OrderedDict[tuple, _StateSlot]" = OrderedDict()
+
+    def get(self, series: PriceSeries, with_snapshot: bool = False, **params: Any) -> Dict[str, Any]:
+        """返回推进到 series 最后一根K线后的 {"current": ...}，with_snapshot 为 True 时另含 "snapshot" 键"""
+        key = (series.timeframe,) + tuple(sorted(params.items()))
+        with self._lock:
+            slot = self._states.get(key)
+            if slot is None:
+                slot = self._states[key] = _StateSlot()
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+        with slot.lock:
+            if slot.state is None or not slot.state.catch_up(series):
+                slot.state = DoubleMAState.from_history(series, **params)
+            result = {"current": slot.state.current()}
+            if with_snapshot:
+                result["snapshot"] = slot.state.snapshot()
+            return result
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+回测统计指标的单遍在线累加器
+资金曲线和交易可以逐根（update / add_trade）或按块（update_many / add_trades）送入，
+所有统计量一遍累计，不保存整条曲线：
+- 收益率的均值/方差用 Welford 算法，按块送入时用并行合并公式（Chan 等）
+- 运行峰值与最大回撤、两次创新高之间的最长K线数（回撤持续时间）
+- 下行收益的平方和（Sortino）
+- 交易胜负与持仓天数由数值日期（1970-01-01 起的天数，日内K线为小数天）直接相减，不解析日期字符串
+逐根与按块送入的结果一致；回测引擎按块调用，实盘增量状态逐根调用并可随快照保存/恢复。
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+# 年化波动率使用的每年周期数（日线）；其它周期按每根K线的天数折算
+PERIODS_PER_YEAR = 252
+
+# to_dict()/from_dict() 保存的字段
+_STATE_FIELDS = (
+    "initial_capital", "bar_days", "start_day", "last_day", "count", "last", "peak", "max_drawdown",
+    "last_high", "max_gap", "n_returns", "mean", "m2", "n_down", "down_sq",
+    "n_trades", "win_count", "loss_count", "win_sum", "loss_sum", "hold_sum",
+)
+
+
+class MetricsAccumulator:
+    """
+    start_day 为统计区间起点的日期（天数），用于计算年化收益；不指定时取第一根K线的日期。
+    bar_days 为每根K线的天数（日线为 1，1h 为 1/24），决定波动率的年化系数和最短持仓天数
+    """
+
+    def __init__(self, initial_capital: float, start_day: Optional[float] = None, bar_days: float = 1.0):
+        self.initial_capital = float(initial_capital)
+        self.bar_days = bar_days
+        self.start_day = start_day
+        self.last_day: Optional[float] = None
+        # 资金曲线
+        self.count = 0
+        self.last = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        # 最近一次创新高的位置（第一根K线不算新高），以及两次新高之间最长的间隔
+        self.last_high = -1
+        self.max_gap = 0
+        # 收益率（只统计前一根资金为正的K线）
+        self.n_returns = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.n_down = 0
+        self.down_sq = 0.0
+        # 交易
+        self.n_trades = 0
+        self.win_count = 0
+        self.loss_count = 0
+        self.win_sum = 0.0
+        self.loss_sum = 0.0
+        self.hold_sum = 0
+
+    def _set_days(self, first_day: float, last_day: float) -> None:
+        if self.start_day is None:
+            self.start_day = first_day
+        self.last_day = last_day
+
+    def update(self, equity: float, day: float) -> None:
+        """送入一根K线收盘后的资金"""
+        equity = float(equity)
+        self._set_days(day, day)
+        i = self.count
+        if i == 0:
+            self.peak = equity
+        else:
+            prev = self.last
+            if prev > 0:
+                r = (equity - prev) / prev
+                self.n_returns += 1
+                delta = r - self.mean
+                self.mean += delta / self.n_returns
+                self.m2 += delta * (r - self.mean)
+                if r < 0:
+                    self.n_down += 1
+                    self.down_sq += r * r
+            if equity > self.peak:
+                self.max_gap = max(self.max_gap, i - self.last_high - 1)
+                self.last_high = i
+                self.peak = equity
+        self.max_drawdown = min(self.max_drawdown, equity / self.peak - 1.0)
+        self.last = equity
+        self.count = i + 1
+
+    def update_many(self, equity: np.ndarray, first_day: float, last_day: float) -> None:
+        """
+        送入一段连续的资金曲线（first_day/last_day 为这一段首尾K线的日期），
+        块内用向量运算，块间与已有统计量合并
+        """
+        n = equity.shape[0]
+        if n == 0:
+            return
+        self._set_days(first_day, last_day)
+        base = self.count
+        if base == 0:
+            self.peak = float(equity[0])
+            prev_values = equity[:-1]
+            values = equity[1:]
+        else:
+            prev_values = np.empty(n)
+            prev_values[0] = self.last
+            prev_values[1:] = equity[:-1]
+            values = equity
+
+        # 收益率：块内统计后与已有统计合并
+        valid = prev_values > 0
+        returns = (values[valid] - prev_values[valid]) / prev_values[valid]
+        nb = returns.shape[0]
+        if nb > 0:
+            mean_b = float(returns.mean())
+            m2_b = float(np.sum((returns - mean_b) ** 2))
+            na = self.n_returns
+            total = na + nb
+            delta = mean_b - self.mean
+            self.mean += delta * nb / total
+            self.m2 += m2_b + delta * delta * na * nb / total
+            self.n_returns = total
+            down = returns[returns < 0]
+            self.n_down += down.shape[0]
+            self.down_sq += float(np.sum(down * down))
+
+        # 运行峰值与回撤
+        running_peak = np.maximum(np.maximum.accumulate(equity), self.peak)
+        self.max_drawdown = min(self.max_drawdown, float(np.min(equity / running_peak - 1.0)))
+        prev_peak = np.empty(n)
+        prev_peak[0] = self.peak
+        prev_peak[1:] = running_peak[:-1]
+        new_high = np.flatnonzero(equity > prev_peak)
+        if new_high.shape[0] > 0:
+            bounds = np.concatenate(([self.last_high], base + new_high))
+            self.max_gap = max(self.max_gap, int(np.max(np.diff(bounds))) - 1)
+            self.last_high = base + int(new_high[-1])
+        self.peak = float(running_peak[-1])
+        self.last = float(equity[-1])
+        self.count = base + n
+
+    def add_trade(self, pnl_pct: float, entry_day: float, exit_day: float) -> None:
+        """送入一笔已平仓交易（收益率与开平仓日期），持仓天数至少按一根K线计（日线即同日开平仓按 1 天计）"""
+        self.n_trades += 1
+        if pnl_pct > 0:
+            self.win_count += 1
+            self.win_sum += pnl_pct
+        elif pnl_pct < 0:
+            self.loss_count += 1
+            self.loss_sum += pnl_pct
+        self.hold_sum += max(exit_day - entry_day, self.bar_days)
+
+    def add_trades(self, pnl_pct: np.ndarray, entry_days: np.ndarray, exit_days: np.ndarray) -> None:
+        """按数组送入一批已平仓交易"""
+        n = pnl_pct.shape[0]
+        if n == 0:
+            return
+        wins = pnl_pct[pnl_pct > 0]
+        losses = pnl_pct[pnl_pct < 0]
+        self.n_trades += n
+        self.win_count += wins.shape[0]
+        self.win_sum += float(wins.sum())
+        self.loss_count += losses.shape[0]
+        self.loss_sum += float(losses.sum())
+        self.hold_sum += np.maximum(exit_days - entry_days, self.bar_days).sum().item()
+
+    def max_drawdown_duration(self) -> int:
+        """到目前为止两次创新高之间最长的K线数（含末尾尚未创新高的一段）"""
+        if self.count == 0:
+            return 0
+        return max(self.max_gap, self.count - self.last_high - 1)
+
+    def summary(self) -> Dict[str, Any]:
+        """与 strategy_engine.compute_summary 相同结构的统计摘要"""
+        total_ret = 0.0
+        max_drawdown = 0.0
+        cagr = 0.0
+        sharpe = 0.0
+        sortino = 0.0
+        calmar = 0.0
+        annualized_vol = 0.0
+        initial_capital = self.initial_capital
+        periods_per_year = PERIODS_PER_YEAR / self.bar_days
+
+        if self.count > 0:
+            final_equity = self.last
+            total_ret = final_equity / initial_capital - 1.0
+            max_drawdown = min(0.0, self.max_drawdown)
+
+            days = self.last_day - self.start_day
+            if days > 0:
+                years = days / 365.25
+                if final_equity > 0 and initial_capital > 0:
+                    cagr = (final_equity / initial_capital) ** (1 / years) - 1.0
+
+            if self.n_returns > 1:
+                var = self.m2 / self.n_returns
+                std = var ** 0.5 if var > 0 else 0.0
+
+                # 年化波动率
+                annualized_vol = std * (periods_per_year ** 0.5) if std > 0 else 0.0
+
+                # 夏普比率（无风险利率视为0）
+                if annualized_vol > 0:
+                    sharpe = cagr / annualized_vol
+
+                # Sortino比率（只考虑下行波动）
+                if self.n_down > 0:
+                    downside_var = self.down_sq / self.n_down
+                    downside_std = downside_var ** 0.5 if downside_var > 0 else 0.0
+                    annualized_downside_vol = downside_std * (periods_per_year ** 0.5) if downside_std > 0 else 0.0
+                    if annualized_downside_vol > 0:
+                        sortino = cagr / annualized_downside_vol
+                    elif cagr > 0:
+                        sortino = float('inf')
+
+                # Calmar比率（年化收益/最大回撤）
+                if max_drawdown < 0:
+                    calmar = cagr / abs(max_drawdown)
+
+        total_trades = self.n_trades
+        win_count = self.win_count
+        loss_count = self.loss_count
+        win_rate = win_count / total_trades if total_trades > 0 else 0.0
+        avg_win = self.win_sum / win_count if win_count > 0 else 0.0
+        avg_loss = self.loss_sum / loss_count if loss_count > 0 else 0.0
+        profit_factor = self.win_sum / abs(self.loss_sum) if self.loss_sum != 0 else None
+        avg_hold = self.hold_sum / total_trades if total_trades > 0 else None
+
+        return {
+            "total_return_pct": float(total_ret * 100),
+            "cagr_pct": float(cagr * 100),
+            "sharpe_ratio": float(sharpe) if sharpe != float('inf') else None,
+            "sortino_ratio": float(sortino) if sortino != float('inf') else None,
+            "calmar_ratio": float(calmar) if calmar != float('inf') else None,
+            "annualized_volatility_pct": float(annualized_vol * 100),
+            "max_drawdown_pct": float(max_drawdown * 100),
+            "max_drawdown_duration": self.max_drawdown_duration(),
+            "num_trades": total_trades,
+            "win_rate_pct": float(win_rate * 100),
+            "profit_factor": float(profit_factor) if profit_factor is not None else None,
+            "avg_win_pct": float(avg_win * 100) if win_count > 0 else None,
+            "avg_loss_pct": float(avg_loss * 100) if loss_count > 0 else None,
+            "avg_hold_days": float(avg_hold) if avg_hold is not None else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出可 JSON 序列化的累加器状态"""
+        return {name: getattr(self, name) for name in _STATE_FIELDS}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "MetricsAccumulator":
+        acc = cls(state["initial_capital"])
+        for name in _STATE_FIELDS:
+            setattr(acc, name, state[name])
+        return acc
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+在线数据源的本地模拟服务器（仅用于测试）
+用 btc_data_local 生成的数据模拟 Yahoo CSV、Binance klines、CoinGecko market_chart 三个接口，
+并可为每个数据源注入延迟或故障，用来验证对冲下载、截止时间和分页并发。
+数据截止到今天（可用 MOCK_END_DATE=2026-01-01 指定），与真实数据源一样每天都有新K线。
+Binance 的日内周期（interval=1h/15m/1m）在相邻两天收盘价之间插值并叠加确定性的波动生成。
+
+启动：
+    MOCK_DELAY="yahoo=30" MOCK_FAIL="coingecko" python mock_sources.py 8900
+让后端使用模拟服务器：
+    BTC_YAHOO_URL=http://127.0.0.1:8900/yahoo
+    BTC_BINANCE_URL=http://127.0.0.1:8900/binance
+    BTC_COINGECKO_URL=http://127.0.0.1:8900/coingecko
+"""
+import asyncio
+import datetime
+import math
+import os
+import sys
+from typing import Dict, Set
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from btc_data_local import generate_local_btc_data
+
+_DAY_MS = 24 * 3600 * 1000
+_INTERVAL_MS = {"1h": 3600 * 1000, "15m": 900 * 1000, "1m": 60 * 1000}
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _parse_delays(spec: str) -> Dict[str, float]:
+    """"yahoo=30,binance=0.5" -> {"yahoo": 30.0, "binance": 0.5}"""
+    delays = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip():
+            delays[name.strip()] = float(value or 0)
+    return delays
+
+
+DELAYS = _parse_delays(os.environ.get("MOCK_DELAY", ""))
+FAILING: Set[str] = {s.strip() for s in os.environ.get("MOCK_FAIL", "").split(",") if s.strip()}
+END_DATE = (
+    datetime.date.fromisoformat(os.environ["MOCK_END_DATE"]) if os.environ.get("MOCK_END_DATE") else datetime.date.today()
+)
+ROWS = generate_local_btc_data(END_DATE)
+
+# 请求计数，便于测试确认分页数和连接复用情况
+request_counts: Dict[str, int] = {"yahoo": 0, "binance": 0, "coingecko": 0}
+
+app = FastAPI(title="Mock BTC data sources")
+
+
+async def _simulate(source: str) -> None:
+    request_counts[source] += 1
+    if DELAYS.get(source):
+        await asyncio.sleep(DELAYS[source])
+    if source in FAILING:
+        raise HTTPException(status_code=503, detail=f"{source} unavailable (mock)")
+
+
+def _ms(day: datetime.date) -> int:
+    return int((datetime.datetime.combine(day, datetime.time.min) - _EPOCH).total_seconds() * 1000)
+
+
+@app.get("/yahoo", response_class=PlainTextResponse)
+async def yahoo(period1: int = Query(0), period2: int = Query(2**31)):
+    await _simulate("yahoo")
+    start = datetime.datetime.utcfromtimestamp(period1).date()
+    end = datetime.datetime.utcfromtimestamp(period2).date()
+    lines = ["Date,Open,High,Low,Close,Adj Close,Volume"]
+    for r in ROWS:
+        if start <= r["date"] < end:
+            lines.append(
+                f"{r['date'].isoformat()},{r['open']},{r['high']},{r['low']},{r['close']},{r['close']},{r['volume']}"
+            )
+    return "\n".join(lines)
+
+
+def _intraday_klines(interval: str, start: int, end: int, limit: int):
+    """在日线收盘价之间线性插值生成日内K线（同一时间戳的结果总是相同）"""
+    bar_ms = _INTERVAL_MS[interval]
+    by_day = {_ms(r["date"]): r["close"] for r in ROWS}
+    out = []
+    ts = -(-start // bar_ms) * bar_ms
+    while ts <= end and len(out) < limit:
+        day = ts - ts % _DAY_MS
+        if day not in by_day:
+            ts += bar_ms
+            continue
+        prev = by_day.get(day - _DAY_MS, by_day[day])
+        frac = (ts - day) / _DAY_MS
+        wiggle = 1 + 0.002 * math.sin(ts / bar_ms)
+        open_ = (prev + (by_day[day] - prev) * frac) * wiggle
+        close = (prev + (by_day[day] - prev) * (frac + bar_ms / _DAY_MS)) * wiggle
+        high, low = max(open_, close) * 1.001, min(open_, close) * 0.999
+        out.append([ts, str(open_), str(high), str(low), str(close), "1.5", ts + bar_ms - 1])
+        ts += bar_ms
+    return out
+
+
+@app.get("/binance")
+async def binance(
+    startTime: int = Query(0), endTime: int = Query(2**62), limit: int = Query(500), interval: str = Query("1d")
+):
+    await _simulate("binance")
+    if interval in _INTERVAL_MS:
+        return _intraday_klines(interval, startTime, endTime, limit)
+    out = []
+    for r in ROWS:
+        ts = _ms(r["date"])
+        if startTime <= ts <= endTime:
+            out.append([ts, str(r["open"]), str(r["high"]), str(r["low"]), str(r["close"]), str(r["volume"]), ts + _DAY_MS - 1])
+            if len(out) >= limit:
+                break
+    return out
+
+
+@app.get("/coingecko")
+async def coingecko(days: str = Query("max")):
+    await _simulate("coingecko")
+    rows = ROWS
+    if days != "max":
+        rows = rows[-int(days):]
+    return {"prices": [[_ms(r["date"]), r["close"]] for r in rows]}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8900
+    uvicorn.run(app, host="127.0.0.1", port=port)
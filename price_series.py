@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+列式K线序列
+数据加载时构建一次，之后所有接口和策略共享同一份只读数组：
+- date: int64，已按升序排列且无重复；日线及以上周期（1d、3d、1w 等）为 1970-01-01 起的天数，
+  日内周期（1h/15m/1m、4h 等）为K线开盘时间的 Unix 秒数（UTC）
+- open/high/low/close/volume: float64 连续数组
+"""
+import datetime
+import hashlib
+import re
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+
+# 可下载、存储的基础K线周期及每根K线的秒数
+TIMEFRAMES = {"1d": 86400, "1h": 3600, "15m": 900, "1m": 60}
+
+# 其它周期写作 数量+单位（如 4h、3d、1w），由基础周期重采样得到（见 resample.py）
+TIMEFRAME_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+DAY_SECONDS = 86400
+
+_TIMEFRAME_RE = re.compile(r"^([1-9][0-9]{0,3})([mhdw])$")
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def timeframe_seconds(timeframe: str) -> int:
+    """K线周期的秒数；一天以上的周期必须是整数天"""
+    if timeframe in TIMEFRAMES:
+        return TIMEFRAMES[timeframe]
+    m = _TIMEFRAME_RE.match(timeframe)
+    if not m:
+        raise ValueError(
+            f"不支持的K线周期: {timeframe}，可选: {', '.join(TIMEFRAMES)}，或 数量+单位（m/h/d/w），如 4h、3d、1w"
+        )
+    seconds = int(m.group(1)) * TIMEFRAME_UNITS[m.group(2)]
+    if seconds > DAY_SECONDS and seconds % DAY_SECONDS:
+        raise ValueError(f"不支持的K线周期: {timeframe}，一天以上的周期必须是整数天")
+    return seconds
+
+
+def check_timeframe(timeframe: str) -> None:
+    timeframe_seconds(timeframe)
+
+
+def _readonly(arr: np.ndarray, dtype) -> np.ndarray:
+    """返回连续内存上的只读视图（dtype 已匹配时不复制）"""
+    view = np.ascontiguousarray(arr, dtype=dtype).view()
+    view.flags.writeable = False
+    return view
+
+
+def columns_from_rows(rows: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """行式日线K线（date 为 datetime.date）-> 列式数组，不排序、不去重"""
+    n = len(rows)
+    columns = {"date": np.fromiter((r["date"].toordinal() - _EPOCH_ORDINAL for r in rows), dtype=np.int64, count=n)}
+    for name in COLUMNS:
+        columns[name] = np.fromiter((r[name] for r in rows), dtype=np.float64, count=n)
+    return columns
+
+
+class PriceSeries:
+    """
+    只读的列式K线序列。切片返回共享底层数组的视图，不复制数据。
+    """
+
+    __slots__ = (
+        "date", "open", "high", "low", "close", "volume", "source", "timeframe", "_bar_seconds", "_iso_dates", "_version"
+    )
+
+    def __init__(
+        self,
+        date: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        volume: np.ndarray,
+        source: Optional[str] = None,
+        timeframe: str = "1d",
+        version: Optional[str] = None,
+    ):
+        """version 为已知的数据版本（如从共享数据集文件读取时），给出时不再对内容做哈希"""
+        self._bar_seconds = timeframe_seconds(timeframe)
+        self.date = _readonly(date, np.int64)
+        self.open = _readonly(open, np.float64)
+        self.high = _readonly(high, np.float64)
+        self.low = _readonly(low, np.float64)
+        self.close = _readonly(close, np.float64)
+        self.volume = _readonly(volume, np.float64)
+        self.source = source
+        self.timeframe = timeframe
+        self._iso_dates: Optional[List[str]] = None
+        self._version = version
+        n = self.date.shape[0]
+        for name in COLUMNS:
+            if getattr(self, name).shape[0] != n:
+                raise ValueError(f"列 {name} 的长度与日期列不一致")
+
+    @classmethod
+    def from_columns(
+        cls, columns: Dict[str, np.ndarray], source: Optional[str] = None, timeframe: str = "1d"
+    ) -> "PriceSeries":
+        """
+        由列式数组构建；日期未排序时按日期排序，重复日期保留最后一条
+        """
+        date = np.asarray(columns["date"], dtype=np.int64)
+        if date.shape[0] > 1 and not np.all(date[1:] > date[:-1]):
+            order = np.argsort(date, kind="stable")
+            sorted_dates = date[order]
+            keep = np.ones(order.shape[0], dtype=bool)
+            keep[:-1] = sorted_dates[1:] != sorted_dates[:-1]
+            order = order[keep]
+            columns = {name: np.asarray(columns[name])[order] for name in ("date",) + COLUMNS}
+        return cls(columns["date"], *(columns[name] for name in COLUMNS), source=source, timeframe=timeframe)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]], source: Optional[str] = None) -> "PriceSeries":
+        """
+        由下载函数返回的行式K线（date 为 datetime.date）构建
+        """
+        return cls.from_columns(columns_from_rows(rows), source=source)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """返回各列（不复制）"""
+        out = {"date": self.date}
+        for name in COLUMNS:
+            out[name] = getattr(self, name)
+        return out
+
+    def __len__(self) -> int:
+        return self.date.shape[0]
+
+    def __getitem__(self, key: slice) -> "PriceSeries":
+        if not isinstance(key, slice):
+            raise TypeError("PriceSeries 只支持切片访问")
+        sub = PriceSeries(*(arr[key] for arr in self.columns().values()), source=self.source, timeframe=self.timeframe)
+        if self._iso_dates is not None:
+            sub._iso_dates = self._iso_dates[key]
+        return sub
+
+    @property
+    def intraday(self) -> bool:
+        """不足一天的周期：date 列为 Unix 秒"""
+        return self._bar_seconds < DAY_SECONDS
+
+    @property
+    def bar_days(self) -> float:
+        """每根K线的天数（日线为 1）"""
+        return self._bar_seconds / DAY_SECONDS
+
+    @property
+    def days(self) -> np.ndarray:
+        """以天为单位的时间列（日线即 date 本身，日内周期为小数天），用于年化和持仓天数"""
+        return self.date / DAY_SECONDS if self.intraday else self.date
+
+    def _day_key(self, day: datetime.date) -> int:
+        """某一天 00:00 在 date 列中的取值"""
+        days = day.toordinal() - _EPOCH_ORDINAL
+        return days * DAY_SECONDS if self.intraday else days
+
+    def date_at(self, i: int) -> datetime.date:
+        value = int(self.date[i])
+        if self.intraday:
+            value //= DAY_SECONDS
+        return datetime.date.fromordinal(_EPOCH_ORDINAL + value)
+
+    @property
+    def first_date(self) -> datetime.date:
+        return self.date_at(0)
+
+    @property
+    def last_date(self) -> datetime.date:
+        return self.date_at(-1)
+
+    @property
+    def iso_dates(self) -> List[str]:
+        """ISO 格式日期字符串列表（日内周期为 YYYY-MM-DDTHH:MM），首次访问时批量生成并缓存"""
+        if self._iso_dates is None:
+            if self.intraday:
+                self._iso_dates = np.datetime_as_string(self.date.astype("datetime64[s]"), unit="m").tolist()
+            else:
+                self._iso_dates = np.datetime_as_string(self.date.astype("datetime64[D]")).tolist()
+        return self._iso_dates
+
+    @property
+    def version(self) -> str:
+        """数据内容的哈希，数据变化（如增量更新）后随之变化"""
+        if self._version is None:
+            h = hashlib.blake2b(digest_size=8)
+            if self.timeframe != "1d":
+                h.update(self.timeframe.encode())
+            for arr in self.columns().values():
+                h.update(arr.tobytes())
+            self._version = h.hexdigest()
+        return self._version
+
+    def index_of(self, day: datetime.date, side: str = "left") -> int:
+        """
+        日期对应的位置（二分查找）：side="left" 为该日第一根K线，side="right" 为该日之后的第一根K线
+        """
+        if side == "right":
+            return int(np.searchsorted(self.date, self._day_key(day + datetime.timedelta(days=1)), side="left"))
+        return int(np.searchsorted(self.date, self._day_key(day), side=side))
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """转换为行式K线（兼容旧接口，会产生较多 Python 对象）"""
+        if self.intraday:
+            dates = [datetime.datetime.utcfromtimestamp(t) for t in self.date.tolist()]
+        else:
+            dates = [datetime.date.fromordinal(_EPOCH_ORDINAL + d) for d in self.date.tolist()]
+        values = [getattr(self, name).tolist() for name in COLUMNS]
+        return [
+            {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+            for d, o, h, l, c, v in zip(dates, *values)
+        ]
+
+
+def buffer_size(n: int) -> int:
+    """n 根K线在共享内存中占用的字节数"""
+    return n * 8 * (1 + len(COLUMNS))
+
+
+def buffer_columns(buf, n: int) -> Dict[str, np.ndarray]:
+    """共享内存布局：date(int64) 后依次为 open/high/low/close/volume(float64)，每列 n 个元素"""
+    columns = {"date": np.ndarray((n,), dtype=np.int64, buffer=buf, offset=0)}
+    for k, name in enumerate(COLUMNS, start=1):
+        columns[name] = np.ndarray((n,), dtype=np.float64, buffer=buf, offset=k * n * 8)
+    return columns
+
+
+def as_price_series(data) -> PriceSeries:
+    """接受 PriceSeries 或行式K线列表，统一返回 PriceSeries（已是序列时不复制）"""
+    if isinstance(data, PriceSeries):
+        return data
+    return PriceSeries.from_rows(data)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+由基础K线重采样得到更大的周期（如 4h、3d、1w），不额外下载
+- 一次向量化聚合：按时间分桶后，open 取桶内第一根、high 取最大、low 取最小、close 取最后一根、volume 求和
+  （np.maximum.reduceat 等，与桶数、周期无关的 O(n)）
+- 分桶以 UTC 1970-01-01 00:00 为起点；周线（7 天的整数倍）从周一开始
+- 每根新K线的 date 为桶的开始时间；最后一个桶可能尚未走完（与最新一根日线可能尚未收盘相同）
+- 结果按 (基础数据版本, 周期) 缓存，参数扫描多个周期时每个周期只聚合一次
+"""
+import os
+
+import numpy as np
+
+from price_series import PriceSeries, TIMEFRAMES, DAY_SECONDS, TIMEFRAME_UNITS, timeframe_seconds, buffer_size
+from result_cache import ResultCache
+
+# 重采样结果缓存的上限
+RESAMPLE_CACHE_MAX_ENTRIES = int(os.environ.get("RESAMPLE_CACHE_MAX_ENTRIES", "64"))
+RESAMPLE_CACHE_MAX_BYTES = int(float(os.environ.get("RESAMPLE_CACHE_MAX_MB", "128")) * 1024 * 1024)
+
+# 1970-01-01 是周四，周线分桶前平移 3 天，使每个桶从周一开始
+_WEEK_OFFSET_SECONDS = 3 * DAY_SECONDS
+
+
+def base_timeframe(timeframe: str) -> str:
+    """
+    重采样所用的基础周期：能整除目标周期的基础周期中最大的一个
+    （如 4h -> 1h，3d/1w -> 1d，30m -> 15m），聚合的K线最少、可用的历史最长；基础周期返回自身
+    """
+    if timeframe in TIMEFRAMES:
+        return timeframe
+    seconds = timeframe_seconds(timeframe)
+    candidates = [tf for tf, base in TIMEFRAMES.items() if seconds % base == 0]
+    return max(candidates, key=TIMEFRAMES.get)
+
+
+def resample(series: PriceSeries, timeframe: str) -> PriceSeries:
+    """把 series 聚合为 timeframe 周期的K线；目标周期须是原周期的整数倍"""
+    seconds = timeframe_seconds(timeframe)
+    base_seconds = timeframe_seconds(series.timeframe)
+    if seconds % base_seconds:
+        raise ValueError(f"{timeframe} 不是 {series.timeframe} 的整数倍，无法重采样")
+    if seconds == base_seconds:
+        return series
+    n = len(series)
+    if n == 0:
+        return PriceSeries(*series.columns().values(), source=series.source, timeframe=timeframe)
+
+    # 统一换算成 Unix 秒分桶
+    t = series.date if series.intraday else series.date * DAY_SECONDS
+    offset = _WEEK_OFFSET_SECONDS if seconds % TIMEFRAME_UNITS["w"] == 0 else 0
+    bucket = (t + offset) // seconds
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    ends = np.concatenate((starts[1:], [n]))
+
+    start_time = bucket[starts] * seconds - offset
+    date = start_time if seconds < DAY_SECONDS else start_time // DAY_SECONDS
+    return PriceSeries(
+        date,
+        series.open[starts],
+        np.maximum.reduceat(series.high, starts),
+        np.minimum.reduceat(series.low, starts),
+        series.close[ends - 1],
+        np.add.reduceat(series.volume, starts),
+        source=series.source,
+        timeframe=timeframe,
+    )
+
+
+# 重采样结果缓存：(基础数据版本, 周期) -> PriceSeries
+resample_cache = ResultCache(
+    max_entries=RESAMPLE_CACHE_MAX_ENTRIES,
+    max_bytes=RESAMPLE_CACHE_MAX_BYTES,
+    sizeof=lambda series: buffer_size(len(series)),
+)
+
+
+def resampled(series: PriceSeries, timeframe: str) -> PriceSeries:
+    """带缓存的 resample()：同一数据版本、同一周期只聚合一次"""
+    if timeframe == series.timeframe:
+        return series
+    key = (series.version, timeframe)
+    result = resample_cache.get(key)
+    if result is None:
+        result = resample(series, timeframe)
+        resample_cache.put(key, result)
+    return result
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+回测接口的输出格式（format= 参数）
+- json：默认，行式 JSON（equity_curve 每天一个对象），与原接口一致
+- columns：列式 JSON，equity_curve / trades 为并列数组，体积更小、解析更快
+- msgpack：列式布局的 MessagePack 二进制编码，适合程序化调用
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+from strategy_engine import RESULT_FIELDS
+
+# msgpack 已列入 requirements.txt；个别环境装不上时 format=msgpack 返回 400
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ("json", "columns", "msgpack")
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columns": "application/json",
+    "msgpack": "application/msgpack",
+}
+
+
+def check_format(fmt: str) -> None:
+    """校验输出格式是否受支持"""
+    if fmt not in FORMATS:
+        raise ValueError(f"不支持的输出格式: {fmt}，可选: {', '.join(FORMATS)}")
+    if fmt == "msgpack" and msgpack is None:
+        raise ValueError("服务器未安装 msgpack，无法使用 format=msgpack（pip install msgpack）")
+
+
+def parse_fields(spec: str) -> Tuple[str, ...]:
+    """
+    解析 fields= 参数，如 "summary"、"summary,trades"、"summary|curve"
+    """
+    fields = tuple(dict.fromkeys(f.strip() for f in spec.replace("|", ",").split(",") if f.strip()))
+    unknown = [f for f in fields if f not in RESULT_FIELDS]
+    if not fields or unknown:
+        raise ValueError(f"fields 参数错误: {spec!r}，可选: {', '.join(RESULT_FIELDS)}")
+    return fields
+
+
+def result_layout(fmt: str) -> str:
+    """除默认 json 外都使用列式布局"""
+    return "rows" if fmt == "json" else "columns"
+
+
+def encode(content: Any, fmt: str = "json") -> bytes:
+    """
+    按输出格式序列化；JSON 与 FastAPI 默认 JSONResponse 的序列化方式相同
+    """
+    if fmt == "msgpack":
+        return msgpack.packb(content, use_bin_type=True)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+# 流式输出（扫描进度等）的两种格式
+STREAM_MODES = ("ndjson", "sse")
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+
+def encode_event(event: str, data: Dict[str, Any], mode: str = "ndjson") -> bytes:
+    """
+    编码一条流式事件：
+    - ndjson：每行一个 JSON 对象，事件名放在 "event" 字段
+    - sse：Server-Sent Events 格式（event: ... / data: ...）
+    """
+    if mode == "sse":
+        return b"event: " + event.encode("utf-8") + b"\ndata: " + encode(data) + b"\n\n"
+    return encode({"event": event, **data}) + b"\n"
+
+
+def rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    行式记录 -> 并列数组；嵌套一层的字典（如 params、summary）展开为同级列
+    """
+    columns: Dict[str, List[Any]] = {}
+    for i, row in enumerate(rows):
+        flat: Dict[str, Any] = {}
+        for key, value in row.items():
+            if isinstance(value, dict):
+                flat.update(value)
+            else:
+                flat[key] = value
+        for key, value in flat.items():
+            columns.setdefault(key, [None] * i).append(value)
+        for key, col in columns.items():
+            if len(col) < i + 1:
+                col.append(None)
+    return columns
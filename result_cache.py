@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+回测结果缓存
+回测是 (参数, 数据集) 的纯函数，相同请求直接返回已序列化的 JSON 字节：
+- 键为 数据版本 + 规范化后的参数，数据增量更新后版本变化，旧结果自然失效
+- LRU 淘汰，同时限制条目数和总字节数
+- 记录命中/未命中/淘汰次数
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get("BACKTEST_CACHE_MAX_ENTRIES", "256"))
+DEFAULT_MAX_BYTES = int(float(os.environ.get("BACKTEST_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+
+def make_cache_key(version: str, **params: Any) -> Tuple[Hashable, ...]:
+    """
+    生成缓存键：数值参数统一转成 float，参数按名称排序，
+    使 short=10 与 short=10.0、不同的参数顺序得到相同的键
+    """
+    normalized = []
+    for name in sorted(params):
+        value = params[name]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        normalized.append((name, value))
+    return (version, tuple(normalized))
+
+
+class ResultCache:
+    """
+    线程安全的 LRU 字节缓存；sizeof 用于缓存其他对象（如 NumPy 数组）时计算占用字节数
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        sizeof: Callable[[Any], int] = len,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self.sizeof(value)
+        # 单个结果超过总预算时不缓存
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self.sizeof(old)
+            self._entries[key] = value
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self.sizeof(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
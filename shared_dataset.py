@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+多个 worker 共享的只读数据集文件
+`uvicorn --workers N` 时每个 worker 原本各自持有一份K线数组；这里把标准化后的 OHLCV 列
+（以及可选的预计算指标列）写成未压缩的 .npy 文件，各 worker 用 np.load(mmap_mode="r") 映射：
+N 个 worker 通过页缓存共用同一份物理内存，新启动的 worker 既不用下载也不用解析数据。
+- 目录结构：<BTC_CACHE_DIR>/datasets/<周期>-<数据版本>/ 下每列一个 .npy，外加 meta.json；
+  目录按数据版本命名，写好后不再修改，重复发布同一版本是幂等的
+- <BTC_CACHE_DIR>/datasets/<周期>.json 指向当前版本（含发布时间），发布时原子替换；
+  每个周期保留当前和上一个版本的目录（仍在映射旧版本的 worker 不受影响），更早的删除；
+  上一个版本发布不足 BTC_DATASET_RETAIN_SECONDS 秒时更早的目录也暂不删除（排队中的任务可能还要映射）
+- 回测执行器和参数扫描的工作进程同样直接映射数据集目录（见 dataset_pointer），不再各自复制一份
+"""
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from data_cache import CACHE_DIR
+from price_series import PriceSeries, COLUMNS, check_timeframe
+from indicators import IndicatorCache, register_precomputed, shared_memo
+
+DATASET_DIR = os.path.join(CACHE_DIR, "datasets")
+
+# 版本被替换后，更早版本的目录至少保留的秒数（应大于回测请求的截止时间）
+RETAIN_SECONDS = float(os.environ.get("BTC_DATASET_RETAIN_SECONDS", "300"))
+
+# 可以预计算的指标（IndicatorCache 中以单个窗口为参数、返回单列的方法）
+PRECOMPUTABLE = ("sma", "ema", "wma", "rolling_std", "atr", "rsi")
+
+
+def parse_indicator_specs(spec: str) -> List[Tuple[str, int]]:
+    """解析 "sma:10,sma:50,rsi:14" 形式的指标列表"""
+    specs = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, window = item.partition(":")
+        if name not in PRECOMPUTABLE or not window.isdigit() or int(window) < 1:
+            raise ValueError(f"预计算指标格式错误: {item!r}，应为 指标:窗口，指标可选: {', '.join(PRECOMPUTABLE)}")
+        specs.append((name, int(window)))
+    return specs
+
+
+# 发布数据集时预计算的指标列，BTC_DATASET_INDICATORS="" 关闭
+DATASET_INDICATORS = parse_indicator_specs(
+    os.environ.get("BTC_DATASET_INDICATORS", "sma:10,sma:20,sma:50,sma:100,sma:200")
+)
+
+
+def _pointer_path(timeframe: str) -> str:
+    return os.path.join(DATASET_DIR, f"{timeframe}.json")
+
+
+def _write_json(path: str, data: Dict[str, Any]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _indicator_file(name: str, window: int) -> str:
+    return f"ind_{name}_{window}.npy"
+
+
+def publish(
+    series: PriceSeries,
+    indicators: List[Tuple[str, int]] = DATASET_INDICATORS,
+    quality: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    把序列（及预计算指标）写成数据集目录并设为该周期的当前版本，返回目录路径；
+    quality（质量报告）写入指针文件，其它 worker 与数据一起取得，不必重新校验。
+    先写到临时目录再整体改名，其它 worker 不会读到写了一半的目录
+    """
+    if len(series) == 0:
+        raise ValueError("没有可发布的数据")
+    timeframe = series.timeframe
+    version = series.version
+    name = f"{timeframe}-{version}"
+    path = os.path.join(DATASET_DIR, name)
+    if not os.path.isdir(path):
+        os.makedirs(DATASET_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for column, arr in series.columns().items():
+            np.save(os.path.join(tmp_path, f"{column}.npy"), arr)
+        cache = IndicatorCache(series, memo=shared_memo)
+        # 窗口超过数据长度的指标全为 NaN，不必保存
+        stored = [(ind_name, window) for ind_name, window in indicators if window <= len(series)]
+        for ind_name, window in stored:
+            np.save(os.path.join(tmp_path, _indicator_file(ind_name, window)), getattr(cache, ind_name)(window))
+        _write_json(os.path.join(tmp_path, "meta.json"), {"indicators": [list(item) for item in stored]})
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # 另一个 worker 刚好发布了同一版本
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    current = read_pointer(timeframe)
+    if current is None:
+        previous = None
+    elif current["dir"] == name:
+        previous = current.get("previous")
+    else:
+        previous = current["dir"]
+    _write_json(
+        _pointer_path(timeframe),
+        {
+            "timeframe": timeframe,
+            "version": version,
+            "dir": name,
+            "source": series.source,
+            "rows": len(series),
+            "published_at": time.time(),
+            "previous": previous,
+            "quality": quality,
+        },
+    )
+    if previous is None or _age(previous) > RETAIN_SECONDS:
+        _remove_old(timeframe, keep={name, previous})
+    return path
+
+
+def _age(name: str) -> float:
+    """数据集目录写入至今的秒数，目录不存在时为无穷大"""
+    try:
+        return time.time() - os.path.getmtime(os.path.join(DATASET_DIR, name))
+    except OSError:
+        return float("inf")
+
+
+def _remove_old(timeframe: str, keep: Set[Optional[str]]) -> None:
+    """删除该周期不再被引用的数据集目录（已映射这些文件的进程在 POSIX 上不受影响）"""
+    prefix = f"{timeframe}-"
+    for name in os.listdir(DATASET_DIR):
+        if name.startswith(prefix) and name not in keep and not name.endswith(".tmp"):
+            shutil.rmtree(os.path.join(DATASET_DIR, name), ignore_errors=True)
+
+
+def read_pointer(timeframe: str) -> Optional[Dict[str, Any]]:
+    """该周期当前版本的元信息（version、dir、source、published_at、quality 等），没有时返回 None"""
+    check_timeframe(timeframe)
+    try:
+        with open(_pointer_path(timeframe), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def dataset_pointer(series: PriceSeries) -> Optional[Dict[str, Any]]:
+    """
+    series 的版本已发布为数据集目录时，返回可传给 open_dataset() 的指针（供进程池的工作进程直接映射）；
+    未发布（如重采样出的周期）时返回 None
+    """
+    name = f"{series.timeframe}-{series.version}"
+    if not os.path.isfile(os.path.join(DATASET_DIR, name, "meta.json")):
+        return None
+    return {"dir": name, "version": series.version, "source": series.source, "timeframe": series.timeframe}
+
+
+def open_dataset(pointer: Dict[str, Any]) -> PriceSeries:
+    """
+    以内存映射方式打开 read_pointer() 指向的数据集，并登记其中的预计算指标；
+    返回的序列直接引用映射的页面，不复制数据
+    """
+    path = os.path.join(DATASET_DIR, pointer["dir"])
+    columns = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in ("date",) + COLUMNS]
+    series = PriceSeries(
+        *columns, source=pointer["source"], timeframe=pointer["timeframe"], version=pointer["version"]
+    )
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    precomputed: Dict[Tuple[Hashable, ...], np.ndarray] = {}
+    for name, window in meta["indicators"]:
+        precomputed[(name, window)] = np.load(os.path.join(path, _indicator_file(name, window)), mmap_mode="r")
+    register_precomputed(series.version, precomputed)
+    return series
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+多组策略参数的并排对比
+- 所有参数组共用同一个价格序列和同一个均线缓存（相同窗口的均线只计算一次）
+- 资金曲线对齐到同一条日期轴（从最早有信号的K线开始），另附统计摘要表
+- 可选加入买入持有（buy_and_hold）作为基准
+"""
+from typing import List, Dict, Any, Optional, Union
+
+import numpy as np
+
+from price_series import PriceSeries, as_price_series
+from strategy_engine import simulate_double_ma, compute_summary, calculate_trade_cost
+from sweep import PARAM_BOUNDS
+from indicators import IndicatorCache, shared_memo
+from downsample import lttb_indices
+
+# 单次对比最多的参数组数
+MAX_STRATEGIES = 20
+
+# 每组参数的字段顺序："short:long[:stop_loss_pct[:take_profit_pct]]"
+SET_FIELDS = ("short", "long", "stop_loss_pct", "take_profit_pct")
+
+BENCHMARK_NAME = "buy_and_hold"
+
+# 对齐曲线中的公共列，不能用作策略名
+RESERVED_NAMES = ("date", "close")
+
+
+def parse_strategy_sets(spec: str, max_strategies: int = MAX_STRATEGIES) -> List[Dict[str, Any]]:
+    """
+    解析参数组列表：逗号分隔，每组为 short:long[:stop_loss_pct[:take_profit_pct]]，
+    如 "10:50,20:100:5:10"
+    """
+    sets = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        values = part.split(":")
+        if not 2 <= len(values) <= len(SET_FIELDS):
+            raise ValueError(f"参数组格式错误: {part!r}，应为 short:long[:stop_loss_pct[:take_profit_pct]]")
+        params: Dict[str, Any] = {"stop_loss_pct": 0.0, "take_profit_pct": 0.0}
+        try:
+            for name, value in zip(SET_FIELDS, values):
+                params[name] = int(value) if name in ("short", "long") else float(value)
+        except ValueError:
+            raise ValueError(f"参数组格式错误: {part!r}，周期须为整数")
+        for name in SET_FIELDS:
+            low, high = PARAM_BOUNDS[name]
+            if not low <= params[name] <= high:
+                raise ValueError(f"参数组 {part!r} 中 {name} 取值 {params[name]} 超出范围 [{low}, {high}]")
+        if params["short"] >= params["long"]:
+            raise ValueError(f"参数组 {part!r}：短均线周期必须小于长均线周期")
+        sets.append(params)
+    if not sets:
+        raise ValueError("至少需要一组策略参数")
+    if len(sets) > max_strategies:
+        raise ValueError(f"参数组数 {len(sets)} 超过上限 {max_strategies}")
+    return sets
+
+
+def strategy_name(params: Dict[str, Any]) -> str:
+    """参数组的默认名称，如 ma_10_50、ma_20_100_sl5_tp10"""
+    name = f"ma_{params['short']}_{params['long']}"
+    if params.get("stop_loss_pct"):
+        name += f"_sl{params['stop_loss_pct']:g}"
+    if params.get("take_profit_pct"):
+        name += f"_tp{params['take_profit_pct']:g}"
+    return name
+
+
+def buy_and_hold_equity(
+    closes: np.ndarray, start: int, initial_capital: float, fee_rate: float, slippage_rate: float
+) -> np.ndarray:
+    """在 start 这根K线按收盘价满仓买入并一直持有（成本计算与双均线策略的开仓一致）"""
+    equity = np.full(closes.shape[0], float(initial_capital))
+    price = float(closes[start])
+    available_cash = initial_capital - initial_capital * (fee_rate + slippage_rate)
+    if price > 0 and available_cash > 0:
+        holdings = available_cash / price
+        cash = initial_capital - holdings * price - calculate_trade_cost(price, holdings, fee_rate, slippage_rate)
+        equity[start:] = cash + holdings * closes[start:]
+    return equity
+
+
+def run_comparison(
+    data: Union[PriceSeries, List[Dict[str, Any]]],
+    strategies: List[Dict[str, Any]],
+    initial_capital: float = 10000.0,
+    fee_rate: float = 0.001,
+    slippage_rate: float = 0.0005,
+    benchmark: bool = False,
+    layout: str = "rows",
+    max_points: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    在同一价格序列上回测多组双均线参数，返回：
+    - strategies：每组的名称、参数和统计摘要（与单次回测的 summary 相同）
+    - equity_curve：对齐的资金曲线，列为 date、close 和各策略名
+    max_points 时所有曲线一起用 LTTB 选点（见 downsample.lttb_indices），
+    对齐后的日期轴总共不超过 max_points 个点
+    """
+    if layout not in ("rows", "columns"):
+        raise ValueError(f"不支持的结果布局: {layout}")
+    if not strategies:
+        raise ValueError("至少需要一组策略参数")
+    series = as_price_series(data)
+    longest = max(p["long"] for p in strategies)
+    if len(series) < longest:
+        raise ValueError(f"数据不足，至少需要 {longest} 条记录，当前只有 {len(series)} 条")
+    if not (series.close > 0).any():
+        raise ValueError("数据无效：收盘价必须大于0")
+
+    closes = series.close
+    cache = IndicatorCache(series, memo=shared_memo)
+    # 公共日期轴从最早有完整均线的K线开始，之前各策略都为空仓
+    start = min(p["long"] for p in strategies) - 1
+
+    names: List[str] = []
+    table: List[Dict[str, Any]] = []
+    curves: Dict[str, np.ndarray] = {}
+
+    def add(name: str, params: Dict[str, Any], equity: np.ndarray, summary: Dict[str, Any]) -> None:
+        if name in RESERVED_NAMES:
+            raise ValueError(f"策略名不能为 {name}")
+        unique, k = name, 2
+        while unique in curves:
+            unique = f"{name}#{k}"
+            k += 1
+        names.append(unique)
+        curves[unique] = equity[start:]
+        table.append({"name": unique, "params": params, "summary": summary})
+
+    for params in strategies:
+        params = dict(params, fee_rate=fee_rate, slippage_rate=slippage_rate)
+        long = params["long"]
+        equity, position = simulate_double_ma(
+            closes,
+            cache.sma(params["short"]),
+            cache.sma(long),
+            initial_capital,
+            fee_rate,
+            slippage_rate,
+            params["stop_loss_pct"],
+            params["take_profit_pct"],
+        )
+        add(strategy_name(params), params, equity, compute_summary(equity[long - 1:], series, position, initial_capital))
+
+    if benchmark:
+        equity = buy_and_hold_equity(closes, start, initial_capital, fee_rate, slippage_rate)
+        position = np.zeros(len(series), dtype=np.int8)
+        position[start:] = 1
+        add(
+            BENCHMARK_NAME,
+            {"fee_rate": fee_rate, "slippage_rate": slippage_rate},
+            equity,
+            compute_summary(equity[start:], series, position, initial_capital),
+        )
+
+    if max_points is not None:
+        idx = lttb_indices(np.vstack([curves[name] for name in names]), max_points)
+    else:
+        idx = np.arange(len(series) - start)
+    iso_dates = series.iso_dates
+    columns: Dict[str, List[Any]] = {
+        "date": [iso_dates[start + i] for i in idx.tolist()],
+        "close": closes[start + idx].tolist(),
+    }
+    for name in names:
+        columns[name] = curves[name][idx].tolist()
+
+    result: Dict[str, Any] = {
+        "params": {
+            "initial_capital": initial_capital,
+            "fee_rate": fee_rate,
+            "slippage_rate": slippage_rate,
+            "benchmark": benchmark,
+        },
+        "strategies": table,
+        "num_indicators": len(cache),
+    }
+    if layout == "columns":
+        result["equity_curve"] = columns
+    else:
+        result["equity_curve"] = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    return result
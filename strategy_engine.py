@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+双均线策略的 NumPy 回测引擎
+- 均线取自 indicators（累积和实现，O(n)，与窗口长度无关；按数据版本记忆）
+- 信号、持仓在数组层面一次性计算
+- 仅在止损止盈需要路径依赖的地方保留按交易区间推进的循环
+"""
+import time
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+
+from price_series import PriceSeries, as_price_series
+from downsample import lttb_indices
+from indicators import IndicatorCache, sma, shared_memo  # noqa: F401  sma 供旧代码从此处导入
+from metrics import MetricsAccumulator
+from resample import resampled
+
+
+# 结果中可选的部分：summary 统计摘要、trades 交易记录、curve 资金曲线
+RESULT_FIELDS = ("summary", "trades", "curve")
+
+# 交易记录的字段（列式布局时的列顺序）
+TRADE_FIELDS = ("entry_date", "exit_date", "entry_price", "exit_price", "pnl_pct", "exit_reason")
+
+
+def calculate_trade_cost(price: float, quantity: float, fee_rate: float, slippage_rate: float) -> float:
+    """
+    计算交易成本（手续费 + 滑点）
+    - fee_rate: 手续费率（如0.001表示0.1%）
+    - slippage_rate: 滑点率（如0.0005表示0.05%）
+    """
+    trade_value = price * quantity
+    fee = trade_value * fee_rate
+    slippage = trade_value * slippage_rate
+    return fee + slippage
+
+
+def simulate_double_ma(
+    closes: np.ndarray,
+    ma_short: np.ndarray,
+    ma_long: np.ndarray,
+    initial_capital: float,
+    fee_rate: float,
+    slippage_rate: float,
+    stop_loss_pct: float,
+    take_profit_pct: float,
+    deadline: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    逐笔交易推进的资金曲线模拟，返回 (equity, position)。
+    position 为实际持仓（已包含止损止盈导致的提前平仓）。
+
+    交易规则与原逐日循环版本一致：
+    - 当日持仓 = 前一日信号，持仓由 0 变 1 时按收盘价满仓买入
+    - 持仓由 1 变 0、或收盘价触及止损/止盈价时按收盘价全部卖出
+    - 同一根K线先检查止损再检查止盈
+    deadline 为绝对时间（time.time()），每推进一笔交易检查一次，超过后抛出 TimeoutError
+    """
+    n = closes.shape[0]
+    signal = ma_short > ma_long  # NaN 比较结果为 False
+    base_pos = np.zeros(n, dtype=np.int8)
+    base_pos[1:] = signal[:-1]
+    position = base_pos.copy()
+    equity = np.empty(n)
+    equity[0] = initial_capital
+
+    # 原始信号下的开仓点（0→1）与平仓点（1→0）
+    edges = np.diff(base_pos)
+    starts = np.flatnonzero(edges == 1) + 1
+    ends = np.flatnonzero(edges == -1) + 1
+
+    use_stops = stop_loss_pct > 0 or take_profit_pct > 0
+    cash = initial_capital
+    i = 1
+    while i < n:
+        if deadline is not None and time.time() > deadline:
+            raise TimeoutError("回测超过截止时间，已中止")
+        # 空仓阶段：找到下一个买入点
+        if position[i - 1] == 0 and base_pos[i] == 1:
+            j = i
+        else:
+            k = np.searchsorted(starts, i)
+            if k == starts.shape[0]:
+                equity[i:] = cash
+                break
+            j = int(starts[k])
+        equity[i:j] = cash
+
+        price = float(closes[j])
+        trade_cost_estimate = cash * (fee_rate + slippage_rate)
+        available_cash = cash - trade_cost_estimate
+        if cash <= 0 or available_cash <= 0:
+            equity[j] = cash
+            i = j + 1
+            continue
+        holdings = available_cash / price
+        cash = cash - holdings * price - calculate_trade_cost(price, holdings, fee_rate, slippage_rate)
+        entry_price = price
+        equity[j] = cash + holdings * price
+
+        # 持仓阶段：信号平仓点与止损止盈触发点取较早者
+        k = np.searchsorted(ends, j, side="right")
+        exit_idx = int(ends[k]) if k < ends.shape[0] else n
+        stopped = False
+        if use_stops and entry_price > 0:
+            segment = closes[j + 1 : min(exit_idx + 1, n)]
+            hit = np.zeros(segment.shape[0], dtype=bool)
+            if stop_loss_pct > 0:
+                hit |= segment <= entry_price * (1 - stop_loss_pct / 100)
+            if take_profit_pct > 0:
+                hit |= segment >= entry_price * (1 + take_profit_pct / 100)
+            if hit.any():
+                first = j + 1 + int(np.argmax(hit))
+                if first <= exit_idx:
+                    exit_idx = first
+                    stopped = True
+
+        if exit_idx >= n:
+            equity[j + 1:] = cash + holdings * closes[j + 1:]
+            break
+        equity[j + 1 : exit_idx] = cash + holdings * closes[j + 1 : exit_idx]
+
+        price = float(closes[exit_idx])
+        cash = holdings * price - calculate_trade_cost(price, holdings, fee_rate, slippage_rate)
+        equity[exit_idx] = cash
+        if stopped:
+            position[exit_idx] = 0
+        i = exit_idx + 1
+
+    return equity, position
+
+
+def trade_bars(position: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    已平仓交易的开仓、平仓K线下标（持仓由 0 变 1、由 1 变 0 的位置）；期末未平仓的交易不计入
+    """
+    edges = np.diff(position)
+    entries = np.flatnonzero(edges == 1) + 1
+    exits = np.flatnonzero(edges == -1) + 1
+    return entries[: exits.shape[0]], exits
+
+
+def extract_trades(
+    position: np.ndarray,
+    series: PriceSeries,
+    stop_loss_pct: float,
+    take_profit_pct: float,
+) -> List[Dict[str, Any]]:
+    """
+    根据实际持仓的变化提取已平仓的交易记录
+    """
+    closes = series.close
+    dates = series.iso_dates
+    entries, exits = trade_bars(position)
+
+    trades: List[Dict[str, Any]] = []
+    for entry_i, exit_i in zip(entries.tolist(), exits.tolist()):
+        entry_price = float(closes[entry_i])
+        exit_price = float(closes[exit_i])
+        exit_reason = "signal"
+        if entry_price > 0:
+            if stop_loss_pct > 0 and exit_price <= entry_price * (1 - stop_loss_pct / 100):
+                exit_reason = "stop_loss"
+            elif take_profit_pct > 0 and exit_price >= entry_price * (1 + take_profit_pct / 100):
+                exit_reason = "take_profit"
+        trades.append(
+            {
+                "entry_date": dates[entry_i],
+                "exit_date": dates[exit_i],
+                "entry_price": entry_price,
+                "exit_price": exit_price,
+                "pnl_pct": (exit_price - entry_price) / entry_price if entry_price > 0 else 0.0,
+                "exit_reason": exit_reason,
+            }
+        )
+    return trades
+
+
+def accumulate_trades(acc: MetricsAccumulator, position: np.ndarray, series: PriceSeries) -> None:
+    """
+    把持仓序列中的已平仓交易送入统计累加器（收益率与持仓天数直接由K线下标计算）
+    """
+    entries, exits = trade_bars(position)
+    entry_prices = series.close[entries]
+    exit_prices = series.close[exits]
+    safe = np.where(entry_prices > 0, entry_prices, 1.0)
+    pnl = np.where(entry_prices > 0, (exit_prices - entry_prices) / safe, 0.0)
+    days = series.days
+    acc.add_trades(pnl, days[entries], days[exits])
+
+
+def compute_summary(
+    equity: np.ndarray,
+    series: PriceSeries,
+    position: np.ndarray,
+    initial_capital: float,
+) -> Dict[str, Any]:
+    """
+    计算回测统计指标，equity 为均线预热期之后的资金曲线，position 为 series 上的实际持仓。
+    年化收益按 series 的首尾日期计算。
+    """
+    days = series.days
+    acc = MetricsAccumulator(
+        initial_capital, start_day=days[0].item() if len(series) else None, bar_days=series.bar_days
+    )
+    if equity.shape[0] > 0:
+        acc.update_many(equity, days[0].item(), days[-1].item())
+    accumulate_trades(acc, position, series)
+    return acc.summary()
+
+
+def backtest_double_ma_arrays(
+    series: PriceSeries,
+    ma_short: np.ndarray,
+    ma_long: np.ndarray,
+    short: int,
+    long: int,
+    initial_capital: float = 10000.0,
+    fee_rate: float = 0.001,
+    slippage_rate: float = 0.0005,
+    stop_loss_pct: float = 0.0,
+    take_profit_pct: float = 0.0,
+    layout: str = "rows",
+    fields: Tuple[str, ...] = RESULT_FIELDS,
+    max_points: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    在已经准备好的价格序列与均线数组上运行双均线回测，返回与 run_double_ma_strategy 相同结构的结果。
+    均线可由调用方预先计算并在多组参数之间复用。
+    - layout="columns" 时 equity_curve 与 trades 以并列数组（每个字段一个列表）返回
+    - fields 指定需要的部分，未请求的部分不会构建，也不出现在结果中
+    - max_points 用 LTTB 算法把资金曲线降采样到不超过该点数（保留曲线形状）
+    - deadline（time.time() 绝对时间）用于中止超时的模拟
+    """
+    if layout not in ("rows", "columns"):
+        raise ValueError(f"不支持的结果布局: {layout}")
+    unknown = set(fields) - set(RESULT_FIELDS)
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(sorted(unknown))}，可选: {', '.join(RESULT_FIELDS)}")
+    closes = series.close
+    equity, position = simulate_double_ma(
+        closes, ma_short, ma_long, initial_capital,
+        fee_rate, slippage_rate, stop_loss_pct, take_profit_pct, deadline,
+    )
+    # 资金曲线从两条均线都有值的位置开始
+    start = long - 1
+    result: Dict[str, Any] = {
+        "params": {
+            "short": short,
+            "long": long,
+            "initial_capital": initial_capital,
+            "fee_rate": fee_rate,
+            "slippage_rate": slippage_rate,
+            "stop_loss_pct": stop_loss_pct,
+            "take_profit_pct": take_profit_pct,
+        },
+    }
+
+    if "curve" in fields:
+        if max_points is not None:
+            # 降采样：只取选中的点，其余点不转换为 Python 对象
+            idx = start + lttb_indices(equity[start:], max_points)
+            iso_dates = series.iso_dates
+            dates = [iso_dates[i] for i in idx.tolist()]
+        else:
+            idx = slice(start, None)
+            dates = series.iso_dates[start:]
+        curve_columns = {
+            "date": dates,
+            "close": closes[idx].tolist(),
+            "ma_short": ma_short[idx].tolist(),
+            "ma_long": ma_long[idx].tolist(),
+            "equity": equity[idx].tolist(),
+            "position": position[idx].tolist(),
+        }
+        if layout == "columns":
+            result["equity_curve"] = curve_columns
+        else:
+            result["equity_curve"] = [dict(zip(curve_columns, values)) for values in zip(*curve_columns.values())]
+
+    if "trades" in fields:
+        trades = extract_trades(position, series, stop_loss_pct, take_profit_pct)
+        if layout == "columns":
+            result["trades"] = {name: [t[name] for t in trades] for name in TRADE_FIELDS}
+        else:
+            result["trades"] = trades
+    if "summary" in fields:
+        result["summary"] = compute_summary(equity[start:], series, position, initial_capital)
+
+    return result
+
+
+def run_double_ma_strategy(
+    data: Union[PriceSeries, List[Dict[str, Any]]],
+    short: int,
+    long: int,
+    initial_capital: float = 10000.0,
+    # 交易成本参数
+    fee_rate: float = 0.001,  # 手续费率，默认0.1%
+    slippage_rate: float = 0.0005,  # 滑点率，默认0.05%
+    # 风险管理参数
+    stop_loss_pct: float = 0.0,  # 止损百分比，0表示不使用
+    take_profit_pct: float = 0.0,  # 止盈百分比，0表示不使用
+    # 结果布局："rows"（每天一个字典）或 "columns"（并列数组）
+    layout: str = "rows",
+    # 需要返回的部分（summary/trades/curve）及资金曲线的最大点数
+    fields: Tuple[str, ...] = RESULT_FIELDS,
+    max_points: Optional[int] = None,
+    # 截止时间（time.time() 绝对时间），超过后中止模拟并抛出 TimeoutError
+    deadline: Optional[float] = None,
+    # K线周期（如 "4h"、"3d"、"1w"），给出时先把 data 重采样到该周期（结果按数据版本缓存）
+    timeframe: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    增强版双均线策略：收盘价短均线上穿长均线做多，下穿全部平仓。
+    不做做空，只做多，始终满仓或空仓。
+
+    新增功能：
+    - 交易成本模拟（手续费+滑点）
+    - 止损止盈功能
+    - 高级统计指标（Sortino、Calmar等）
+
+    data 可以是 PriceSeries（直接使用，不复制）或行式K线列表。
+    """
+    if short >= long:
+        raise ValueError("短均线周期必须小于长均线周期")
+
+    if timeframe is not None and data:
+        data = resampled(as_price_series(data), timeframe)
+
+    if not data or len(data) < long:
+        raise ValueError(f"数据不足，至少需要 {long} 条记录，当前只有 {len(data) if data else 0} 条")
+
+    series = as_price_series(data)
+
+    # 验证数据有效性
+    if not (series.close > 0).any():
+        raise ValueError("数据无效：收盘价必须大于0")
+
+    indicators = IndicatorCache(series, memo=shared_memo)
+    return backtest_double_ma_arrays(
+        series,
+        indicators.sma(short),
+        indicators.sma(long),
+        short=short,
+        long=long,
+        initial_capital=initial_capital,
+        fee_rate=fee_rate,
+        slippage_rate=slippage_rate,
+        stop_loss_pct=stop_loss_pct,
+        take_profit_pct=take_profit_pct,
+        layout=layout,
+        fields=fields,
+        max_points=max_points,
+        deadline=deadline,
+    )
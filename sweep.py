@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+双均线策略参数网格扫描
+- 解析参数范围（"5:50:5" 或 "10,20,30"）并展开成参数组合
+- 每个不同的均线窗口只计算一次，在所有组合之间复用
+- 按指定指标对回测摘要排序
+- 大规模扫描可分片到进程池并行执行：进程池在各次扫描间复用（服务关闭时释放），
+  已发布为共享数据集的数据由各进程直接内存映射，其余通过共享内存传给各进程
+"""
+import itertools
+import math
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Optional, Set, Tuple, Callable, Iterator, Union
+
+import numpy as np
+
+from price_series import PriceSeries, as_price_series, buffer_size, buffer_columns
+from strategy_engine import simulate_double_ma, compute_summary
+from indicators import IndicatorCache, shared_memo
+from backtest_executor import _attach_dataset
+import shared_dataset
+
+# 单次扫描允许的最大组合数，防止一次请求占满服务器
+MAX_COMBINATIONS = 20000
+
+# 并行模式下每个任务包含的组合数上限
+MAX_CHUNK_SIZE = 256
+
+# 扫描参数及其类型（均线周期为整数）
+PARAM_TYPES = {
+    "short": int,
+    "long": int,
+    "stop_loss_pct": float,
+    "take_profit_pct": float,
+    "fee_rate": float,
+    "slippage_rate": float,
+}
+
+# 各参数的取值范围，与 /api/backtest/double_ma 的校验保持一致
+PARAM_BOUNDS = {
+    "short": (2, 200),
+    "long": (5, 400),
+    "stop_loss_pct": (0.0, 50.0),
+    "take_profit_pct": (0.0, 100.0),
+    "fee_rate": (0.0, 0.01),
+    "slippage_rate": (0.0, 0.01),
+}
+
+SORTABLE_METRICS = (
+    "total_return_pct",
+    "cagr_pct",
+    "sharpe_ratio",
+    "sortino_ratio",
+    "calmar_ratio",
+    "annualized_volatility_pct",
+    "max_drawdown_pct",
+    "max_drawdown_duration",
+    "num_trades",
+    "win_rate_pct",
+    "profit_factor",
+)
+
+
+def parse_param_range(name: str, spec: str, cast: Callable = float) -> List[Any]:
+    """
+    解析参数范围：
+    - "5:50:5" 表示 5 到 50（含）、步长 5
+    - "5:50" 步长默认为 1
+    - "10,20,30" 表示枚举值
+    - "10" 表示单个值
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        raise ValueError(f"参数 {name} 不能为空")
+    try:
+        if ":" in spec:
+            parts = [float(p) for p in spec.split(":")]
+            if len(parts) not in (2, 3):
+                raise ValueError
+            start, stop = parts[0], parts[1]
+            step = parts[2] if len(parts) == 3 else 1.0
+            if step <= 0 or stop < start:
+                raise ValueError
+            count = int(math.floor((stop - start) / step + 1e-9)) + 1
+            values = [cast(round(start + k * step, 10)) for k in range(count)]
+        else:
+            values = [cast(float(p)) for p in spec.split(",") if p.strip()]
+    except ValueError:
+        raise ValueError(f"参数 {name} 格式错误: {spec!r}，应为 起始:结束:步长 或 逗号分隔的数值")
+
+    low, high = PARAM_BOUNDS[name]
+    for v in values:
+        if v < low or v > high:
+            raise ValueError(f"参数 {name} 取值 {v} 超出范围 [{low}, {high}]")
+    # 去重并保持顺序
+    return list(dict.fromkeys(values))
+
+
+def build_param_grid(ranges: Dict[str, List[Any]], max_combinations: int = MAX_COMBINATIONS) -> List[Dict[str, Any]]:
+    """
+    展开参数组合，自动跳过 short >= long 的无效组合
+    """
+    names = list(PARAM_TYPES)
+    grid = []
+    for combo in itertools.product(*(ranges[n] for n in names)):
+        params = dict(zip(names, combo))
+        if params["short"] < params["long"]:
+            grid.append(params)
+    if not grid:
+        raise ValueError("没有有效的参数组合（短均线周期必须小于长均线周期）")
+    if len(grid) > max_combinations:
+        raise ValueError(f"参数组合数 {len(grid)} 超过上限 {max_combinations}，请缩小范围")
+    return grid
+
+
+def parse_sweep_grid(specs: Dict[str, str], max_combinations: int = MAX_COMBINATIONS) -> List[Dict[str, Any]]:
+    """把各参数的范围字符串（如 {"short": "5:30:5", ...}）展开成参数组合，顺序固定"""
+    return build_param_grid(
+        {name: parse_param_range(name, specs[name], cast) for name, cast in PARAM_TYPES.items()},
+        max_combinations,
+    )
+
+
+def run_combination(
+    series: PriceSeries,
+    cache: IndicatorCache,
+    params: Dict[str, Any],
+    initial_capital: float,
+) -> Dict[str, Any]:
+    """
+    运行单个参数组合，只返回统计摘要（不构建资金曲线明细）。
+    相当于 run_double_ma_strategy(series, **params, fields=("summary",)) 的精简版：
+    省去参数校验、重采样和结果布局，均线取自 cache，摘要与之完全一致
+    """
+    short = params["short"]
+    long = params["long"]
+    equity, position = simulate_double_ma(
+        series.close,
+        cache.sma(short),
+        cache.sma(long),
+        initial_capital,
+        params["fee_rate"],
+        params["slippage_rate"],
+        params["stop_loss_pct"],
+        params["take_profit_pct"],
+    )
+    return compute_summary(equity[long - 1:], series, position, initial_capital)
+
+
+def rank_results(results: List[Dict[str, Any]], sort_by: str, descending: bool = True) -> List[Dict[str, Any]]:
+    """
+    按摘要中的指标排序，指标为 None 的组合排在最后，并写入名次
+    """
+    def key(item: Dict[str, Any]) -> Tuple[int, float]:
+        value = item["summary"].get(sort_by)
+        if value is None:
+            return (1, 0.0)
+        return (0, -value if descending else value)
+
+    ranked = sorted(results, key=key)
+    for i, item in enumerate(ranked, start=1):
+        item["rank"] = i
+    return ranked
+
+
+# 并行扫描共用的进程池：第一次并行扫描时创建，之后各次扫描（同步接口、流式接口、后台任务）复用，
+# 服务关闭时由 shutdown_sweep_pool() 释放。进程数为 BTC_SWEEP_PROCESSES（默认 CPU 核数），
+# 单次扫描的 workers 只决定它同时在途的分片数
+SWEEP_PROCESSES = int(os.environ.get("BTC_SWEEP_PROCESSES", str(os.cpu_count() or 1)))
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # 服务进程是多线程的（uvicorn 线程池），使用 spawn 避免 fork 带来的锁状态问题
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, SWEEP_PROCESSES), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """工作进程异常退出后进程池不可再用，下次扫描时重建"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_sweep_pool() -> None:
+    """关闭共用的进程池（服务关闭时调用）；之后的并行扫描会重新创建"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_sweep_chunk(
+    dataset: Dict[str, Any], initial_capital: float, chunk: List[Tuple[int, Dict[str, Any]]]
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    在工作进程中运行一批参数组合。数据按版本挂载一次（见 backtest_executor._attach_dataset），
+    均线存入进程内的 shared_memo，同一版本之后的分片和扫描直接复用
+    """
+    series = _attach_dataset(dataset)
+    cache = IndicatorCache(series, memo=shared_memo)
+    return [(idx, run_combination(series, cache, params, initial_capital)) for idx, params in chunk]
+
+
+def _make_chunks(grid: List[Dict[str, Any]], workers: int) -> List[List[Tuple[int, Dict[str, Any]]]]:
+    """
+    按 (long, short) 排序后切片，使同一分片内的组合尽量共用均线
+    """
+    order = sorted(range(len(grid)), key=lambda i: (grid[i]["long"], grid[i]["short"]))
+    size = max(1, min(MAX_CHUNK_SIZE, math.ceil(len(grid) / (workers * 8))))
+    return [
+        [(i, grid[i]) for i in order[k : k + size]]
+        for k in range(0, len(order), size)
+    ]
+
+
+def iter_sweep_results(
+    series: PriceSeries,
+    grid: List[Dict[str, Any]],
+    initial_capital: float = 10000.0,
+    workers: int = 1,
+) -> Iterator[Dict[str, Any]]:
+    """
+    逐个产出参数组合的回测摘要（顺序为完成顺序，并非 grid 顺序）。
+    workers > 1 时把组合分片到共用的进程池执行，每个工作进程对每个数据版本只挂载一次
+    （已发布的数据集直接映射，否则经本次扫描写入的共享内存）；
+    同时在途的分片数有上限，已产出的结果不会留在内存中。
+    调用方提前关闭生成器（close()）时，尚未开始的分片会被取消，并等待已开始的分片结束。
+    """
+    workers = max(1, min(workers, SWEEP_PROCESSES, len(grid)))
+    if workers == 1:
+        cache = IndicatorCache(series, memo=shared_memo)
+        for idx, params in enumerate(grid):
+            yield {"index": idx, "params": params, "summary": run_combination(series, cache, params, initial_capital)}
+        return
+
+    n = len(series)
+    dataset = shared_dataset.dataset_pointer(series)
+    shm = None
+    running: Set[Future] = set()
+    try:
+        if dataset is None:
+            shm = shared_memory.SharedMemory(create=True, size=buffer_size(n))
+            for name, arr in buffer_columns(shm.buf, n).items():
+                arr[:] = getattr(series, name)
+            dataset = {
+                "shm": shm.name,
+                "rows": n,
+                "version": series.version,
+                "source": series.source,
+                "timeframe": series.timeframe,
+            }
+        pool = _get_pool()
+        chunks = iter(_make_chunks(grid, workers))
+        while True:
+            # 保持每个进程约两个分片在途，完成一个补一个
+            for chunk in itertools.islice(chunks, workers * 2 - len(running)):
+                running.add(pool.submit(_run_sweep_chunk, dataset, initial_capital, chunk))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                try:
+                    items = fut.result()
+                except BrokenProcessPool:
+                    _discard_pool(pool)
+                    raise
+                for idx, summary in items:
+                    yield {"index": idx, "params": grid[idx], "summary": summary}
+    finally:
+        # 进程池由各次扫描共用，这里只取消本次扫描尚未开始的分片，并等已开始的结束后再释放共享内存
+        for fut in running:
+            fut.cancel()
+        wait(running)
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+
+def check_sweep_data(data: Union[PriceSeries, List[Dict[str, Any]]], grid: List[Dict[str, Any]]) -> PriceSeries:
+    """校验数据长度和有效性，返回 PriceSeries"""
+    max_long = max(p["long"] for p in grid)
+    if not data or len(data) < max_long:
+        raise ValueError(f"数据不足，至少需要 {max_long} 条记录，当前只有 {len(data) if data else 0} 条")
+    series = as_price_series(data)
+    if not (series.close > 0).any():
+        raise ValueError("数据无效：收盘价必须大于0")
+    return series
+
+
+def stream_sweep_events(
+    series: PriceSeries,
+    grid: List[Dict[str, Any]],
+    initial_capital: float = 10000.0,
+    workers: int = 1,
+    progress_interval: float = 1.0,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    流式扫描：依次产出 (事件名, 数据)
+    - start：组合总数
+    - result：单个组合的摘要（完成即产出，不在内存中累积）
+    - progress：每隔 progress_interval 秒一次，含已完成数、耗时和预计剩余时间
+    - done：全部完成
+    调用方关闭生成器即取消扫描。
+    """
+    total = len(grid)
+    started = time.time()
+    last_progress = started
+    completed = 0
+
+    def progress() -> Dict[str, Any]:
+        elapsed = time.time() - started
+        rate = completed / elapsed if elapsed > 0 else 0.0
+        return {
+            "completed": completed,
+            "total": total,
+            "elapsed_seconds": round(elapsed, 3),
+            "eta_seconds": round((total - completed) / rate, 3) if rate > 0 else None,
+        }
+
+    yield "start", {"num_combinations": total, "initial_capital": initial_capital}
+    results = iter_sweep_results(series, grid, initial_capital, workers)
+    try:
+        for item in results:
+            completed += 1
+            yield "result", item
+            now = time.time()
+            if now - last_progress >= progress_interval:
+                last_progress = now
+                yield "progress", progress()
+    finally:
+        results.close()
+    yield "progress", progress()
+    yield "done", {"completed": completed, "elapsed_seconds": round(time.time() - started, 3)}
+
+
+def run_double_ma_sweep(
+    data: Union[PriceSeries, List[Dict[str, Any]]],
+    grid: List[Dict[str, Any]],
+    initial_capital: float = 10000.0,
+    sort_by: str = "sharpe_ratio",
+    descending: bool = True,
+    top: Optional[int] = None,
+    workers: int = 1,
+) -> Dict[str, Any]:
+    """
+    在同一份数据上批量回测参数组合，返回按指标排序的摘要表。
+    workers > 1 时使用多进程并行执行。
+    """
+    if sort_by not in SORTABLE_METRICS:
+        raise ValueError(f"不支持的排序指标: {sort_by}，可选: {', '.join(SORTABLE_METRICS)}")
+    series = check_sweep_data(data, grid)
+
+    results = [
+        {"params": item["params"], "summary": item["summary"]}
+        for item in iter_sweep_results(series, grid, initial_capital, workers)
+    ]
+    ranked = rank_results(results, sort_by, descending)
+    windows = {p["short"] for p in grid} | {p["long"] for p in grid}
+
+    return {
+        "num_combinations": len(grid),
+        "num_indicators": len(windows),
+        "initial_capital": initial_capital,
+        "sort_by": sort_by,
+        "order": "desc" if descending else "asc",
+        "results": ranked[:top] if top else ranked,
+    }
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+原逐日循环（列表）版本的双均线回测，逐字保留自向量化之前的 backend.py，
+只作为 NumPy 引擎的对照基准，不被服务代码使用
+"""
+import datetime
+from typing import Any, Dict, List
+
+
+def calculate_trade_cost(price: float, quantity: float, fee_rate: float, slippage_rate: float) -> float:
+    """
+    计算交易成本（手续费 + 滑点）
+    - fee_rate: 手续费率（如0.001表示0.1%）
+    - slippage_rate: 滑点率（如0.0005表示0.05%）
+    """
+    trade_value = price * quantity
+    fee = trade_value * fee_rate
+    slippage = trade_value * slippage_rate
+    return fee + slippage
+
+
+def run_double_ma_strategy(
+    data: List[Dict[str, Any]], 
+    short: int, 
+    long: int, 
+    initial_capital: float = 10000.0,
+    # 交易成本参数
+    fee_rate: float = 0.001,  # 手续费率，默认0.1%
+    slippage_rate: float = 0.0005,  # 滑点率，默认0.05%
+    # 风险管理参数
+    stop_loss_pct: float = 0.0,  # 止损百分比，0表示不使用
+    take_profit_pct: float = 0.0,  # 止盈百分比，0表示不使用
+) -> Dict[str, Any]:
+    """
+    增强版双均线策略：收盘价短均线上穿长均线做多，下穿全部平仓。
+    不做做空，只做多，始终满仓或空仓。
+    
+    新增功能：
+    - 交易成本模拟（手续费+滑点）
+    - 止损止盈功能
+    - 高级统计指标（Sortino、Calmar等）
+    """
+    if short >= long:
+        raise ValueError("短均线周期必须小于长均线周期")
+    
+    if not data or len(data) < long:
+        raise ValueError(f"数据不足，至少需要 {long} 条记录，当前只有 {len(data) if data else 0} 条")
+
+    rows = sorted(data, key=lambda x: x["date"])
+
+    closes = [r["close"] for r in rows]
+    dates = [r["date"] for r in rows]
+    
+    # 验证数据有效性
+    if not closes or all(c <= 0 for c in closes):
+        raise ValueError("数据无效：收盘价必须大于0")
+
+    n = len(rows)
+    ma_short = [None] * n
+    ma_long = [None] * n
+
+    # 简单移动平均
+    for i in range(n):
+        if i + 1 >= short:
+            window = closes[i + 1 - short : i + 1]
+            ma_short[i] = sum(window) / len(window)
+        if i + 1 >= long:
+            window = closes[i + 1 - long : i + 1]
+            ma_long[i] = sum(window) / len(window)
+
+    signal = [0] * n
+    for i in range(n):
+        if ma_short[i] is not None and ma_long[i] is not None and ma_short[i] > ma_long[i]:
+            signal[i] = 1
+
+    position = [0] * n
+    for i in range(1, n):
+        position[i] = signal[i - 1]
+
+    # 使用更真实的交易逻辑，考虑交易成本和止损止盈
+    equity = [initial_capital] * n
+    cash = initial_capital
+    holdings = 0.0  # 持仓数量
+    entry_price = 0.0
+    entry_index = 0
+    highest_price_after_entry = 0.0  # 用于跟踪最高价（移动止损）
+    
+    # 计算每日收益率（用于统计）
+    pct_change = [0.0] * n
+    for i in range(1, n):
+        if closes[i - 1] != 0:
+            pct_change[i] = closes[i] / closes[i - 1] - 1.0
+    
+    strategy_ret = [0.0] * n
+    
+    for i in range(1, n):
+        current_price = closes[i]
+        prev_pos = position[i - 1]
+        curr_pos = position[i]
+        
+        # 检查止损止盈（仅在持仓时）
+        if holdings > 0 and entry_price > 0:
+            # 更新最高价
+            if current_price > highest_price_after_entry:
+                highest_price_after_entry = current_price
+            
+            # 检查止损
+            if stop_loss_pct > 0:
+                stop_loss_price = entry_price * (1 - stop_loss_pct / 100)
+                if current_price <= stop_loss_price:
+                    # 触发止损，强制平仓
+                    trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
+                    cash = holdings * current_price - trade_cost
+                    holdings = 0.0
+                    entry_price = 0.0
+                    highest_price_after_entry = 0.0
+                    position[i] = 0  # 更新position数组
+                    equity[i] = cash
+                    strategy_ret[i] = (cash - equity[i - 1]) / equity[i - 1] if equity[i - 1] > 0 else 0.0
+                    continue
+            
+            # 检查止盈
+            if take_profit_pct > 0:
+                take_profit_price = entry_price * (1 + take_profit_pct / 100)
+                if current_price >= take_profit_price:
+                    # 触发止盈，强制平仓
+                    trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
+                    cash = holdings * current_price - trade_cost
+                    holdings = 0.0
+                    entry_price = 0.0
+                    highest_price_after_entry = 0.0
+                    position[i] = 0  # 更新position数组
+                    equity[i] = cash
+                    strategy_ret[i] = (cash - equity[i - 1]) / equity[i - 1] if equity[i - 1] > 0 else 0.0
+                    continue
+        
+        # 买入信号：从空仓到持仓
+        if prev_pos == 0 and curr_pos == 1:
+            if cash > 0:
+                # 计算可买入数量（考虑交易成本）
+                trade_cost_estimate = cash * (fee_rate + slippage_rate)
+                available_cash = cash - trade_cost_estimate
+                if available_cash > 0:
+                    holdings = available_cash / current_price
+                    trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
+                    cash = cash - holdings * current_price - trade_cost
+                    entry_price = current_price
+                    entry_index = i
+                    highest_price_after_entry = current_price
+        
+        # 卖出信号：从持仓到空仓
+        elif prev_pos == 1 and curr_pos == 0:
+            if holdings > 0:
+                trade_cost = calculate_trade_cost(current_price, holdings, fee_rate, slippage_rate)
+                cash = holdings * current_price - trade_cost
+                holdings = 0.0
+                entry_price = 0.0
+                highest_price_after_entry = 0.0
+        
+        # 计算当前净值
+        equity[i] = cash + holdings * current_price
+        if equity[i - 1] > 0:
+            strategy_ret[i] = (equity[i] - equity[i - 1]) / equity[i - 1]
+        else:
+            strategy_ret[i] = 0.0
+
+    # 重新计算交易记录（基于实际交易）
+    trades: List[Dict[str, Any]] = []
+    current_pos = 0
+    entry_price_record = 0.0
+    entry_date_record: datetime.date | None = None
+    entry_index_record = 0
+    exit_reason = "signal"  # signal, stop_loss, take_profit
+
+    for i in range(1, n):
+        pos = int(position[i])
+        prev_pos = int(position[i - 1])
+        price = float(closes[i])
+        date = dates[i]
+        
+        # 买入
+        if prev_pos == 0 and pos == 1:
+            current_pos = 1
+            entry_price_record = price
+            entry_date_record = date
+            entry_index_record = i
+            exit_reason = "signal"
+        
+        # 卖出（检查是否因为止损止盈）
+        elif prev_pos == 1 and pos == 0:
+            exit_price = price
+            exit_date = date
+            
+            # 检查是否因为止损止盈
+            if entry_price_record > 0:
+                if stop_loss_pct > 0 and price <= entry_price_record * (1 - stop_loss_pct / 100):
+                    exit_reason = "stop_loss"
+                elif take_profit_pct > 0 and price >= entry_price_record * (1 + take_profit_pct / 100):
+                    exit_reason = "take_profit"
+                else:
+                    exit_reason = "signal"
+            
+            trades.append(
+                {
+                    "entry_date": entry_date_record.isoformat() if entry_date_record else None,
+                    "exit_date": exit_date.isoformat(),
+                    "entry_price": entry_price_record,
+                    "exit_price": exit_price,
+                    "pnl_pct": (exit_price - entry_price_record) / entry_price_record
+                    if entry_price_record > 0
+                    else 0.0,
+                    "exit_reason": exit_reason,
+                }
+            )
+            current_pos = 0
+            entry_price_record = 0.0
+            entry_date_record = None
+            exit_reason = "signal"
+
+    equity_curve: List[Dict[str, Any]] = []
+    for i in range(n):
+        if ma_short[i] is None or ma_long[i] is None:
+            continue
+        equity_curve.append(
+            {
+                "date": dates[i].isoformat(),
+                "close": float(closes[i]),
+                "ma_short": float(ma_short[i]),
+                "ma_long": float(ma_long[i]),
+                "equity": float(equity[i]),
+                "position": int(position[i]),
+            }
+        )
+
+    if equity_curve:
+        total_ret = equity_curve[-1]["equity"] / initial_capital - 1.0
+    else:
+        total_ret = 0.0
+
+    max_drawdown = 0.0
+    if equity_curve:
+        peak = equity_curve[0]["equity"]
+        max_dd = 0.0
+        for pt in equity_curve:
+            eq = pt["equity"]
+            if eq > peak:
+                peak = eq
+            dd = eq / peak - 1.0
+            if dd < max_dd:
+                max_dd = dd
+        max_drawdown = float(max_dd)
+
+    # 年化收益（CAGR）与高级指标
+    cagr = 0.0
+    sharpe = 0.0
+    sortino = 0.0
+    calmar = 0.0
+    annualized_vol = 0.0
+    max_drawdown_duration = 0
+    
+    if equity_curve and len(dates) > 0:
+        days = (dates[-1] - dates[0]).days
+        if days > 0:
+            years = days / 365.25
+            if years > 0:
+                final_equity = equity_curve[-1]["equity"]
+                if final_equity > 0 and initial_capital > 0:
+                    cagr = (final_equity / initial_capital) ** (1 / years) - 1.0
+        
+        # 计算收益率序列（用于统计）
+        returns = []
+        for i in range(1, len(equity_curve)):
+            if equity_curve[i - 1]["equity"] > 0:
+                ret = (equity_curve[i]["equity"] - equity_curve[i - 1]["equity"]) / equity_curve[i - 1]["equity"]
+                returns.append(ret)
+        
+        if len(returns) > 1:
+            mean_ret = sum(returns) / len(returns)
+            var = sum((r - mean_ret) ** 2 for r in returns) / len(returns)
+            std = var ** 0.5 if var > 0 else 0.0
+            
+            # 年化波动率
+            annualized_vol = std * (252 ** 0.5) if std > 0 else 0.0
+            
+            # 夏普比率（无风险利率视为0）
+            if annualized_vol > 0:
+                sharpe = (cagr) / annualized_vol
+            
+            # Sortino比率（只考虑下行波动）
+            downside_returns = [r for r in returns if r < 0]
+            if len(downside_returns) > 0:
+                downside_var = sum(r ** 2 for r in downside_returns) / len(downside_returns)
+                downside_std = downside_var ** 0.5 if downside_var > 0 else 0.0
+                annualized_downside_vol = downside_std * (252 ** 0.5) if downside_std > 0 else 0.0
+                if annualized_downside_vol > 0:
+                    sortino = (cagr) / annualized_downside_vol
+                elif cagr > 0:
+                    sortino = float('inf')
+            
+            # Calmar比率（年化收益/最大回撤）
+            if max_drawdown < 0:
+                calmar = cagr / abs(max_drawdown) if max_drawdown != 0 else 0.0
+        
+        # 计算最大回撤持续时间
+        peak = equity_curve[0]["equity"]
+        current_dd_duration = 0
+        for pt in equity_curve:
+            eq = pt["equity"]
+            if eq > peak:
+                peak = eq
+                current_dd_duration = 0
+            else:
+                current_dd_duration += 1
+                max_drawdown_duration = max(max_drawdown_duration, current_dd_duration)
+
+    # 交易统计
+    win_count = 0
+    loss_count = 0
+    win_sum = 0.0
+    loss_sum = 0.0
+    hold_days = []
+    for t in trades:
+        pnl = t["pnl_pct"]
+        if pnl > 0:
+            win_count += 1
+            win_sum += pnl
+        elif pnl < 0:
+            loss_count += 1
+            loss_sum += pnl
+        if t["entry_date"] and t["exit_date"]:
+            try:
+                d1 = datetime.datetime.strptime(t["entry_date"], "%Y-%m-%d").date()
+                d2 = datetime.datetime.strptime(t["exit_date"], "%Y-%m-%d").date()
+                hold_days.append((d2 - d1).days or 1)
+            except Exception:
+                pass
+    total_trades = len(trades)
+    win_rate = win_count / total_trades if total_trades > 0 else 0.0
+    avg_win = win_sum / win_count if win_count > 0 else 0.0
+    avg_loss = loss_sum / loss_count if loss_count > 0 else 0.0
+    profit_factor = (win_sum) / abs(loss_sum) if loss_sum != 0 else None
+    avg_hold = sum(hold_days) / len(hold_days) if hold_days else None
+
+    return {
+        "params": {
+            "short": short,
+            "long": long,
+            "initial_capital": initial_capital,
+            "fee_rate": fee_rate,
+            "slippage_rate": slippage_rate,
+            "stop_loss_pct": stop_loss_pct,
+            "take_profit_pct": take_profit_pct,
+        },
+        "equity_curve": equity_curve,
+        "trades": trades,
+        "summary": {
+            "total_return_pct": float(total_ret * 100),
+            "cagr_pct": float(cagr * 100),
+            "sharpe_ratio": float(sharpe) if not (isinstance(sharpe, float) and sharpe == float('inf')) else None,
+            "sortino_ratio": float(sortino) if not (isinstance(sortino, float) and sortino == float('inf')) else None,
+            "calmar_ratio": float(calmar) if not (isinstance(calmar, float) and calmar == float('inf')) else None,
+            "annualized_volatility_pct": float(annualized_vol * 100),
+            "max_drawdown_pct": float(max_drawdown * 100),
+            "max_drawdown_duration": max_drawdown_duration,
+            "num_trades": total_trades,
+            "win_rate_pct": float(win_rate * 100),
+            "profit_factor": float(profit_factor) if profit_factor is not None else None,
+            "avg_win_pct": float(avg_win * 100) if win_count > 0 else None,
+            "avg_loss_pct": float(avg_loss * 100) if loss_count > 0 else None,
+            "avg_hold_days": float(avg_hold) if avg_hold is not None else None,
+        },
+    }
+
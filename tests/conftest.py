@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+pytest 公共配置：把项目根目录加入导入路径，并在导入任何模块之前把缓存目录等配置指向临时目录
+（各模块在导入时读取环境变量）
+"""
+import contextlib
+import datetime
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("BTC_CACHE_DIR", tempfile.mkdtemp(prefix="btc-test-cache-"))
+os.environ.setdefault("BTC_WARMUP", "0")
+os.environ.setdefault("BACKTEST_EXECUTOR", "thread")
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+
+def make_rows(n: int = 800, seed: int = 7, start: datetime.date = datetime.date(2020, 1, 1)):
+    """确定性的随机游走日线（行式，date 为 datetime.date）"""
+    rng = np.random.default_rng(seed)
+    close = 10000.0 * np.exp(np.cumsum(rng.normal(0.0005, 0.03, n)))
+    open_ = close * rng.uniform(0.98, 1.02, n)
+    high = np.maximum(open_, close) * rng.uniform(1.0, 1.03, n)
+    low = np.minimum(open_, close) * rng.uniform(0.97, 1.0, n)
+    volume = rng.uniform(1e6, 5e6, n)
+    return [
+        {
+            "date": start + datetime.timedelta(days=i),
+            "open": float(open_[i]),
+            "high": float(high[i]),
+            "low": float(low[i]),
+            "close": float(close[i]),
+            "volume": float(volume[i]),
+        }
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def rows():
+    return make_rows()
+
+
+@pytest.fixture
+def series(rows):
+    from price_series import PriceSeries
+
+    return PriceSeries.from_rows(rows, source="test")
+
+
+@contextlib.contextmanager
+def run_mock_sources(**env: str):
+    """
+    在空闲端口上启动 mock_sources.py 模拟数据源并产出其根地址；
+    env 为附加的环境变量（MOCK_DELAY / MOCK_FAIL / MOCK_END_DATE）
+    """
+    import socket
+    import subprocess
+    import time
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "mock_sources.py"), str(port)],
+        cwd=ROOT,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+                break
+            except OSError:
+                if proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("模拟数据源启动失败")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+@pytest.fixture(scope="session")
+def mock_sources_url():
+    """默认配置的模拟数据源（无延迟、无故障），返回其根地址"""
+    with run_mock_sources() as url:
+        yield url
+
+
+@pytest.fixture
+def mock_sources(mock_sources_url, monkeypatch):
+    """让 data_sources 的各数据源指向模拟服务器"""
+    import data_sources
+
+    for name in ("yahoo", "binance", "coingecko"):
+        monkeypatch.setitem(data_sources.SOURCE_URLS, name, f"{mock_sources_url}/{name}")
+    return mock_sources_url
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""回测执行器（进程池 + 共享内存）"""
+import json
+import time
+
+import pytest
+
+from backtest_executor import BacktestExecutor, ExecutorBusy
+from resample import resampled
+from strategy_engine import run_double_ma_strategy
+
+PARAMS = dict(short=3, long=8)
+
+
+def _summary(body):
+    return json.loads(body)["summary"]
+
+
+@pytest.fixture
+def process_executor():
+    executor = BacktestExecutor(backend="process", workers=1, max_queue=16)
+    yield executor
+    executor.shutdown()
+
+
+def test_mixed_timeframes_keep_queued_segments(process_executor, series):
+    """同一个工作进程排队中的任务依次使用 3 个不同版本的数据，旧版本的共享内存不能被提前释放"""
+    deadline = time.time() + 60
+    jobs = [series] * 3 + [resampled(series, "3d"), resampled(series, "1w")]
+    futures = [process_executor.submit(s, PARAMS, "json", ("summary",), None, deadline) for s in jobs]
+    for s, future in zip(jobs, futures):
+        assert _summary(future.result(timeout=60)) == run_double_ma_strategy(s, **PARAMS, fields=("summary",))["summary"]
+    # 任务全部结束后，只保留各 (周期, 数据源) 当前版本的共享内存
+    assert process_executor.stats()["inflight"] == 0
+    assert sorted(process_executor._segments) == sorted(s.version for s in jobs[2:])
+
+
+def test_replaced_version_is_released(process_executor, series):
+    deadline = time.time() + 60
+    process_executor.submit(series, PARAMS, "json", ("summary",), None, deadline).result(timeout=60)
+    newer = series[:-10]
+    newer.source = series.source
+    process_executor.submit(newer, PARAMS, "json", ("summary",), None, deadline).result(timeout=60)
+    assert list(process_executor._segments) == [newer.version]
+
+
+def test_queue_limit():
+    executor = BacktestExecutor(backend="thread", workers=1, max_queue=0)
+    try:
+        executor._inflight = 1
+        with pytest.raises(ExecutorBusy):
+            executor.submit(None, PARAMS, "json", ("summary",), None, time.time() + 1)
+        assert executor.stats()["rejected"] == 1
+    finally:
+        executor.shutdown()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""/api/btc_daily 预编码响应的压缩与 ETag"""
+import gzip
+import json
+
+import brotli
+
+from daily_payload import DailyPayloadCache, choose_encoding, etag_matches
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate, br") == "br"
+    assert choose_encoding("gzip, br;q=0") == "gzip"
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding(None) == "identity"
+
+
+def test_encodings_decode_to_same_body(series):
+    cache = DailyPayloadCache()
+    plain, encoding, etag = cache.get(series, 10, 400)
+    assert encoding == "identity"
+    data = json.loads(plain)["data"]
+    assert len(data) == 390
+    assert data[0]["date"] == series.iso_dates[10]
+
+    br, encoding, br_etag = cache.get(series, 10, 400, "br")
+    assert encoding == "br" and brotli.decompress(br) == plain
+    gz, encoding, _ = cache.get(series, 10, 400, "gzip")
+    assert encoding == "gzip" and gzip.decompress(gz) == plain
+    assert etag_matches(br_etag, etag)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""CSV 导入的解析与合并"""
+import numpy as np
+import pytest
+
+import data_import
+
+
+def _write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_csv_with_header_and_nulls(tmp_path):
+    path = _write(
+        tmp_path,
+        "daily.csv",
+        "Date,Open,High,Low,Close,Volume\n"
+        "2024-01-01,1,2,0.5,1.5,100\n"
+        "2024-01-02,null,2,1,1.8,\n"
+        "2024-01-03,1.8,2.5,1.7,2.2,300\n",
+    )
+    columns = data_import.read_columns(path, "1d")
+    assert columns["date"].tolist() == [19723, 19724, 19725]
+    assert columns["close"].tolist() == [1.5, 1.8, 2.2]
+    assert np.isnan(columns["open"][1]) and np.isnan(columns["volume"][1])
+
+
+def test_headerless_binance_over_small_chunks(tmp_path):
+    start_ms = 1_704_067_200_000
+    lines = [f"{start_ms + i * 60_000},{i + 1},{i + 2},{i},{i + 1.5},{i * 10},0,0" for i in range(500)]
+    path = _write(tmp_path, "klines.csv", "\n".join(lines) + "\n")
+    columns = data_import.read_columns(path, "1m", chunk_bytes=1024)
+    assert columns["date"].shape[0] == 500
+    np.testing.assert_array_equal(columns["date"], 1_704_067_200 + 60 * np.arange(500))
+    np.testing.assert_array_equal(columns["close"], np.arange(500) + 1.5)
+
+
+def test_iso_with_timezone_and_price_only(tmp_path):
+    path = _write(tmp_path, "price.csv", "timestamp,price\n2024-01-01T00:00:00Z,10\n2024-01-01T01:00:00+00:00,11\n")
+    columns = data_import.read_columns(path, "1h")
+    assert columns["date"].tolist() == [1_704_067_200, 1_704_070_800]
+    assert np.isnan(columns["open"]).all()
+
+
+def test_errors(tmp_path):
+    with pytest.raises(ValueError):
+        data_import.read_columns(_write(tmp_path, "empty.csv", ""), "1d")
+    with pytest.raises(ValueError):
+        data_import.read_columns(_write(tmp_path, "nodate.csv", "open,close\n1,2\n"), "1d")
+    with pytest.raises(ValueError):
+        data_import.detect_format("prices.csv", "xlsx")
+    with pytest.raises(ValueError):
+        data_import.import_file(_write(tmp_path, "a.csv", "date,close\n2024-01-01,1\n"), timeframe="4h")
+
+
+def test_import_merges_with_stored_data(tmp_path):
+    first = _write(tmp_path, "a.csv", "date,close\n2024-01-01,10\n2024-01-02,11\n")
+    second = _write(tmp_path, "b.csv", "date,close\n2024-01-02,12\n2024-01-03,13\n")
+    _, _, info = data_import.import_file(first, timeframe="15m", source="binance")
+    assert info["added"] == 2
+    series, report, info = data_import.import_file(second, timeframe="15m", source="binance")
+    assert info["added"] == 1 and info["rows"] == 3
+    assert series.close.tolist() == [10, 12, 13]
+    # 只有收盘价的文件由校验推算开/高/低价并计入报告（已存储的K线在第一次导入时已补全）
+    assert report["filled"]["open"] == 2
+
+
+@pytest.fixture
+def import_client(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import backend
+
+    received = {}
+
+    def fake_import(path, timeframe, source, fmt):
+        with open(path, "rb") as f:
+            received["body"] = f.read()
+        return {"rows": 1, "timeframe": timeframe}
+
+    monkeypatch.setattr(backend, "IMPORT_TOKEN", "secret")
+    monkeypatch.setattr(backend, "IMPORT_WRITE_BYTES", 16)
+    monkeypatch.setattr(backend, "import_history", fake_import)
+    return TestClient(backend.app), received
+
+
+def test_import_endpoint_requires_token(import_client, monkeypatch):
+    import backend
+
+    client, received = import_client
+    body = b"date,close\n2024-01-01,1\n"
+    assert client.post("/api/data/import", content=body).status_code == 403
+    assert client.post("/api/data/import", content=body, headers={"X-Import-Token": "wrong"}).status_code == 403
+    monkeypatch.setattr(backend, "IMPORT_TOKEN", "")
+    assert client.post("/api/data/import", content=body, headers={"X-Import-Token": ""}).status_code == 403
+    assert received == {}
+
+
+def test_import_endpoint_streams_body_and_limits_size(import_client, monkeypatch):
+    import backend
+
+    client, received = import_client
+    body = "date,close\n" + "".join(f"2024-01-{d:02d},{d}\n" for d in range(1, 29))
+    resp = client.post("/api/data/import", content=body.encode(), headers={"X-Import-Token": "secret"})
+    assert resp.status_code == 200
+    assert received["body"] == body.encode()
+
+    monkeypatch.setattr(backend, "IMPORT_MAX_BYTES", 100)
+    received.clear()
+
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 50
+
+    resp = client.post("/api/data/import", content=chunks(), headers={"X-Import-Token": "secret"})
+    assert resp.status_code == 413
+    resp = client.post("/api/data/import", content=body.encode(), headers={"X-Import-Token": "secret"})
+    assert resp.status_code == 413
+    assert received == {}
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""K线校验与清洗"""
+import numpy as np
+import pytest
+
+from data_quality import validate_columns, validate_series
+
+
+def _columns(date, close, **overrides):
+    close = np.asarray(close, dtype=float)
+    columns = {
+        "date": np.asarray(date, dtype=np.int64),
+        "open": close.copy(),
+        "high": close + 1,
+        "low": close - 1,
+        "close": close,
+        "volume": np.ones(close.shape[0]),
+    }
+    columns.update({k: np.asarray(v, dtype=float) for k, v in overrides.items()})
+    return columns
+
+
+def test_clean_data_is_ok(series):
+    cleaned, report = validate_series(series)
+    assert report["ok"]
+    assert report["rows_in"] == report["rows_out"] == len(series)
+    np.testing.assert_array_equal(cleaned.close, series.close)
+
+
+def test_sorts_and_keeps_last_duplicate():
+    series, report = validate_columns(_columns([3, 1, 2, 1], [30, 10, 20, 11]))
+    assert series.date.tolist() == [1, 2, 3]
+    assert series.close.tolist() == [11, 20, 30]
+    assert report["duplicates"]["count"] == 1
+    assert report["duplicates"]["dates"] == ["1970-01-02"]
+    assert not report["ok"]
+
+
+def test_invalid_last_duplicate_keeps_earlier_valid_row():
+    series, report = validate_columns(_columns([1, 1, 1, 2, 2], [10, 11, np.nan, 20, -1]))
+    assert series.date.tolist() == [1, 2]
+    assert series.close.tolist() == [11, 20]
+    assert report["invalid_close"]["count"] == 2
+    assert report["duplicates"]["count"] == 1
+    assert report["rows_out"] == 2
+
+
+def test_drops_invalid_close_and_fills_fields():
+    columns = _columns(
+        [0, 1, 2, 3],
+        [10, np.nan, 12, -1],
+        open=[np.nan, 11, 11, 12],
+        high=[np.nan, 12, 13, 13],
+        volume=[1, 1, -5, 1],
+    )
+    series, report = validate_columns(columns)
+    assert series.date.tolist() == [0, 2]
+    assert report["invalid_close"]["count"] == 2
+    assert report["filled"] == {"open": 1, "high": 1, "low": 0, "volume": 1}
+    assert series.open[0] == 10 and series.high[0] == 10
+    assert series.volume[1] == 0
+
+
+def test_fixes_inconsistent_ohlc():
+    series, report = validate_columns(_columns([0, 1], [10, 10], high=[9, 11], low=[8, 12]))
+    assert report["ohlc_inconsistent"]["count"] == 2
+    assert (series.high >= np.maximum(series.open, series.close)).all()
+    assert (series.low <= np.minimum(series.open, series.close)).all()
+
+
+def test_gaps_outliers_and_forward_fill():
+    columns = _columns([0, 1, 5, 6], [10, 10, 30, 30])
+    series, report = validate_columns(columns)
+    assert report["gaps"]["count"] == 1 and report["gaps"]["missing_bars"] == 3
+    assert report["outliers"]["count"] == 1
+    assert len(series) == 4
+
+    filled, report = validate_columns(columns, fill_gaps=True)
+    assert filled.date.tolist() == list(range(7))
+    assert filled.close.tolist() == [10, 10, 10, 10, 10, 30, 30]
+    assert filled.volume[2:5].tolist() == [0, 0, 0]
+    assert report["forward_filled"] == 3
+
+
+def test_intraday_misaligned():
+    _, report = validate_columns(_columns([0, 3600, 7230], [1, 1, 1]), timeframe="1h")
+    assert report["misaligned"]["count"] == 1
+    assert report["gaps"]["count"] == 0
+
+
+def test_all_invalid_raises():
+    with pytest.raises(ValueError):
+        validate_columns(_columns([0, 1], [np.nan, 0]))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""在线数据源下载：对冲、截止时间、分页并发（对带延迟/故障注入的模拟数据源）"""
+import asyncio
+import datetime
+import time
+
+import httpx
+import numpy as np
+import pytest
+
+import data_sources
+from conftest import run_mock_sources
+
+
+@pytest.fixture(scope="module")
+def faulty_sources():
+    """Yahoo 每个请求延迟 3 秒、CoinGecko 总是返回 503 的模拟数据源"""
+    with run_mock_sources(MOCK_DELAY="yahoo=3", MOCK_FAIL="coingecko", MOCK_END_DATE="2025-06-30") as url:
+        yield url
+
+
+@pytest.fixture
+def sources(faulty_sources, monkeypatch):
+    for name in ("yahoo", "binance", "coingecko"):
+        monkeypatch.setitem(data_sources.SOURCE_URLS, name, f"{faulty_sources}/{name}")
+    return faulty_sources
+
+
+def _run(func):
+    async def main():
+        async with httpx.AsyncClient() as client:
+            return await func(client)
+
+    return asyncio.run(main())
+
+
+def test_hedge_starts_next_source_after_delay(sources):
+    started = time.monotonic()
+    source, rows = _run(lambda c: data_sources.fetch_hedged(c, ["yahoo", "binance"], hedge_delay=0.2))
+    assert source == "binance" and rows
+    # 慢的 Yahoo 被取消，不必等它的 3 秒
+    assert time.monotonic() - started < 2.5
+
+
+def test_failed_source_launches_next_without_waiting(sources):
+    started = time.monotonic()
+    source, _ = _run(lambda c: data_sources.fetch_hedged(c, ["coingecko", "binance"], hedge_delay=30))
+    assert source == "binance"
+    assert time.monotonic() - started < 10
+
+
+def test_all_sources_failing_reports_each_error(sources, monkeypatch):
+    monkeypatch.setitem(data_sources.SOURCE_DEADLINES, "yahoo", 0.3)
+    with pytest.raises(RuntimeError) as info:
+        _run(lambda c: data_sources.fetch_hedged(c, ["coingecko", "yahoo"], hedge_delay=0.1))
+    assert "CoinGecko" in str(info.value) and "Yahoo Finance" in str(info.value)
+
+
+def test_deadline(sources, monkeypatch):
+    monkeypatch.setitem(data_sources.SOURCE_DEADLINES, "yahoo", 0.3)
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="0.3 秒"):
+        _run(lambda c: data_sources.fetch_source(c, "yahoo"))
+    assert time.monotonic() - started < 2.5
+
+
+def test_binance_pagination_matches_single_page(sources, monkeypatch):
+    start = datetime.date(2024, 1, 1)
+    whole = _run(lambda c: data_sources.fetch_source(c, "binance", start))
+    monkeypatch.setattr(data_sources, "BINANCE_PAGE_LIMIT", 30)
+    paged = _run(lambda c: data_sources.fetch_source(c, "binance", start))
+    assert paged == whole
+    dates = [r["date"] for r in paged]
+    assert dates == sorted(set(dates)) and len(dates) > 30 * 10
+    assert dates[-1] == datetime.date(2025, 6, 30)
+
+
+def test_binance_intraday_pagination(sources, monkeypatch):
+    monkeypatch.setattr(data_sources, "BINANCE_PAGE_LIMIT", 50)
+    start = int(datetime.datetime(2025, 6, 1, tzinfo=datetime.timezone.utc).timestamp())
+    end = start + 10 * 86400
+    columns = _run(lambda c: data_sources.fetch_intraday(c, "binance", "1h", start, end))
+    np.testing.assert_array_equal(columns["date"], start + 3600 * np.arange(240))
+    assert np.isfinite(columns["close"]).all()
+
+
+def test_failed_page_cancels_sibling_pages(monkeypatch):
+    monkeypatch.setattr(data_sources, "BINANCE_PAGE_LIMIT", 10)
+    monkeypatch.setattr(data_sources, "BINANCE_MIN_INTERVAL", 0.0)
+    cancelled = []
+
+    async def handler(request):
+        if request.url.params["startTime"] == str(1_700_006_400_000):
+            return httpx.Response(503)
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(request.url.params["startTime"])
+            raise
+        return httpx.Response(200, json=[])
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            start = 1_700_006_400 - 3 * 36000
+            with pytest.raises(RuntimeError, match="HTTP 503"):
+                await data_sources._fetch_binance_intraday(client, "1h", start, start + 6 * 36000)
+            # 出错返回时其余分页（进行中的和等待限速的）已被取消，不在后台继续运行
+            assert len(cancelled) >= 3
+            assert all(t.done() for t in asyncio.all_tasks() if t is not asyncio.current_task())
+
+    started = time.monotonic()
+    asyncio.run(main())
+    assert time.monotonic() - started < 5
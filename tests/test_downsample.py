@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""LTTB 降采样与回测结果的 fields= / max_points= 裁剪"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from downsample import lttb_indices
+from strategy_engine import run_double_ma_strategy
+
+
+def _naive_lttb(y, max_points):
+    """逐桶直译的 LTTB（桶边界与 lttb_indices 相同）"""
+    n = len(y)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(int)
+    picked = [0]
+    for b in range(max_points - 2):
+        if b + 2 < max_points - 1:
+            nxt = range(edges[b + 1], edges[b + 2])
+            avg_x, avg_y = sum(nxt) / len(nxt), sum(y[i] for i in nxt) / len(nxt)
+        else:
+            avg_x, avg_y = n - 1, y[n - 1]
+        a = picked[-1]
+        best = max(
+            range(edges[b], edges[b + 1]),
+            key=lambda i: abs((a - avg_x) * (y[i] - y[a]) - (a - i) * (avg_y - y[a])),
+        )
+        picked.append(best)
+    return picked + [n - 1]
+
+
+@pytest.mark.parametrize("n, max_points", [(1000, 3), (1000, 50), (1001, 999), (37, 10)])
+def test_lttb_keeps_endpoints_and_limit(n, max_points):
+    y = np.cumsum(np.random.default_rng(n).normal(size=n))
+    idx = lttb_indices(y, max_points)
+    assert len(idx) == max_points
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert (np.diff(idx) > 0).all()
+    assert idx.tolist() == _naive_lttb(y.tolist(), max_points)
+
+
+def test_lttb_keeps_spike_and_short_input():
+    y = np.zeros(500)
+    y[123] = 10.0
+    assert 123 in lttb_indices(y, 20)
+    assert lttb_indices(y[:5], 10).tolist() == list(range(5))
+    with pytest.raises(ValueError):
+        lttb_indices(y, 2)
+
+
+def test_strategy_max_points_and_fields(series):
+    full = run_double_ma_strategy(series, 5, 20)["equity_curve"]
+    small = run_double_ma_strategy(series, 5, 20, max_points=100, layout="columns")["equity_curve"]
+    assert len(small["date"]) == 100
+    assert small["date"][0] == full[0]["date"] and small["date"][-1] == full[-1]["date"]
+
+    summary_only = run_double_ma_strategy(series, 5, 20, fields=("summary",))
+    assert "summary" in summary_only
+    assert "equity_curve" not in summary_only and "trades" not in summary_only
+    with pytest.raises(ValueError):
+        run_double_ma_strategy(series, 5, 20, fields=("summary", "positions"))
+
+
+def test_endpoint_rejects_unknown_fields_and_small_max_points(monkeypatch, series):
+    import backend
+
+    monkeypatch.setattr(backend, "load_price_series", lambda timeframe="1d": series)
+    client = TestClient(backend.app)
+    resp = client.get("/api/backtest/double_ma", params={"short": 5, "long": 20, "fields": "summary,foo"})
+    assert resp.status_code == 400 and "fields" in resp.json()["detail"]
+    resp = client.get("/api/backtest/double_ma", params={"short": 5, "long": 20, "max_points": 2})
+    assert resp.status_code == 422
+    resp = client.get(
+        "/api/backtest/double_ma", params={"short": 5, "long": 20, "fields": "curve", "max_points": 50}
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert set(body) - {"strategy", "params"} == {"equity_curve"}
+    assert len(body["equity_curve"]) == 50
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""向量化指标与逐点的朴素实现对比"""
+import numpy as np
+import pytest
+
+from indicators import IndicatorCache, atr, ema, rolling_std, rsi, sma, wma
+
+
+@pytest.fixture
+def close():
+    rng = np.random.default_rng(3)
+    return 10000.0 * np.exp(np.cumsum(rng.normal(0.0, 0.02, 500)))
+
+
+def _naive_window(values, window, fn):
+    out = np.full(values.shape[0], np.nan)
+    for t in range(window - 1, values.shape[0]):
+        out[t] = fn(values[t - window + 1:t + 1])
+    return out
+
+
+def _naive_ewm(values, window, alpha):
+    out = np.full(values.shape[0], np.nan)
+    out[window - 1] = values[:window].mean()
+    for t in range(window, values.shape[0]):
+        out[t] = alpha * values[t] + (1 - alpha) * out[t - 1]
+    return out
+
+
+@pytest.mark.parametrize("window", [1, 2, 5, 20, 200])
+def test_rolling_windows(close, window):
+    np.testing.assert_allclose(sma(close, window), _naive_window(close, window, np.mean), rtol=1e-10)
+    weights = np.arange(1, window + 1)
+    np.testing.assert_allclose(
+        wma(close, window), _naive_window(close, window, lambda w: (w * weights).sum() / weights.sum()), rtol=1e-10
+    )
+    np.testing.assert_allclose(rolling_std(close, window), _naive_window(close, window, np.std), rtol=1e-6, atol=1e-6)
+
+
+@pytest.mark.parametrize("span", [2, 12, 26])
+def test_ema(close, span):
+    np.testing.assert_allclose(ema(close, span), _naive_ewm(close, span, 2.0 / (span + 1)), rtol=1e-10)
+
+
+def test_atr_and_rsi(close):
+    high, low = close * 1.01, close * 0.99
+    tr = high - low
+    tr[1:] = np.maximum(tr[1:], np.maximum(np.abs(high[1:] - close[:-1]), np.abs(low[1:] - close[:-1])))
+    np.testing.assert_allclose(atr(high, low, close, 14), _naive_ewm(tr, 14, 1 / 14), rtol=1e-10)
+
+    diff = np.diff(close)
+    gain = _naive_ewm(np.maximum(diff, 0), 14, 1 / 14)
+    loss = _naive_ewm(np.maximum(-diff, 0), 14, 1 / 14)
+    expected = np.full(close.shape[0], np.nan)
+    expected[1:] = 100 - 100 / (1 + gain / loss)
+    np.testing.assert_allclose(rsi(close, 14), expected, rtol=1e-10)
+
+
+def test_window_longer_than_series(close):
+    assert np.isnan(sma(close[:5], 10)).all()
+    with pytest.raises(ValueError):
+        sma(close, 0)
+
+
+def test_cache_returns_same_readonly_array(series):
+    cache = IndicatorCache(series)
+    first = cache.sma(20)
+    assert cache.sma(20) is first
+    assert not first.flags.writeable
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""日内K线按月分区存储：读写往返、增量重写、损坏分区与日期范围"""
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+import intraday_store
+from price_series import PriceSeries
+
+# 2024-01-30 00:00 UTC 起的 1h K线，跨 1/2/3 三个月
+START = 1_706_572_800
+
+
+def _hourly(n, close_offset=0.0):
+    date = START + 3600 * np.arange(n)
+    close = 100.0 + np.arange(n) + close_offset
+    return PriceSeries(date, close, close + 1, close - 1, close, np.ones(n), source="binance", timeframe="1h")
+
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(intraday_store, "INTRADAY_DIR", str(tmp_path))
+    return tmp_path
+
+
+def _months(store_dir):
+    return sorted(os.listdir(store_dir / "binance" / "1h"))
+
+
+def test_round_trip(store_dir):
+    series = _hourly(24 * 40)
+    assert intraday_store.write_series("binance", series) == 3
+    assert _months(store_dir) == ["2024-01.npy", "2024-02.npy", "2024-03.npy", "meta.json"]
+    loaded = intraday_store.load_series("binance", "1h")
+    assert loaded.timeframe == "1h"
+    for name, column in series.columns().items():
+        np.testing.assert_array_equal(getattr(loaded, name), column)
+    meta = intraday_store.read_meta("binance", "1h")
+    assert meta["rows"] == len(series) and meta["last_time"] == int(series.date[-1])
+
+
+def test_since_rewrites_only_later_months(store_dir):
+    intraday_store.write_series("binance", _hourly(24 * 40))
+    first = store_dir / "binance" / "1h" / "2024-01.npy"
+    before = first.stat().st_mtime_ns
+    updated = _hourly(24 * 40, close_offset=1000.0)
+    since = int(updated.date[-1])
+    assert intraday_store.write_series("binance", updated, since=since) == 1
+    assert first.stat().st_mtime_ns == before
+    loaded = intraday_store.load_series("binance", "1h")
+    march = loaded.date >= int(np.datetime64("2024-03-01", "s").astype(np.int64))
+    assert march.any() and (loaded.close[march] >= 1000).all()
+    assert (loaded.close[~march] < 1000).all()
+
+
+def test_corrupt_partition_is_skipped(store_dir, capsys):
+    series = _hourly(24 * 40)
+    intraday_store.write_series("binance", series)
+    (store_dir / "binance" / "1h" / "2024-02.npy").write_bytes(b"not a numpy file")
+    np.save(store_dir / "binance" / "1h" / "2024-03.npy", np.zeros((2, 3)))
+    loaded = intraday_store.load_series("binance", "1h")
+    # 只剩 2024-02-01 之前的一月分区
+    assert loaded.date.tolist() == series.date[series.date < 1_706_745_600].tolist()
+    out = capsys.readouterr().out
+    assert out.count("[WARN]") == 2
+
+
+def test_start_end_slicing():
+    series = _hourly(24 * 40)
+    intraday_store.write_series("binance", series)
+    loaded = intraday_store.load_series(
+        "binance", "1h", start=datetime.date(2024, 2, 5), end=datetime.date(2024, 2, 6)
+    )
+    assert loaded.iso_dates[0] == "2024-02-05T00:00"
+    assert loaded.iso_dates[-1] == "2024-02-06T23:00"
+    assert len(loaded) == 48
+    assert intraday_store.load_series("binance", "1h", start=datetime.date(2025, 1, 1)) is None
+    assert intraday_store.load_series("binance", "15m") is None
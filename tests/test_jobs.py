@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""后台任务：结果存储与分页排序、与单次回测一致、重启后恢复未完成的任务"""
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from jobs import JobRunner, JobStore
+from strategy_engine import run_double_ma_strategy
+from sweep import rank_results
+
+
+def _items(values):
+    return [
+        (idx, {"params": {"short": idx}, "summary": {"sharpe_ratio": v, "profit_factor": 1.0}})
+        for idx, v in enumerate(values)
+    ]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+def test_ranked_pages_match_rank_results(store):
+    values = [0.5, None, 2.0, -1.0, 2.0, None, 0.1]
+    job_id = store.create("sweep", {}, len(values))
+    store.add_results(job_id, _items(values))
+    for descending in (True, False):
+        expected = rank_results([r for _, r in _items(values)], "sharpe_ratio", descending)
+        pages = []
+        for offset in range(0, len(values), 3):
+            total, page = store.ranked_results(job_id, "sharpe_ratio", descending, offset, 3)
+            assert total == len(values)
+            pages.extend(page)
+        assert [(r["params"], r["rank"]) for r in pages] == [(r["params"], r["rank"]) for r in expected]
+
+
+def test_rejects_unknown_metric(store):
+    with pytest.raises(ValueError):
+        store.ranked_results("x", "result; DROP TABLE jobs")
+
+
+def test_old_database_is_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE job_results (job_id TEXT NOT NULL, idx INTEGER NOT NULL, result TEXT NOT NULL,"
+        " PRIMARY KEY (job_id, idx));"
+    )
+    with conn:
+        conn.executemany(
+            "INSERT INTO job_results VALUES (?, ?, ?)",
+            [("j", idx, json.dumps(result)) for idx, result in _items([1.0, 3.0, 2.0])],
+        )
+    conn.close()
+    total, page = JobStore(path).ranked_results("j", "sharpe_ratio", limit=2)
+    assert total == 3
+    assert [r["summary"]["sharpe_ratio"] for r in page] == [3.0, 2.0]
+
+
+def _wait(runner, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = runner.status(job_id)
+        if status["status"] not in ("queued", "running"):
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"任务 {job_id} 未在 {timeout} 秒内结束")
+
+
+RANGES = dict(short="5:15:5", long="20,40", stop_loss_pct="0,5", take_profit_pct="0", fee_rate="0.001", slippage_rate="0")
+
+
+def test_sweep_job_matches_single_backtests(store, series):
+    runner = JobRunner(store, load_series=lambda timeframe: series)
+    runner.start()
+    try:
+        job = runner.submit("sweep", {"ranges": RANGES, "initial_capital": 10000.0})
+        assert _wait(runner, job["id"])["status"] == "done"
+    finally:
+        runner.stop()
+    results = store.results(job["id"])
+    assert len(results) == job["total"] == 12
+    for item in results:
+        single = run_double_ma_strategy(series, **item["params"], fields=("summary",))["summary"]
+        assert item["summary"] == single
+
+
+def test_running_job_of_dead_process_is_resumed(store, series):
+    # 一个已退出的本机进程的 PID 作为原执行者
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    host = socket.gethostname()
+    orphan = store.create("sweep", {"ranges": RANGES, "initial_capital": 10000.0}, 12)
+    assert store.claim(orphan, f"{host}:{dead.pid}")
+    store.set_data_version(orphan, series.version)
+    sentinel = {"params": {"marker": True}, "summary": {"sharpe_ratio": 99.0}}
+    store.add_results(orphan, [(0, sentinel)])
+    # 执行者仍在运行的任务不被接管
+    alive = store.create("sweep", {"ranges": RANGES, "initial_capital": 10000.0}, 12)
+    assert store.claim(alive, f"{host}:{os.getppid()}")
+
+    runner = JobRunner(store, load_series=lambda timeframe: series)
+    runner.start()
+    try:
+        status = _wait(runner, orphan)
+    finally:
+        runner.stop()
+    assert status["status"] == "done" and status["completed"] == 12
+    # 已保存的进度保留，只计算剩余的组合
+    assert store.results(orphan)[0] == sentinel
+    assert store.get(alive)["status"] == "running"
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""增量策略状态：与批量回测一致、快照恢复，以及客户端快照的校验"""
+import datetime
+import json
+import math
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from live_strategy import DoubleMAState
+from price_series import PriceSeries
+from strategy_engine import run_double_ma_strategy
+
+PARAMS = dict(short=5, long=20, stop_loss_pct=4.0, take_profit_pct=15.0)
+
+
+def _assert_summary_equal(live, batch):
+    assert live.keys() == batch.keys()
+    for key, value in batch.items():
+        if value is None or live[key] is None:
+            assert live[key] == value, key
+        else:
+            assert math.isclose(live[key], value, rel_tol=1e-9, abs_tol=1e-9), key
+
+
+def test_incremental_matches_batch(series):
+    batch = run_double_ma_strategy(series, **PARAMS)
+    state = DoubleMAState.from_history(series, **PARAMS)
+    assert math.isclose(state.equity, batch["equity_curve"][-1]["equity"], rel_tol=1e-12)
+    assert state.num_trades == len(batch["trades"])
+    _assert_summary_equal(state.current()["summary"], batch["summary"])
+
+
+def test_snapshot_restore_continues_like_batch(series):
+    split = 500
+    state = DoubleMAState.from_history(series[:split], **PARAMS)
+    snapshot = json.loads(json.dumps(state.snapshot()))
+    restored = DoubleMAState.restore(snapshot)
+    restored.advance(series, split)
+    full = DoubleMAState.from_history(series, **PARAMS)
+    assert restored.snapshot() == full.snapshot()
+    _assert_summary_equal(restored.current()["summary"], run_double_ma_strategy(series, **PARAMS)["summary"])
+
+
+@pytest.fixture
+def snapshot(series):
+    return json.loads(json.dumps(DoubleMAState.from_history(series[:300], **PARAMS).snapshot()))
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"short": 2, "long": 1000000000},
+        {"short": 1, "long": 20},
+        {"short": 5, "long": 20, "fee_rate": 0.5},
+        {"short": 5, "long": 20, "stop_loss_pct": -1},
+        {"short": 5, "long": 20, "take_profit_pct": 1000},
+        {"short": 5, "long": 20, "initial_capital": 0},
+        {"short": 5.5, "long": 20},
+        {"short": "5", "long": 20},
+        {"short": 5, "long": 20, "unknown": 1},
+        {"long": 20},
+    ],
+)
+def test_restore_rejects_invalid_params(snapshot, params):
+    snapshot["params"] = params
+    with pytest.raises(ValueError):
+        DoubleMAState.restore(snapshot)
+
+
+def test_restore_rejects_invalid_position(snapshot):
+    for position, entry_price in ((2, 100.0), (True, 100.0), (1, None), (1, "100"), (1, float("inf"))):
+        bad = dict(snapshot, position=position, entry_price=entry_price, entry_date="2020-01-01")
+        with pytest.raises(ValueError):
+            DoubleMAState.restore(bad)
+
+
+def test_update_endpoint_returns_400_for_huge_window(snapshot):
+    import backend
+
+    client = TestClient(backend.app)
+    snapshot["params"] = {"short": 2, "long": 1000000000}
+    resp = client.post("/api/live/double_ma/update", json={"snapshot": snapshot, "bars": []})
+    assert resp.status_code == 400
+    assert "long" in resp.json()["detail"]
+
+
+def _bars(closes):
+    start = datetime.date(2024, 1, 1)
+    return [((start + datetime.timedelta(days=i)).isoformat(), c) for i, c in enumerate(closes)]
+
+
+def test_exit_reason_matches_batch_on_stop_and_signal_flip():
+    # 第 4 根K线收盘后短均线上穿，第 5 根按 70 入场且收盘后信号即转空；
+    # 第 6 根收盘 60 同时触及止损（70 × 95% = 66.5）和信号平仓，两边都应记为止损
+    closes = [100.0, 100.0, 100.0, 130.0, 70.0, 60.0, 60.0]
+    params = dict(short=2, long=3, stop_loss_pct=5.0)
+    bars = _bars(closes)
+    days = np.array([np.datetime64(d, "D").astype(np.int64) for d, _ in bars])
+    prices = np.array(closes)
+    series = PriceSeries(days, prices, prices, prices, prices, np.zeros(len(closes)))
+    trades = run_double_ma_strategy(series, **params)["trades"]
+    assert len(trades) == 1 and trades[0]["exit_reason"] == "stop_loss"
+
+    state = DoubleMAState(**params)
+    for date, close in bars[:5]:
+        state.update(date, close)
+    assert state.position == 1 and not state.signal
+    for date, close in bars[5:]:
+        state.update(date, close)
+    assert state.last_trade == trades[0]
+
+
+def test_trades_match_batch(series):
+    batch = run_double_ma_strategy(series, **PARAMS)["trades"]
+    state = DoubleMAState(**PARAMS)
+    live = []
+    for date, close in zip(series.iso_dates, series.close.tolist()):
+        before = state.num_trades
+        state.update(date, close)
+        if state.num_trades > before:
+            live.append(state.last_trade)
+    assert live == batch
+
+
+@pytest.fixture
+def hourly(series):
+    start = 1_704_067_200
+    date = start + 3600 * np.arange(len(series))
+    return PriceSeries(date, series.open, series.high, series.low, series.close, series.volume, timeframe="1h")
+
+
+def test_intraday_matches_batch(hourly):
+    state = DoubleMAState.from_history(hourly, **PARAMS)
+    assert state.timeframe == "1h" and state.last_date == hourly.iso_dates[-1]
+    _assert_summary_equal(state.current()["summary"], run_double_ma_strategy(hourly, **PARAMS)["summary"])
+
+    split = DoubleMAState.from_history(hourly[:500], **PARAMS)
+    restored = DoubleMAState.restore(json.loads(json.dumps(split.snapshot())))
+    assert restored.catch_up(hourly)
+    assert restored.snapshot() == state.snapshot()
+
+
+def test_cache_is_keyed_by_timeframe(series, hourly):
+    from live_strategy import LiveStateCache
+
+    cache = LiveStateCache()
+    daily = cache.get(series, **PARAMS)["current"]
+    intraday = cache.get(hourly, **PARAMS)["current"]
+    assert daily["date"] == series.iso_dates[-1]
+    assert intraday["date"] == hourly.iso_dates[-1]
+    assert daily["summary"] != intraday["summary"]
+
+
+def test_signal_endpoint_accepts_timeframe(monkeypatch, hourly):
+    import backend
+
+    monkeypatch.setattr(backend, "load_price_series", lambda timeframe="1d": hourly if timeframe == "1h" else None)
+    client = TestClient(backend.app)
+    resp = client.get("/api/live/double_ma/signal", params=dict(PARAMS, timeframe="1h"))
+    assert resp.status_code == 200
+    assert resp.json()["date"] == hourly.iso_dates[-1]
+
+
+def test_cache_snapshot_is_optional_and_rebuild_is_per_key(series, monkeypatch):
+    import threading
+    import time
+
+    from live_strategy import LiveStateCache
+
+    cache = LiveStateCache()
+    assert "snapshot" not in cache.get(series, **PARAMS)
+    assert cache.get(series, with_snapshot=True, **PARAMS)["snapshot"]["params"]["short"] == PARAMS["short"]
+
+    # 同一参数的并发冷启动只重建一次；重建期间其它参数的请求不被阻塞
+    builds = []
+    slow = threading.Event()
+    original = DoubleMAState.from_history.__func__
+
+    def from_history(cls, data, **params):
+        builds.append(params["short"])
+        if params["short"] == 7:
+            slow.wait(5)
+        return original(cls, data, **params)
+
+    monkeypatch.setattr(DoubleMAState, "from_history", classmethod(from_history))
+    cache = LiveStateCache()
+    threads = [threading.Thread(target=cache.get, args=(series,), kwargs=dict(PARAMS, short=7)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.1)
+    assert cache.get(series, **PARAMS)["current"]["date"] == series.iso_dates[-1]
+    slow.set()
+    for t in threads:
+        t.join()
+    assert sorted(builds) == [5, 7]
+
+
+def test_live_endpoints_return_500_on_unexpected_error(monkeypatch, series, snapshot):
+    import backend
+
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    client = TestClient(backend.app)
+    monkeypatch.setattr(backend, "load_price_series", lambda timeframe="1d": series)
+    monkeypatch.setattr(backend._live_states, "get", broken)
+    resp = client.get("/api/live/double_ma/signal", params=PARAMS)
+    assert resp.status_code == 500 and "boom" in resp.json()["detail"]
+
+    monkeypatch.setattr(DoubleMAState, "current", broken)
+    resp = client.post("/api/live/double_ma/update", json={"snapshot": snapshot, "bars": []})
+    assert resp.status_code == 500 and "boom" in resp.json()["detail"]
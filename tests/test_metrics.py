@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""在线统计累加器：逐根与按块一致、状态序列化往返、按K线周期年化"""
+import json
+import math
+
+import numpy as np
+import pytest
+
+from metrics import PERIODS_PER_YEAR, MetricsAccumulator
+
+
+@pytest.fixture
+def equity():
+    rng = np.random.default_rng(5)
+    values = 10000.0 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, 600)))
+    # 资金归零的一段：前一根资金不为正的K线不计入收益率
+    values[300:305] = 0.0
+    return values
+
+
+def _assert_state_close(a, b):
+    da, db = a.to_dict(), b.to_dict()
+    assert da.keys() == db.keys()
+    for key, value in da.items():
+        if isinstance(value, float):
+            assert math.isclose(value, db[key], rel_tol=1e-9, abs_tol=1e-12), key
+        else:
+            assert value == db[key], key
+
+
+@pytest.mark.parametrize("splits", [[], [1], [2, 299, 303, 304], list(range(50, 600, 50))])
+def test_update_many_matches_update(equity, splits):
+    one_by_one = MetricsAccumulator(10000.0)
+    for day, value in enumerate(equity.tolist()):
+        one_by_one.update(value, day)
+    chunked = MetricsAccumulator(10000.0)
+    bounds = [0] + splits + [len(equity)]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        chunked.update_many(equity[lo:hi], lo, hi - 1)
+    _assert_state_close(chunked, one_by_one)
+    assert chunked.summary() == pytest.approx(one_by_one.summary(), rel=1e-9, nan_ok=True)
+
+
+def test_add_trades_matches_add_trade():
+    pnl = np.array([0.1, -0.05, 0.0, 0.2, -0.1])
+    entry = np.array([0.0, 3.0, 7.0, 7.0, 10.0])
+    exit_ = np.array([2.0, 3.0, 9.0, 8.5, 20.0])
+    single = MetricsAccumulator(1.0, bar_days=1.0)
+    for p, e, x in zip(pnl, entry, exit_):
+        single.add_trade(float(p), float(e), float(x))
+    batch = MetricsAccumulator(1.0, bar_days=1.0)
+    batch.add_trades(pnl, entry, exit_)
+    _assert_state_close(batch, single)
+    # 同日开平仓按一根K线（1 天）计
+    assert single.hold_sum == 2 + 1 + 2 + 1.5 + 10
+
+
+def test_summary_matches_direct_computation(equity):
+    acc = MetricsAccumulator(10000.0)
+    acc.update_many(equity, 0, len(equity) - 1)
+    summary = acc.summary()
+    peak = np.maximum.accumulate(equity)
+    assert summary["max_drawdown_pct"] == pytest.approx((equity / peak - 1).min() * 100)
+    assert summary["total_return_pct"] == pytest.approx((equity[-1] / 10000.0 - 1) * 100)
+    prev = equity[:-1]
+    returns = (equity[1:][prev > 0] - prev[prev > 0]) / prev[prev > 0]
+    assert summary["annualized_volatility_pct"] == pytest.approx(returns.std() * math.sqrt(PERIODS_PER_YEAR) * 100)
+    highs = [i for i in range(1, len(equity)) if equity[i] > peak[i - 1]]
+    gaps = np.diff([-1] + highs + [len(equity)]) - 1
+    assert summary["max_drawdown_duration"] == gaps.max()
+
+
+def test_state_round_trip(equity):
+    acc = MetricsAccumulator(10000.0, bar_days=1 / 24)
+    acc.update_many(equity[:400], 0, 399 / 24)
+    acc.add_trade(0.05, 1.0, 1.0)
+    restored = MetricsAccumulator.from_dict(json.loads(json.dumps(acc.to_dict())))
+    assert restored.to_dict() == acc.to_dict()
+    for accumulator in (acc, restored):
+        accumulator.update_many(equity[400:], 400 / 24, 599 / 24)
+        accumulator.add_trade(-0.02, 20.0, 20.0)
+    assert restored.summary() == acc.summary()
+    assert restored.bar_days == 1 / 24
+
+
+def test_bar_days_scales_annualization(equity):
+    daily = MetricsAccumulator(10000.0)
+    daily.update_many(equity, 0, len(equity) - 1)
+    daily.add_trade(0.1, 5, 5)
+    hourly = MetricsAccumulator(10000.0, bar_days=1 / 24)
+    hourly.update_many(equity, 0, (len(equity) - 1) / 24)
+    hourly.add_trade(0.1, 5, 5)
+    d, h = daily.summary(), hourly.summary()
+    # 同样的逐根收益：每年的K线数多 24 倍，波动率年化系数大 sqrt(24)
+    assert h["annualized_volatility_pct"] == pytest.approx(d["annualized_volatility_pct"] * math.sqrt(24))
+    # 同样的总收益发生在 1/24 的时间里，年化收益更高
+    years = (len(equity) - 1) / 24 / 365.25
+    assert h["cagr_pct"] == pytest.approx(((equity[-1] / 10000.0) ** (1 / years) - 1) * 100)
+    assert h["max_drawdown_pct"] == d["max_drawdown_pct"]
+    # 同一根K线内开平仓的最短持仓按一根K线的时长计
+    assert d["avg_hold_days"] == 1.0 and h["avg_hold_days"] == pytest.approx(1 / 24)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""对模拟数据源的增量刷新"""
+import datetime
+
+from fastapi.testclient import TestClient
+
+from data_cache import load_cached, save_series
+import data_sources
+from price_series import PriceSeries
+
+
+def test_download_reaches_today(mock_sources):
+    start = datetime.date.today() - datetime.timedelta(days=10)
+    for source in ("yahoo", "binance"):
+        rows = data_sources.download(source, start_date=start)
+        assert rows[-1]["date"] == datetime.date.today(), source
+
+
+def test_refresh_appends_bars_after_cached_date(mock_sources):
+    import backend
+
+    full = data_sources.download("yahoo")
+    cutoff = datetime.date(2025, 12, 1)
+    stale = [r for r in full if r["date"] <= cutoff]
+    save_series("yahoo", PriceSeries.from_rows(stale, source="yahoo"))
+
+    with TestClient(backend.app) as client:
+        resp = client.post("/api/data/refresh")
+    assert resp.status_code == 200, resp.text
+    body = resp.json()
+    assert body["source"] == "yahoo"
+    assert body["added"] == len(full) - len(stale) > 0
+    assert body["last_date"] == datetime.date.today().isoformat()
+    assert load_cached(("yahoo",), max_age_hours=None)[1].last_date == datetime.date.today()
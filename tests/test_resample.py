@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""重采样与按周期分组的朴素聚合对比"""
+import datetime
+
+import numpy as np
+import pytest
+
+from price_series import PriceSeries
+from resample import base_timeframe, resample, resampled
+
+
+def _naive(series, key):
+    """逐行分组聚合，返回 {组键: (open, high, low, close, volume)}"""
+    groups = {}
+    for i in range(len(series)):
+        k = key(int(series.date[i]))
+        if k not in groups:
+            groups[k] = [series.open[i], series.high[i], series.low[i], series.close[i], series.volume[i]]
+        else:
+            g = groups[k]
+            g[1] = max(g[1], series.high[i])
+            g[2] = min(g[2], series.low[i])
+            g[3] = series.close[i]
+            g[4] += series.volume[i]
+    return groups
+
+
+def _assert_matches(result, groups):
+    assert len(result) == len(groups)
+    for i, values in enumerate(groups.values()):
+        np.testing.assert_allclose(
+            [result.open[i], result.high[i], result.low[i], result.close[i], result.volume[i]], values, rtol=1e-12
+        )
+
+
+def test_base_timeframe():
+    assert base_timeframe("4h") == "1h"
+    assert base_timeframe("30m") == "15m"
+    assert base_timeframe("5m") == "1m"
+    assert base_timeframe("1w") == "1d"
+    assert base_timeframe("1d") == "1d"
+
+
+def test_weekly_buckets_start_on_monday(series):
+    weekly = resample(series, "1w")
+    epoch = datetime.date(1970, 1, 1)
+    assert all((epoch + datetime.timedelta(days=int(d))).weekday() == 0 for d in weekly.date[1:])
+    groups = _naive(series, lambda d: (epoch + datetime.timedelta(days=d)).isocalendar()[:2])
+    _assert_matches(weekly, groups)
+    assert weekly.timeframe == "1w"
+
+
+def test_daily_multiples(series):
+    _assert_matches(resample(series, "3d"), _naive(series, lambda d: d // 3))
+
+
+def test_intraday_with_gaps():
+    rng = np.random.default_rng(1)
+    start = 1_700_000_000 // 3600 * 3600
+    date = start + 60 * np.sort(rng.choice(5000, 3000, replace=False))
+    close = 100 + rng.random(date.shape[0])
+    series = PriceSeries(date, close, close + 1, close - 1, close, rng.random(date.shape[0]), timeframe="1m")
+    hourly = resample(series, "1h")
+    _assert_matches(hourly, _naive(series, lambda t: t // 3600))
+    assert (hourly.date % 3600 == 0).all()
+
+
+def test_rejects_non_multiple(series):
+    with pytest.raises(ValueError):
+        resample(series, "12h")
+
+
+def test_resampled_is_cached(series):
+    assert resampled(series, "1d") is series
+    assert resampled(series, "1w") is resampled(series, "1w")
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""回测结果的输出格式"""
+import json
+
+import msgpack
+import pytest
+
+from response_format import check_format, encode, parse_fields
+from strategy_engine import run_double_ma_strategy
+
+
+def test_msgpack_matches_columns_json(series):
+    result = run_double_ma_strategy(series, 10, 30, layout="columns")
+    check_format("msgpack")
+    assert msgpack.unpackb(encode(result, "msgpack"), raw=False) == json.loads(encode(result, "columns"))
+
+
+def test_invalid_format_and_fields():
+    with pytest.raises(ValueError):
+        check_format("xml")
+    assert parse_fields("summary|trades") == ("summary", "trades")
+    with pytest.raises(ValueError):
+        parse_fields("summary,foo")
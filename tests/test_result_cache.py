@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""回测结果缓存：键的规范化、LRU 淘汰，以及回测接口按数据版本和参数命中"""
+import pytest
+from fastapi.testclient import TestClient
+
+from result_cache import ResultCache, make_cache_key
+
+
+def test_key_normalization():
+    assert make_cache_key("v1", short=10, long=50) == make_cache_key("v1", long=50.0, short=10.0)
+    assert make_cache_key("v1", short=10) != make_cache_key("v2", short=10)
+    assert make_cache_key("v1", short=10, fee_rate=0.001) != make_cache_key("v1", short=10, fee_rate=0.002)
+
+
+def test_hits_misses_and_lru():
+    cache = ResultCache(max_entries=2, max_bytes=10)
+    assert cache.get("a") is None
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    # "b" 最久未使用，条目数超限时被淘汰
+    cache.put("c", b"12")
+    assert cache.get("b") is None
+    # 总字节数超限时淘汰最旧的；超过总预算的单个结果不缓存
+    cache.put("d", b"123456")
+    assert cache.get("a") is None and cache.get("d") == b"123456"
+    cache.put("e", b"x" * 11)
+    assert cache.get("e") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 4, 2)
+    assert stats["entries"] == 2 and stats["bytes"] == 8
+
+
+@pytest.fixture
+def client(monkeypatch, series):
+    import backend
+
+    current = {"series": series}
+    monkeypatch.setattr(backend, "load_price_series", lambda timeframe="1d": current["series"])
+    backend._backtest_results.clear()
+    with TestClient(backend.app) as client:
+        yield client, current
+
+
+def _get(client, **params):
+    resp = client.get("/api/backtest/double_ma", params=dict(dict(short=5, long=20, fields="summary"), **params))
+    assert resp.status_code == 200, resp.text
+    return resp
+
+
+def test_endpoint_hits_until_params_or_data_change(client, series):
+    client, current = client
+    first = _get(client)
+    assert first.headers["X-Cache"] == "MISS"
+    again = _get(client)
+    assert again.headers["X-Cache"] == "HIT" and again.content == first.content
+    assert _get(client, fee_rate=0.002).headers["X-Cache"] == "MISS"
+    assert _get(client, short=6).headers["X-Cache"] == "MISS"
+    assert _get(client, fields="summary,trades").headers["X-Cache"] == "MISS"
+    # 数据更新后版本变化，旧结果不再命中
+    current["series"] = series[:700]
+    changed = _get(client)
+    assert changed.headers["X-Cache"] == "MISS" and changed.content != first.content
+    assert _get(client).headers["X-Cache"] == "HIT"
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""共享数据集文件：发布、映射，以及进程池工作进程直接映射数据集目录"""
+import json
+import mmap
+import time
+
+import numpy as np
+import pytest
+
+from backtest_executor import BacktestExecutor
+import shared_dataset
+from strategy_engine import run_double_ma_strategy
+from sweep import parse_sweep_grid, run_double_ma_sweep
+
+
+def _is_mapped(arr):
+    while arr is not None:
+        if isinstance(arr, (np.memmap, mmap.mmap)):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+
+@pytest.fixture
+def published(series):
+    # 使用 conftest 设置的临时缓存目录（进程池的工作进程从环境变量取得同一目录）
+    shared_dataset.publish(series, indicators=[("sma", 10)])
+    return shared_dataset.open_dataset(shared_dataset.read_pointer("1d"))
+
+
+def test_open_dataset_is_memory_mapped(published, series):
+    assert published.version == series.version
+    assert _is_mapped(published.close)
+    np.testing.assert_array_equal(published.close, series.close)
+    assert shared_dataset.dataset_pointer(published)["dir"] == f"1d-{series.version}"
+    assert shared_dataset.dataset_pointer(series[:-1]) is None
+
+
+def test_old_versions_kept_for_retain_period(published, series, monkeypatch):
+    versions = [series[:-k] for k in (1, 2)]
+    for s in versions:
+        shared_dataset.publish(s, indicators=[])
+    assert shared_dataset.dataset_pointer(published) is not None
+    monkeypatch.setattr(shared_dataset, "RETAIN_SECONDS", 0.0)
+    time.sleep(0.01)
+    shared_dataset.publish(series[:-3], indicators=[])
+    assert shared_dataset.dataset_pointer(published) is None
+    assert shared_dataset.dataset_pointer(versions[1]) is not None
+
+
+def test_executor_maps_published_dataset(published):
+    executor = BacktestExecutor(backend="process", workers=1)
+    try:
+        body = executor.submit(published, dict(short=10, long=30), "json", ("summary",), None, time.time() + 60)
+        expected = run_double_ma_strategy(published, 10, 30, fields=("summary",))["summary"]
+        assert json.loads(body.result(timeout=60))["summary"] == expected
+        # 工作进程映射数据集目录，执行器没有再复制一份到共享内存
+        assert not executor._segments
+    finally:
+        executor.shutdown()
+
+
+def test_parallel_sweep_on_published_dataset(published):
+    grid = parse_sweep_grid(
+        {"short": "5,10", "long": "20,30", "stop_loss_pct": "0", "take_profit_pct": "0",
+         "fee_rate": "0.001", "slippage_rate": "0.0005"}
+    )
+    serial = run_double_ma_sweep(published, grid, workers=1)["results"]
+    parallel = run_double_ma_sweep(published, grid, workers=2)["results"]
+    assert [r["summary"] for r in parallel] == [r["summary"] for r in serial]
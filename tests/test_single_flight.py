@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""单飞调用合并：并发冷启动只加载一次，异常传给所有等待者且不影响之后的调用"""
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("等待超时")
+        time.sleep(0.005)
+
+
+def _run_concurrently(n, target):
+    results, errors = [None] * n, [None] * n
+
+    def worker(i):
+        try:
+            results[i] = target()
+        except BaseException as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    threads, results, errors = _run_concurrently(8, lambda: flight.do("load", load))
+    # 领头的调用阻塞期间，其余 7 个都已加入等待
+    _wait_for(lambda: flight.shared == 7)
+    assert flight.in_flight("load")
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert errors == [None] * 8
+    assert all(r is results[0] for r in results)
+    assert not flight.in_flight("load")
+
+
+def test_error_reaches_every_waiter_and_next_call_retries():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("download failed")
+
+    threads, results, errors = _run_concurrently(5, lambda: flight.do("load", fail))
+    _wait_for(lambda: flight.shared == 4)
+    release.set()
+    for t in threads:
+        t.join()
+    assert all(isinstance(e, RuntimeError) and str(e) == "download failed" for e in errors)
+    # 失败的调用已移除，下一次重新执行
+    assert flight.do("load", lambda: 42) == 42
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    release = threading.Event()
+    threads, _, _ = _run_concurrently(1, lambda: flight.do("a", lambda: release.wait(5)))
+    _wait_for(lambda: flight.in_flight("a"))
+    assert flight.do("b", lambda: "b") == "b"
+    release.set()
+    threads[0].join()
+
+
+def test_cold_start_loads_once(monkeypatch, series):
+    import backend
+
+    calls = []
+
+    def download():
+        calls.append(1)
+        time.sleep(0.2)
+        return series
+
+    monkeypatch.setattr(backend, "_price_series", None)
+    monkeypatch.setattr(backend, "_shared_dataset", lambda timeframe, current=None: None)
+    monkeypatch.setattr(backend, "_load_price_series_from_sources", download)
+    monkeypatch.setattr(backend, "_publish_dataset", lambda s: s)
+    threads, results, errors = _run_concurrently(8, backend.load_price_series)
+    for t in threads:
+        t.join()
+    assert errors == [None] * 8
+    assert len(calls) == 1
+    assert all(r is series for r in results)
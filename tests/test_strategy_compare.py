@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""多组参数对比：与单次回测一致、曲线对齐、max_points 限制总点数"""
+import math
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from downsample import lttb_indices
+from strategy_compare import BENCHMARK_NAME, parse_strategy_sets, run_comparison
+from strategy_engine import run_double_ma_strategy
+
+SETS = "10:50,20:100:5:10,5:30"
+
+
+def test_parse_strategy_sets():
+    sets = parse_strategy_sets(SETS)
+    assert sets[1] == {"short": 20, "long": 100, "stop_loss_pct": 5.0, "take_profit_pct": 10.0}
+    for spec in ("", "10", "10:5", "a:50", "10:50:1:2:3", "10:50:-1", "10:50," * 21):
+        with pytest.raises(ValueError):
+            parse_strategy_sets(spec)
+
+
+def test_matches_single_backtests(series):
+    result = run_comparison(series, parse_strategy_sets(SETS), benchmark=True, layout="columns")
+    names = [s["name"] for s in result["strategies"]]
+    assert names == ["ma_10_50", "ma_20_100_sl5_tp10", "ma_5_30", BENCHMARK_NAME]
+    curve = result["equity_curve"]
+    assert curve["date"][0] == series.iso_dates[29] and curve["date"][-1] == series.iso_dates[-1]
+    for item, params in zip(result["strategies"], parse_strategy_sets(SETS)):
+        single = run_double_ma_strategy(series, **params, layout="columns")
+        for key, value in single["summary"].items():
+            expected = item["summary"][key]
+            assert value == expected or math.isclose(value, expected, rel_tol=1e-9), (item["name"], key)
+        # 单次回测的曲线从长均线有值处开始，对比曲线在此之前为初始资金
+        offset = params["long"] - 30
+        np.testing.assert_allclose(curve[item["name"]][offset:], single["equity_curve"]["equity"])
+        assert curve[item["name"]][:offset] == [10000.0] * offset
+
+
+def test_duplicate_names_are_suffixed(series):
+    result = run_comparison(series, parse_strategy_sets("10:50,10:50"))
+    assert [s["name"] for s in result["strategies"]] == ["ma_10_50", "ma_10_50#2"]
+
+
+@pytest.mark.parametrize("max_points", [3, 50, 400])
+def test_max_points_limits_aligned_curve(series, max_points):
+    full = run_comparison(series, parse_strategy_sets(SETS), benchmark=True, layout="columns")["equity_curve"]
+    small = run_comparison(
+        series, parse_strategy_sets(SETS), benchmark=True, layout="columns", max_points=max_points
+    )["equity_curve"]
+    assert len(small["date"]) == max_points
+    assert small["date"][0] == full["date"][0] and small["date"][-1] == full["date"][-1]
+    positions = [full["date"].index(d) for d in small["date"]]
+    for name, values in small.items():
+        assert values == [full[name][i] for i in positions], name
+
+
+def test_multi_curve_lttb():
+    rng = np.random.default_rng(2)
+    y = np.cumsum(rng.normal(size=(3, 1000)), axis=1)
+    # 单条曲线时归一化不改变选点
+    assert lttb_indices(y[:1] * 1000.0, 40).tolist() == lttb_indices(y[0], 40).tolist()
+    idx = lttb_indices(y, 40)
+    assert len(idx) == 40 and idx[0] == 0 and idx[-1] == 999
+    # 量级很小的曲线上的尖峰同样会被选中
+    y[2] = 0.0
+    y[2, 500] = 1e-6
+    assert 500 in lttb_indices(y, 40)
+
+
+def test_endpoint_rejects_bad_sets(monkeypatch, series):
+    import backend
+
+    monkeypatch.setattr(backend, "load_price_series", lambda timeframe="1d": series)
+    client = TestClient(backend.app)
+    assert client.get("/api/backtest/double_ma/compare", params={"sets": "50:10"}).status_code == 400
+    resp = client.get("/api/backtest/double_ma/compare", params={"sets": SETS, "max_points": 20})
+    assert resp.status_code == 200 and len(resp.json()["equity_curve"]) == 20
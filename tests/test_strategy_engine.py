@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""NumPy 回测引擎与原逐日循环版本的一致性"""
+import math
+
+import pytest
+
+from baseline_engine import run_double_ma_strategy as run_baseline
+from price_series import PriceSeries
+from strategy_engine import run_double_ma_strategy
+
+PARAMS = [
+    dict(short=5, long=20),
+    dict(short=10, long=50, fee_rate=0.002, slippage_rate=0.001),
+    dict(short=5, long=30, stop_loss_pct=5),
+    dict(short=5, long=30, take_profit_pct=8),
+    dict(short=3, long=12, stop_loss_pct=3, take_profit_pct=6),
+    dict(short=20, long=100, stop_loss_pct=10, take_profit_pct=25, initial_capital=5000.0),
+]
+
+
+def _assert_close(a, b, key):
+    if a is None or b is None:
+        assert a == b, key
+    elif isinstance(a, float) or isinstance(b, float):
+        assert math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9), (key, a, b)
+    else:
+        assert a == b, (key, a, b)
+
+
+@pytest.mark.parametrize("params", PARAMS)
+def test_matches_baseline(rows, params):
+    expected = run_baseline(rows, **params)
+    actual = run_double_ma_strategy(PriceSeries.from_rows(rows), **params)
+
+    assert actual["params"] == expected["params"]
+    assert len(actual["trades"]) == len(expected["trades"])
+    for got, want in zip(actual["trades"], expected["trades"]):
+        for key in want:
+            _assert_close(got[key], want[key], key)
+    assert len(actual["equity_curve"]) == len(expected["equity_curve"])
+    for got, want in zip(actual["equity_curve"], expected["equity_curve"]):
+        for key in want:
+            _assert_close(got[key], want[key], key)
+    for key, want in expected["summary"].items():
+        _assert_close(actual["summary"][key], want, key)
+
+
+def test_stops_trigger_in_fixture(rows):
+    """夹具数据上止损和止盈都确实触发过，上面的一致性测试覆盖了提前平仓的路径"""
+    reasons = {t["exit_reason"] for t in run_baseline(rows, **PARAMS[4])["trades"]}
+    assert {"stop_loss", "take_profit"} <= reasons
+
+
+def test_row_input_and_columns_layout(rows):
+    by_rows = run_double_ma_strategy(rows, short=5, long=20, stop_loss_pct=5)
+    by_columns = run_double_ma_strategy(PriceSeries.from_rows(rows), short=5, long=20, stop_loss_pct=5, layout="columns")
+    assert by_columns["summary"] == by_rows["summary"]
+    assert by_columns["equity_curve"]["equity"] == [p["equity"] for p in by_rows["equity_curve"]]
+    assert by_columns["trades"]["exit_reason"] == [t["exit_reason"] for t in by_rows["trades"]]
+
+
+def test_invalid_params(rows):
+    with pytest.raises(ValueError):
+        run_double_ma_strategy(rows, short=20, long=10)
+    with pytest.raises(ValueError):
+        run_double_ma_strategy(rows[:10], short=5, long=20)
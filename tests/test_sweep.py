@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""参数扫描与排名"""
+import math
+
+import pytest
+
+import sweep
+from strategy_engine import run_double_ma_strategy
+from sweep import parse_param_range, parse_sweep_grid, rank_results, run_double_ma_sweep
+
+SPECS = {
+    "short": "5:15:5",
+    "long": "20,40",
+    "stop_loss_pct": "0,5",
+    "take_profit_pct": "0,20",
+    "fee_rate": "0.001",
+    "slippage_rate": "0.0005",
+}
+
+
+def _close(a, b):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def test_parse_param_range():
+    assert parse_param_range("short", "5:20:5", int) == [5, 10, 15, 20]
+    assert parse_param_range("fee_rate", "0.001,0.002,0.001") == [0.001, 0.002]
+    for spec in ("", "5:1", "a,b", "1:2:0"):
+        with pytest.raises(ValueError):
+            parse_param_range("short", spec, int)
+    with pytest.raises(ValueError):
+        parse_param_range("short", "1000", int)
+
+
+def test_grid_skips_invalid_combinations():
+    grid = parse_sweep_grid(dict(SPECS, short="5,20,40", long="20"))
+    assert [p["short"] for p in grid] == [5] * 4
+
+
+def test_sweep_matches_single_backtests(series):
+    grid = parse_sweep_grid(SPECS)
+    result = run_double_ma_sweep(series, grid, sort_by="sharpe_ratio")
+    assert result["num_combinations"] == len(grid) == 24
+    assert len(result["results"]) == len(grid)
+    for item in result["results"]:
+        single = run_double_ma_strategy(series, **item["params"])["summary"]
+        for key, value in item["summary"].items():
+            assert _close(value, single[key]), (item["params"], key)
+
+
+def test_sweep_ranking_is_ordered(series):
+    grid = parse_sweep_grid(SPECS)
+    for sort_by, descending in (("sharpe_ratio", True), ("max_drawdown_pct", False)):
+        ranked = run_double_ma_sweep(series, grid, sort_by=sort_by, descending=descending)["results"]
+        assert [r["rank"] for r in ranked] == list(range(1, len(grid) + 1))
+        values = [r["summary"][sort_by] for r in ranked if r["summary"][sort_by] is not None]
+        assert values == sorted(values, reverse=descending)
+
+
+def test_rank_puts_none_last():
+    items = [{"summary": {"profit_factor": v}} for v in (None, 1.5, 3.0)]
+    ranked = rank_results(items, "profit_factor")
+    assert [r["summary"]["profit_factor"] for r in ranked] == [3.0, 1.5, None]
+    assert [r["rank"] for r in ranked] == [1, 2, 3]
+
+
+@pytest.fixture
+def sweep_pool(monkeypatch):
+    """两个进程的共用进程池（单核环境下默认只有一个进程，不会走进程池），测试结束后关闭"""
+    monkeypatch.setattr(sweep, "SWEEP_PROCESSES", 2)
+    sweep.shutdown_sweep_pool()
+    yield
+    sweep.shutdown_sweep_pool()
+
+
+def test_parallel_sweep_matches_serial(series, sweep_pool):
+    grid = parse_sweep_grid(SPECS)
+    serial = run_double_ma_sweep(series, grid, workers=1)["results"]
+    parallel = run_double_ma_sweep(series, grid, workers=2)["results"]
+    assert [r["params"] for r in parallel] == [r["params"] for r in serial]
+    assert [r["summary"] for r in parallel] == [r["summary"] for r in serial]
+
+
+def test_pool_is_reused_across_sweeps(series, sweep_pool):
+    grid = parse_sweep_grid(SPECS)
+    first = run_double_ma_sweep(series, grid, workers=2)["results"]
+    pool = sweep._pool
+    assert pool is not None
+    # 另一个数据版本同样在原有进程池中挂载
+    shorter = series[:600]
+    second = run_double_ma_sweep(shorter, grid, workers=2)["results"]
+    assert sweep._pool is pool
+    assert [r["summary"] for r in second] == [r["summary"] for r in run_double_ma_sweep(shorter, grid)["results"]]
+    assert [r["summary"] for r in run_double_ma_sweep(series, grid, workers=2)["results"]] == [
+        r["summary"] for r in first
+    ]
+    sweep.shutdown_sweep_pool()
+    assert sweep._pool is None
+    # 关闭后再次并行扫描时重新创建
+    run_double_ma_sweep(series, grid, workers=2)
+    assert sweep._pool is not None and sweep._pool is not pool
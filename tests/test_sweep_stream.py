@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""流式参数扫描：事件顺序与进度、NDJSON/SSE 分帧、提前关闭即取消"""
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import sweep
+from response_format import encode_event
+from sweep import parse_sweep_grid, stream_sweep_events
+
+SPECS = dict(short="5:15:5", long="20,40", stop_loss_pct="0,5", take_profit_pct="0", fee_rate="0.001", slippage_rate="0")
+
+
+def test_event_order_and_progress(series):
+    grid = parse_sweep_grid(SPECS)
+    events = list(stream_sweep_events(series, grid, progress_interval=0))
+    names = [name for name, _ in events]
+    assert names[0] == "start" and events[0][1]["num_combinations"] == len(grid)
+    assert names[-1] == "done" and events[-1][1]["completed"] == len(grid)
+    results = [data for name, data in events if name == "result"]
+    assert sorted(r["index"] for r in results) == list(range(len(grid)))
+    progress = [data["completed"] for name, data in events if name == "progress"]
+    # 间隔为 0 时每个结果之后都有一次进度，最后一次为全部完成
+    assert progress[:-1] == list(range(1, len(grid) + 1))
+    assert progress[-1] == len(grid)
+    assert events[-2][1]["eta_seconds"] == 0
+
+
+def test_closing_stops_serial_sweep(series, monkeypatch):
+    calls = []
+    original = sweep.run_combination
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(sweep, "run_combination", counting)
+    events = stream_sweep_events(series, parse_sweep_grid(SPECS))
+    for name, _ in events:
+        if name == "result" and len(calls) == 3:
+            break
+    events.close()
+    assert len(calls) == 3
+
+
+def test_closing_cancels_parallel_chunks(series, monkeypatch):
+    submitted = []
+
+    class RecordingPool(sweep.ProcessPoolExecutor):
+        def submit(self, *args, **kwargs):
+            future = super().submit(*args, **kwargs)
+            submitted.append(future)
+            return future
+
+    sweep.shutdown_sweep_pool()
+    monkeypatch.setattr(sweep, "ProcessPoolExecutor", RecordingPool)
+    # 单核环境下默认只有一个进程，这里强制走进程池
+    monkeypatch.setattr(sweep, "SWEEP_PROCESSES", 2)
+    grid = parse_sweep_grid(dict(SPECS, short="2:30:1", long="40:200:20"))
+    total_chunks = len(sweep._make_chunks(grid, 2))
+    try:
+        events = stream_sweep_events(series, grid, workers=2)
+        for name, _ in events:
+            if name == "result":
+                break
+        events.close()
+        # 关闭后不再提交新的分片，已提交的都已结束或被取消；进程池保留给之后的扫描
+        assert 0 < len(submitted) < total_chunks
+        assert all(f.done() for f in submitted)
+        assert sweep._pool is not None
+    finally:
+        sweep.shutdown_sweep_pool()
+
+
+def test_event_framing():
+    assert encode_event("progress", {"completed": 1}) == b'{"event":"progress","completed":1}\n'
+    assert encode_event("done", {"completed": 2}, mode="sse") == b'event: done\ndata: {"completed":2}\n\n'
+
+
+@pytest.fixture
+def client(monkeypatch, series):
+    import backend
+
+    monkeypatch.setattr(backend, "load_price_series", lambda timeframe="1d": series)
+    return TestClient(backend.app)
+
+
+def test_stream_endpoint_ndjson(client):
+    resp = client.get("/api/backtest/double_ma/sweep/stream", params=dict(SPECS, progress_interval=0.1))
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = resp.text.splitlines()
+    events = [json.loads(line) for line in lines]
+    assert events[0]["event"] == "start" and events[-1]["event"] == "done"
+    assert sum(e["event"] == "result" for e in events) == 12
+    assert any(e["event"] == "progress" for e in events)
+
+
+def test_stream_endpoint_sse(client):
+    resp = client.get("/api/backtest/double_ma/sweep/stream", params=dict(SPECS, mode="sse"))
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    frames = resp.text.split("\n\n")
+    assert frames[-1] == ""
+    parsed = []
+    for frame in frames[:-1]:
+        event, data = frame.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    assert parsed[0][0] == "start" and parsed[-1] == ("done", parsed[-1][1])
+    assert sum(name == "result" for name, _ in parsed) == 12
+
+
+def test_stream_endpoint_rejects_bad_grid(client):
+    resp = client.get("/api/backtest/double_ma/sweep/stream", params=dict(SPECS, short="50", long="20"))
+    assert resp.status_code == 400
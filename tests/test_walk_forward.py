@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""滚动前推分析的窗口划分与样本内选优"""
+from indicators import IndicatorCache
+from sweep import build_param_grid
+from walk_forward import _evaluate, run_walk_forward, walk_forward_windows
+
+
+def test_walk_forward_windows():
+    assert walk_forward_windows(100, 9, 40, 20) == [(9, 49, 69), (29, 69, 89), (49, 89, 100)]
+    assert walk_forward_windows(100, 9, 40, 20, anchored=True)[-1] == (9, 89, 100)
+
+
+def test_walk_forward_picks_in_sample_best(series):
+    shorts, longs = [5, 10], [20, 40]
+    result = run_walk_forward(series, shorts, longs, in_sample_bars=300, out_of_sample_bars=150)
+    windows = walk_forward_windows(len(series), max(longs) - 1, 300, 150)
+    assert result["num_windows"] == len(windows) > 1
+    cache = IndicatorCache(series)
+    grid = build_param_grid(
+        {"short": shorts, "long": longs, "stop_loss_pct": [0.0], "take_profit_pct": [0.0],
+         "fee_rate": [0.001], "slippage_rate": [0.0005]}
+    )
+    for (is_start, is_end, _), report in zip(windows, result["windows"]):
+        sharpe = {
+            (p["short"], p["long"]): _evaluate(series, cache, p, is_start, is_end, 10000.0)[2]["sharpe_ratio"]
+            for p in grid
+        }
+        chosen = (report["params"]["short"], report["params"]["long"])
+        assert sharpe[chosen] == max(v for v in sharpe.values() if v is not None)
+        assert report["in_sample_summary"]["sharpe_ratio"] == sharpe[chosen]
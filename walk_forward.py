@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+双均线策略的滚动前推（walk-forward）分析
+- 在滚动的样本内窗口上按目标指标选出最优 short/long，再在紧随其后的样本外窗口上检验
+- 均线在完整序列上只计算一次（IndicatorCache），各窗口直接切片（视图，不复制）；
+  窗口起点之前的K线只作为均线的历史，不会用到未来数据
+- 各样本外窗口首尾相接、资金滚动，得到整体的样本外资金曲线；整体统计由 MetricsAccumulator 逐窗口累计
+"""
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+
+from price_series import PriceSeries, as_price_series
+from strategy_engine import simulate_double_ma, accumulate_trades, compute_summary
+from metrics import MetricsAccumulator
+from sweep import SORTABLE_METRICS, build_param_grid, rank_results
+from indicators import IndicatorCache, shared_memo
+from downsample import lttb_indices
+
+# 同步接口允许的最大回测次数（窗口数 × 参数组合数），更大的分析请提交后台任务
+MAX_EVALUATIONS = 200000
+
+
+def walk_forward_windows(
+    n: int, first: int, in_sample: int, out_of_sample: int, anchored: bool = False
+) -> List[Tuple[int, int, int]]:
+    """
+    划分窗口，返回 [(样本内起点, 样本内终点=样本外起点, 样本外终点), ...]（左闭右开）。
+    样本外窗口依次相接；anchored=True 时样本内窗口始终从 first 开始（扩展窗口）。
+    最后一个样本外窗口不足 out_of_sample 根时截断到序列末尾。
+    """
+    if in_sample < 2 or out_of_sample < 2:
+        raise ValueError("样本内/样本外窗口至少需要 2 根K线")
+    windows = []
+    is_end = first + in_sample
+    while n - is_end >= 2:
+        windows.append((first if anchored else is_end - in_sample, is_end, min(is_end + out_of_sample, n)))
+        is_end += out_of_sample
+    return windows
+
+
+def _evaluate(
+    series: PriceSeries,
+    cache: IndicatorCache,
+    params: Dict[str, Any],
+    start: int,
+    end: int,
+    initial_capital: float,
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+    """在 [start, end) 上回测一组参数（均线取自完整序列的切片），返回 (资金曲线, 持仓, 摘要)"""
+    window = series[start:end]
+    equity, position = simulate_double_ma(
+        window.close,
+        cache.sma(params["short"])[start:end],
+        cache.sma(params["long"])[start:end],
+        initial_capital,
+        params["fee_rate"],
+        params["slippage_rate"],
+        params["stop_loss_pct"],
+        params["take_profit_pct"],
+    )
+    return equity, position, compute_summary(equity, window, position, initial_capital)
+
+
+def run_walk_forward(
+    data: Union[PriceSeries, List[Dict[str, Any]]],
+    shorts: List[int],
+    longs: List[int],
+    in_sample_bars: int = 730,
+    out_of_sample_bars: int = 180,
+    anchored: bool = False,
+    sort_by: str = "sharpe_ratio",
+    descending: bool = True,
+    initial_capital: float = 10000.0,
+    fee_rate: float = 0.001,
+    slippage_rate: float = 0.0005,
+    stop_loss_pct: float = 0.0,
+    take_profit_pct: float = 0.0,
+    layout: str = "rows",
+    max_points: Optional[int] = None,
+    max_evaluations: int = MAX_EVALUATIONS,
+) -> Dict[str, Any]:
+    """
+    滚动前推分析：每个窗口在样本内按 sort_by 选出最优 short/long，在样本外检验。
+    返回各窗口的最优参数与样本内/外摘要、拼接后的样本外资金曲线及整体摘要。
+    """
+    if sort_by not in SORTABLE_METRICS:
+        raise ValueError(f"不支持的排序指标: {sort_by}，可选: {', '.join(SORTABLE_METRICS)}")
+    grid = build_param_grid(
+        {
+            "short": shorts,
+            "long": longs,
+            "stop_loss_pct": [stop_loss_pct],
+            "take_profit_pct": [take_profit_pct],
+            "fee_rate": [fee_rate],
+            "slippage_rate": [slippage_rate],
+        }
+    )
+    series = as_price_series(data)
+    if not (series.close > 0).any():
+        raise ValueError("数据无效：收盘价必须大于0")
+
+    # 第一个窗口从最长均线有值的位置开始，所有参数组合都有完整的均线
+    first = max(longs) - 1
+    windows = walk_forward_windows(len(series), first, in_sample_bars, out_of_sample_bars, anchored)
+    if not windows:
+        raise ValueError(
+            f"数据不足：{len(series)} 条记录无法划分 {in_sample_bars} 根样本内 + 样本外窗口（均线预热 {first} 根）"
+        )
+    if len(windows) * len(grid) > max_evaluations:
+        raise ValueError(
+            f"回测次数 {len(windows)} 个窗口 × {len(grid)} 个组合超过上限 {max_evaluations}，请缩小范围或提交后台任务"
+        )
+
+    cache = IndicatorCache(series, memo=shared_memo)
+    # 预先生成日期字符串，各窗口切片共享
+    iso_dates = series.iso_dates
+
+    oos_start, oos_stop = windows[0][1], windows[-1][2]
+    capital = initial_capital
+    equity_parts: List[np.ndarray] = []
+    days = series.days
+    acc = MetricsAccumulator(initial_capital, start_day=days[oos_start].item(), bar_days=series.bar_days)
+    reports = []
+    for is_start, is_end, oos_end in windows:
+        candidates = [
+            {"params": params, "summary": _evaluate(series, cache, params, is_start, is_end, initial_capital)[2]}
+            for params in grid
+        ]
+        best = rank_results(candidates, sort_by, descending)[0]
+        equity, position, oos_summary = _evaluate(series, cache, best["params"], is_end, oos_end, capital)
+        capital = float(equity[-1])
+        equity_parts.append(equity)
+        acc.update_many(equity, days[is_end].item(), days[oos_end - 1].item())
+        accumulate_trades(acc, position, series[is_end:oos_end])
+        reports.append(
+            {
+                "in_sample": {"start": iso_dates[is_start], "end": iso_dates[is_end - 1]},
+                "out_of_sample": {"start": iso_dates[is_end], "end": iso_dates[oos_end - 1]},
+                "params": {"short": best["params"]["short"], "long": best["params"]["long"]},
+                "in_sample_summary": best["summary"],
+                "out_of_sample_summary": oos_summary,
+            }
+        )
+
+    equity = np.concatenate(equity_parts)
+    result: Dict[str, Any] = {
+        "params": {
+            "short": shorts,
+            "long": longs,
+            "in_sample_bars": in_sample_bars,
+            "out_of_sample_bars": out_of_sample_bars,
+            "anchored": anchored,
+            "sort_by": sort_by,
+            "order": "desc" if descending else "asc",
+            "initial_capital": initial_capital,
+            "fee_rate": fee_rate,
+            "slippage_rate": slippage_rate,
+            "stop_loss_pct": stop_loss_pct,
+            "take_profit_pct": take_profit_pct,
+        },
+        "num_windows": len(windows),
+        "num_combinations": len(grid),
+        "windows": reports,
+        "summary": acc.summary(),
+    }
+
+    idx = lttb_indices(equity, max_points) if max_points is not None else np.arange(equity.shape[0])
+    curve = {
+        "date": [iso_dates[oos_start + i] for i in idx.tolist()],
+        "equity": equity[idx].tolist(),
+    }
+    if layout == "columns":
+        result["equity_curve"] = curve
+    else:
+        result["equity_curve"] = [{"date": d, "equity": e} for d, e in zip(curve["date"], curve["equity"])]
+    return result